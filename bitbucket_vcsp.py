@@ -4,63 +4,22 @@ Bitbucket implementation of the VCSPInterface.
 Requires: pip install atlassian-python-api
 """
 import os
-import re
 import logging
 import requests
-from types import SimpleNamespace
 from atlassian import Bitbucket
-from vcsp_interface import VCSPInterface, PRFile, PR, Commit
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from config import HTTP_TIMEOUT, PAGE_CONCURRENCY
+from http_cache import mount_http_cache
+from diff_stream import CHUNK_SIZE, iter_byte_lines, iter_diff_files
+from blob_cache import content_keys, default_blob_cache
+from vcsp_interface import VCSPInterface, PR, Commit, ReviewComment
 
 logger = logging.getLogger(__name__)
 
-
-def _parse_diff_per_file(diff_text):
-    try:
-        files = []
-        current_file = None
-        current_diff = []
-        changed_lines = set()
-        line_num_new = None
-
-        for line in diff_text.splitlines(keepends=False):
-            if line.startswith('diff --git'):
-                if current_file:
-                    files.append(PRFile(current_file, '\n'.join(current_diff), changed_lines))
-                parts = line.split()
-                if len(parts) >= 3:
-                    current_file = parts[2][2:]  # strip "a/"
-                else:
-                    logger.warning("Malformed diff header: %s", line)
-                    current_file = "unknown"
-                current_diff = [line]
-                changed_lines = set()
-                line_num_new = None
-            elif current_file:
-                current_diff.append(line)
-                if line.startswith('@@'):
-                    try:
-                        match = re.search(r'\+(\d+)', line)
-                        if match:
-                            line_num_new = int(match.group(1)) - 1
-                    except Exception as e:
-                        logger.warning("Failed to parse hunk header: %s", line)
-                elif line.startswith('+') and not line.startswith('+++'):
-                    if line_num_new is not None:
-                        line_num_new += 1
-                        changed_lines.add(line_num_new)
-                elif not line.startswith('-'):
-                    if line_num_new is not None:
-                        line_num_new += 1
-
-        if current_file:
-            files.append(PRFile(current_file, '\n'.join(current_diff), changed_lines))
-
-        return files
-
-    except Exception as e:
-        logger.error("Failed to parse diff text: %s", e)
-        return []
+# Largest page lengths the API accepts (pull request listings allow fewer)
+MAX_PAGELEN = 100
+MAX_PR_PAGELEN = 50
+AI_COMMENT_QUERY = 'content.raw ~ "AI Comment:"'
 
 
 class BitbucketVCSP(VCSPInterface):
@@ -72,122 +31,165 @@ class BitbucketVCSP(VCSPInterface):
             raise ValueError("BITBUCKET_USERNAME and BITBUCKET_APP_PASSWORD are required for Bitbucket operations")
         # Workspace can be overridden via BITBUCKET_WORKSPACE, defaults to username
         self.workspace = os.getenv('BITBUCKET_WORKSPACE', self.bb_user)
+        # GET responses are revalidated against the local HTTP cache instead of downloaded again
+        self.session = mount_http_cache(requests.Session())
         try:
-            self.client = Bitbucket(url='https://api.bitbucket.org', username=self.bb_user, password=self.bb_pass)
+            self.client = Bitbucket(url='https://api.bitbucket.org', username=self.bb_user, password=self.bb_pass,
+                                    timeout=HTTP_TIMEOUT, session=self.session)
         except Exception as e:
             logger.error("Failed to initialize Bitbucket client: %s", e)
             raise
         self.repo_slug = None
         self.pr_number = None
+        self.blob_cache = default_blob_cache()
+        # (repo, PR number) -> AI comments, listed once per run
+        self._ai_comments = {}
     
-    def _get_json(self, url):
+    def _get_json(self, url, params=None):
         try:
-            response = requests.get(url, auth=(self.bb_user, self.bb_pass))
+            response = self.session.get(url, params=params, auth=(self.bb_user, self.bb_pass),
+                                    timeout=self.request_timeout())
             response.raise_for_status()
             return response.json()
         except requests.RequestException as e:
             logger.error("API request failed for URL %s: %s", url, e)
             return {}
 
+    def _paginate(self, url, params=None, pagelen=MAX_PAGELEN):
+        """
+        All values of a paginated listing, requested at the largest page length.
+        When the first page reports the total size, the remaining pages are
+        requested concurrently by number; otherwise the next links are followed.
+        """
+        params = {**(params or {}), "pagelen": pagelen}
+        first = self._get_json(url, params)
+        values = list(first.get("values", []))
+        if first.get("next") and first.get("size") and first.get("page") == 1 and first.get("pagelen"):
+            pages = range(2, -(-first["size"] // first["pagelen"]) + 1)
+            with ThreadPoolExecutor(max_workers=max(1, min(PAGE_CONCURRENCY, len(pages))),
+                                    thread_name_prefix="bitbucket-page") as executor:
+                for data in executor.map(lambda page: self._get_json(url, {**params, "page": page}), pages):
+                    values.extend(data.get("values", []))
+            return values
+        next_url = first.get("next")
+        while next_url:
+            data = self._get_json(next_url)
+            values.extend(data.get("values", []))
+            next_url = data.get("next")
+        return values
+
+    def _iter_values(self, url, params=None, pagelen=MAX_PAGELEN):
+        """Values of a paginated listing, one page at a time, so the caller can stop early."""
+        data = self._get_json(url, {**(params or {}), "pagelen": pagelen})
+        while True:
+            yield from data.get("values", [])
+            if not data.get("next"):
+                return
+            data = self._get_json(data["next"])
+
     def get_repository(self, repo_name: str):
         # Not needed for PR operations; could return repo metadata if desired
         return None
 
-
+    def get_ai_comments(self, repo_name, pr_number):
+        """AI comments on the PR, newest first; the listing is fetched once and shared by every caller."""
+        if (repo_name, pr_number) in self._ai_comments:
+            return self._ai_comments[(repo_name, pr_number)]
+        url = f"https://api.bitbucket.org/2.0/repositories/{self.workspace}/{repo_name}/pullrequests/{pr_number}/comments"
+        comments = []
+        # filtered and sorted server-side: only AI comments are transferred
+        for comment in self._paginate(url, {"q": AI_COMMENT_QUERY, "sort": "-created_on"}):
+            body = comment.get("content", {}).get("raw", "")
+            if "AI Comment:" in body:
+                inline = comment.get("inline") or {}
+                comments.append(ReviewComment(comment["id"], inline.get("path", ""),
+                                              None if inline.get("outdated") else inline.get("to"), body,
+                                              bool(comment.get("resolution")), comment["created_on"]))
+        self._ai_comments[(repo_name, pr_number)] = comments
+        return comments
 
     def get_last_ai_review_time(self, repo_name, pr_number):
-        url = f"https://api.bitbucket.org/2.0/repositories/{self.workspace}/{repo_name}/pullrequests/{pr_number}/comments"
-        last_time = None
-        while url:
-            data = self._get_json(url)
-            for comment in data.get("values", []):
-                if "AI Comment:" in comment.get("content", {}).get("raw", ""):
-                    comment_time = comment["created_on"]
-                    if not last_time or comment_time > last_time:
-                        last_time = comment_time
-            url = data.get("next")
-        return last_time
+        return max((comment.created_at for comment in self.get_ai_comments(repo_name, pr_number)), default=None)
 
-    def get_commits_after_time(self, repo_name, pr_number, since_time):
+    def resolve_comment(self, repo_name, pr_number, comment):
+        url = (f"https://api.bitbucket.org/2.0/repositories/{self.workspace}/{repo_name}/pullrequests/{pr_number}"
+               f"/comments/{comment.id}/resolve")
+        try:
+            response = self.session.post(url, auth=(self.bb_user, self.bb_pass), timeout=self.request_timeout())
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logger.error("Failed to resolve comment %s on %s #%s: %s", comment.id, repo_name, pr_number, e)
+            raise
+
+    def _commits_since(self, repo_name, pr_number, since_time):
+        """
+        (commits newer than since_time, newest first; the newest older commit or None).
+        The PR's commits are listed newest first, so paging stops at the first older one.
+        """
         url = f"https://api.bitbucket.org/2.0/repositories/{self.workspace}/{repo_name}/pullrequests/{pr_number}/commits"
         commits = []
-        while url:
-            data = self._get_json(url)
-            for commit in data.get("values", []):
-                if commit["date"] > since_time:
-                    commits.append(commit)
-            url = data.get("next")
-        return commits
+        for commit in self._iter_values(url):
+            if commit["date"] <= since_time:
+                return commits, commit
+            commits.append(commit)
+        return commits, None
 
-    def get_commit_diff(self, repo_name, commit_hash):
-        try:
-            url = f"https://api.bitbucket.org/2.0/repositories/{self.workspace}/{repo_name}/diff/{commit_hash}"
-            response = requests.get(url, auth=(self.bb_user, self.bb_pass))
-            response.raise_for_status()
-            return _parse_diff_per_file(response.text)
-        except Exception as e:
-            logger.error("Failed to fetch or parse diff for commit %s: %s", commit_hash, e)
-            return []
+    def get_commits_after_time(self, repo_name, pr_number, since_time):
+        return self._commits_since(repo_name, pr_number, since_time)[0]
 
-    def get_pr_diff(self, repo_name, pr_number):
+    def _get_diff(self, url, description):
+        """
+        Stream and parse a diff. The raw diff is never held whole; the patches
+        kept for review are, up to MAX_DIFF_TOTAL_CHARS in total.
+        """
+        timeout = self.request_timeout()
         try:
-            url = f"https://api.bitbucket.org/2.0/repositories/{self.workspace}/{repo_name}/pullrequests/{pr_number}/diff"
-            response = requests.get(url, auth=(self.bb_user, self.bb_pass))
-            response.raise_for_status()
-            return _parse_diff_per_file(response.text)
+            with self.session.get(url, auth=(self.bb_user, self.bb_pass), timeout=timeout, stream=True) as response:
+                response.raise_for_status()
+                return list(iter_diff_files(iter_byte_lines(response.iter_content(CHUNK_SIZE))))
         except Exception as e:
-            logger.error("Failed to fetch or parse PR diff: %s", e)
+            logger.error("Failed to fetch or parse %s: %s", description, e)
             return []
 
-    def get_files_in_pr(self, repo_name: str, pr_number: int):
-        last_review_time = self.get_last_ai_review_time(repo_name, pr_number)
-
-        if last_review_time:
-            commits = self.get_commits_after_time(repo_name, pr_number, last_review_time)
-            if not commits:
-                logger.info("No new commits after last AI review.")
-                return []
-
-            per_commit_diffs = []
-            for commit in commits:
-                commit_diff = self.get_commit_diff(repo_name, commit["hash"])
-                per_commit_diffs.append(commit_diff)
-
-            # Conflict detection
-            merged = defaultdict(lambda: {"diff": [], "lines": set()})
-            conflict_files = set()
+    def get_commit_diff(self, repo_name, commit_hash):
+        url = f"https://api.bitbucket.org/2.0/repositories/{self.workspace}/{repo_name}/diff/{commit_hash}"
+        return self._get_diff(url, f"diff for commit {commit_hash}")
 
-            for commit_diff in per_commit_diffs:
-                for pr_file in commit_diff:
-                    if pr_file.filename in merged:
-                        if merged[pr_file.filename]["lines"] & pr_file.lines:
-                            conflict_files.add(pr_file.filename)
-                    merged[pr_file.filename]["diff"].append(pr_file)
-                    merged[pr_file.filename]["lines"].update(pr_file.lines)
+    def get_range_diff(self, repo_name, head, base):
+        """Diff of the changes from base to head in one request (the spec is head..base)."""
+        url = f"https://api.bitbucket.org/2.0/repositories/{self.workspace}/{repo_name}/diff/{head}..{base}"
+        return self._get_diff(url, f"diff {base}..{head}")
 
-            # Final output
-            final_files = []
-            full_pr_diff = None  # lazy load
-            for filename, group in merged.items():
-                if filename in conflict_files:
-                    if full_pr_diff is None:
-                        full_pr_diff = {f.filename: f for f in self.get_pr_diff(repo_name, pr_number)}
-                    if filename in full_pr_diff:
-                        final_files.append(full_pr_diff[filename])
-                    else:
-                        logger.warning("Conflict file %s not found in PR diff", filename)
-                else:
-                    for pr_file in group["diff"]:
-                        final_files.append(pr_file)
+    def get_open_pull_requests(self, repo_name: str):
+        url = f"https://api.bitbucket.org/2.0/repositories/{self.workspace}/{repo_name}/pullrequests"
+        return [pr["id"] for pr in self._paginate(url, {"state": "OPEN"}, pagelen=MAX_PR_PAGELEN)]
 
-            return final_files
+    def get_pr_diff(self, repo_name, pr_number):
+        url = f"https://api.bitbucket.org/2.0/repositories/{self.workspace}/{repo_name}/pullrequests/{pr_number}/diff"
+        return self._get_diff(url, "PR diff")
 
-        else:
+    def get_files_in_pr(self, repo_name: str, pr_number: int):
+        last_review_time = self.get_last_ai_review_time(repo_name, pr_number)
+        if not last_review_time:
             # No AI review, return full PR diff
             logger.info("No previous AI comment found, taking full PR diff.")
             return self.get_pr_diff(repo_name, pr_number)
 
+        commits, reviewed = self._commits_since(repo_name, pr_number, last_review_time)
+        if not commits:
+            logger.info("No new commits after last AI review.")
+            return []
+        if reviewed is None:
+            logger.info("No PR commit predates the last AI review (rebased?), taking full PR diff.")
+            return self.get_pr_diff(repo_name, pr_number)
+        # one range diff holds the net change of all new commits; lines changed by several of them appear once
+        logger.info("Reviewing %d new commit(s) as one diff %s..%s", len(commits), reviewed["hash"][:12],
+                    commits[0]["hash"][:12])
+        return self.get_range_diff(repo_name, commits[0]["hash"], reviewed["hash"])
+
     def get_pull_request(self, repo_name: str, pr_number: int) -> PR:
+        # the atlassian client has a fixed timeout, so only check that time is left
+        self.request_timeout()
         try:
             pr_data = self.client.get_pull_request(self.workspace, repo_name, pr_number)
         except Exception as e:
@@ -211,19 +213,29 @@ class BitbucketVCSP(VCSPInterface):
         
 
     def get_file_content(self, repo_name: str, file_path: str, ref: str):
+        # Bitbucket exposes no blob ids, so only content at a commit SHA is cached
+        cache_keys = content_keys("bitbucket", f"{self.workspace}/{repo_name}", file_path, ref) if self.blob_cache else []
+        cached = self.blob_cache.get_any(cache_keys) if cache_keys else None
+        if cached is not None:
+            return cached
         # Fetch raw file content via REST API
         content_url = (
             f"https://api.bitbucket.org/2.0/repositories/"
             f"{self.workspace}/{repo_name}/src/{ref}/{file_path}"
         )
         try:
-            response = requests.get(content_url, auth=(self.bb_user, self.bb_pass))
+            response = self.session.get(content_url, auth=(self.bb_user, self.bb_pass),
+                                        timeout=self.request_timeout())
+            if response.status_code == 404:
+                raise FileNotFoundError(f"{file_path} does not exist at {ref} in {repo_name}")
             response.raise_for_status()
             text = response.text
         except requests.exceptions.RequestException as e:
             logger.error("Error fetching file content %s@%s:%s: %s", repo_name, ref, file_path, e)
-            return None
-        return SimpleNamespace(decoded_content=text.encode('utf-8'))
+            raise
+        if cache_keys:
+            self.blob_cache.put_all(cache_keys, text)
+        return text
 
     def create_review_comment(self, repo_name: str, commit: str, file_path: str, line: int, comment: str, side: str):
         """
@@ -244,7 +256,8 @@ class BitbucketVCSP(VCSPInterface):
                 "content": {"raw": comment}             
             }
         try:
-            response = requests.post(url, json=payload, auth=(self.bb_user, self.bb_pass))
+            response = self.session.post(url, json=payload, auth=(self.bb_user, self.bb_pass),
+                                     timeout=self.request_timeout())
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -260,7 +273,8 @@ class BitbucketVCSP(VCSPInterface):
         # Fetch a single commit via REST API
         commit_url = f"https://api.bitbucket.org/2.0/repositories/{self.workspace}/{repo_name}/commit/{commit_sha}"
         try:
-            response = requests.get(commit_url, auth=(self.bb_user, self.bb_pass))
+            response = self.session.get(commit_url, auth=(self.bb_user, self.bb_pass),
+                                        timeout=self.request_timeout())
             response.raise_for_status()
             data = response.json()
         except requests.exceptions.RequestException as e:
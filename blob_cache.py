@@ -0,0 +1,171 @@
+# blob_cache.py
+"""
+Local, size-bounded LRU store for immutable text blobs.
+
+Entries are keyed by content address (repository + git blob SHA) or by an
+immutable location (repository + commit SHA + path), so a hit is always
+valid and never needs to be revalidated against the VCS.
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+from config import BLOB_CACHE_MAX_BYTES, CACHE_DIR
+
+# Full or abbreviated commit SHA; branch and tag names are mutable and never cached
+_COMMIT_SHA = re.compile(r'^[0-9a-f]{12,64}$')
+
+
+def is_commit_sha(ref: Optional[str]) -> bool:
+    return bool(ref) and bool(_COMMIT_SHA.match(ref))
+
+
+def content_keys(provider: str, repo_name: str, file_path: str, ref: Optional[str] = None,
+                 blob_sha: Optional[str] = None) -> List[str]:
+    """
+    Return the cache keys under which a file's content can be stored, cheapest lookup first.
+
+    Args:
+        provider: VCS provider name, keeping keys of different providers apart.
+        repo_name: The repository name.
+        file_path: The path of the file in the repository.
+        ref: The ref the file is read at; only used when it is a commit SHA.
+        blob_sha: The git blob SHA of the file, if known.
+    """
+    keys = []
+    if is_commit_sha(ref):
+        keys.append(f"{provider}:{repo_name}:ref:{ref}:{file_path}")
+    if blob_sha:
+        keys.append(f"{provider}:{repo_name}:blob:{blob_sha}")
+    return keys
+
+
+class BlobCache:
+    """Thread-safe on-disk LRU cache of text values, evicting least recently used entries past max_bytes."""
+
+    def __init__(self, directory: str, max_bytes: int = BLOB_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = None  # OrderedDict[digest, size], least recently used first
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+
+    @staticmethod
+    def _digest(key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _load_index(self):
+        """Rebuild the LRU order from file modification times (touched on every hit)."""
+        if self._index is not None:
+            return
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.startswith("."):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, name, stat.st_size))
+        entries.sort()
+        self._index = OrderedDict((name, size) for _, name, size in entries)
+        self._total = sum(size for _, _, size in entries)
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value for key, or None on a miss."""
+        digest = self._digest(key)
+        path = self._path(digest)
+        with self._lock:
+            self._load_index()
+            try:
+                # bytes, as written: text mode would turn CRLF line endings into LF
+                with open(path, "rb") as f:
+                    value = f.read().decode("utf-8")
+                os.utime(path)
+            except FileNotFoundError:
+                # evicted by another process sharing the directory
+                if digest in self._index:
+                    self._total -= self._index.pop(digest)
+                self.misses += 1
+                return None
+            except (OSError, UnicodeDecodeError) as e:
+                logging.warning(f"Blob cache read failed for {key}: {str(e)}")
+                self.misses += 1
+                return None
+            size = self._index.pop(digest, None)
+            if size is None:
+                # written by another process sharing the directory
+                size = len(value.encode("utf-8"))
+                self._total += size
+            self._index[digest] = size
+            self.hits += 1
+            return value
+
+    def get_any(self, keys: Iterable[str]) -> Optional[str]:
+        """Return the value of the first key that hits."""
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                return value
+        return None
+
+    def put(self, key: str, value: str):
+        """Store value under key, evicting least recently used entries if the cache is full."""
+        data = value.encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        digest = self._digest(key)
+        path = self._path(digest)
+        with self._lock:
+            self._load_index()
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logging.warning(f"Blob cache write failed for {key}: {str(e)}")
+                return
+            self._total -= self._index.pop(digest, 0)
+            self._index[digest] = len(data)
+            self._total += len(data)
+            self._evict()
+
+    def put_all(self, keys: Iterable[str], value: str):
+        for key in keys:
+            self.put(key, value)
+
+    def _evict(self):
+        while self._total > self.max_bytes and self._index:
+            digest, size = self._index.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(self._path(digest))
+            except OSError:
+                pass
+
+
+_default_caches = {}
+_default_lock = threading.Lock()
+
+
+def default_blob_cache(name: str = "blobs", max_bytes: int = BLOB_CACHE_MAX_BYTES) -> Optional[BlobCache]:
+    """Return the process-wide cache stored under CACHE_DIR/name, or None if caching is disabled."""
+    if not CACHE_DIR:
+        return None
+    with _default_lock:
+        if name not in _default_caches:
+            _default_caches[name] = BlobCache(os.path.join(CACHE_DIR, name), max_bytes)
+        return _default_caches[name]
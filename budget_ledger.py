@@ -0,0 +1,92 @@
+# budget_ledger.py
+"""
+Persistent ledger of LLM token usage with daily and per-repository budgets.
+
+Every review's usage is appended to a SQLite file under CACHE_DIR, so budgets
+hold across runs and across concurrent CI jobs on the same machine. A budget
+of 0 means unlimited.
+"""
+import datetime
+import os
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+from config import CACHE_DIR, DAILY_TOKEN_BUDGET, REPO_DAILY_TOKEN_BUDGET
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    day TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    repository TEXT NOT NULL,
+    pr_number INTEGER,
+    model TEXT NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    total_tokens INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS usage_day ON usage (day, repository);
+"""
+
+
+def _today() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).date().isoformat()
+
+
+class BudgetLedger:
+    """Records token usage and tells whether a planned review still fits the budgets."""
+
+    def __init__(self, path: str = ":memory:", daily_tokens: int = DAILY_TOKEN_BUDGET,
+                 repo_daily_tokens: int = REPO_DAILY_TOKEN_BUDGET):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.daily_tokens = daily_tokens
+        self.repo_daily_tokens = repo_daily_tokens
+        self._lock = threading.Lock()
+        # several CI jobs may share the file; wait for each other's writes instead of failing
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._db:
+            self._db.executescript(SCHEMA)
+
+    def record(self, repository: str, pr_number: Optional[int], model: str, prompt_tokens: int,
+               completion_tokens: int, total_tokens: int):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        with self._lock, self._db:
+            self._db.execute("INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (now.date().isoformat(), now.isoformat(), repository, pr_number, model,
+                              prompt_tokens, completion_tokens, total_tokens))
+
+    def spent_today(self, repository: Optional[str] = None) -> int:
+        query = "SELECT COALESCE(SUM(total_tokens), 0) FROM usage WHERE day = ?"
+        params = [_today()]
+        if repository is not None:
+            query += " AND repository = ?"
+            params.append(repository)
+        with self._lock:
+            return self._db.execute(query, params).fetchone()[0]
+
+    def over_budget(self, repository: str, tokens: int, reserved: Optional[Dict[str, int]] = None) -> Optional[str]:
+        """
+        Return why spending tokens more today would exceed a budget, or None if
+        it fits. reserved maps repositories to tokens of reviews in flight that
+        are not recorded yet (batch mode), counted as spent.
+        """
+        reserved = reserved or {}
+        if self.daily_tokens:
+            spent = self.spent_today() + sum(reserved.values())
+            if spent + tokens > self.daily_tokens:
+                return f"daily budget: {spent} of {self.daily_tokens} tokens spent, review needs ~{tokens}"
+        if self.repo_daily_tokens:
+            spent = self.spent_today(repository) + reserved.get(repository, 0)
+            if spent + tokens > self.repo_daily_tokens:
+                return (f"daily budget of {repository}: {spent} of {self.repo_daily_tokens} tokens spent, "
+                        f"review needs ~{tokens}")
+        return None
+
+    def close(self):
+        self._db.close()
+
+
+def default_ledger_path() -> Optional[str]:
+    """Ledger file under CACHE_DIR, or None if local caching is disabled."""
+    return os.path.join(CACHE_DIR, "ledger.sqlite") if CACHE_DIR else None
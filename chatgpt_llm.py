@@ -6,12 +6,12 @@ from llm_interface import LLMInterface, ModelResult
 from config import LOG_CHAR_LIMIT
 
 class ChatGPTLLM(LLMInterface):
-    def __init__(self):
+    def __init__(self, model: str = None):
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
             raise ValueError("OPENAI_API_KEY environment variable is required for ChatGPT")
         self.client = openai.OpenAI(api_key=api_key)
-        self.model = os.getenv("OPENAI_MODEL", "gpt-4o")
+        self.model = model or os.getenv("OPENAI_MODEL", "gpt-4o")
 
     def answer(self, system_prompt: str, user_prompt: str, content: str) -> ModelResult:
         """Generate a JSON response for the given prompts and content."""
@@ -20,8 +20,9 @@ class ChatGPTLLM(LLMInterface):
             f"\nUser Prompt: {user_prompt[:LOG_CHAR_LIMIT]}...\nContent: {content[:LOG_CHAR_LIMIT]}... (truncated)"
         )
 
+        timeout = self.request_timeout()
         try:
-            response = self.client.chat.completions.create(
+            response = self.client.with_options(timeout=timeout).chat.completions.create(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -32,10 +33,13 @@ class ChatGPTLLM(LLMInterface):
             raw_response = response.choices[0].message.content.strip()
             usage = response.usage            
             logging.debug(f"Raw Response:\n{raw_response[:LOG_CHAR_LIMIT]}... (truncated)")
+            # prompts sharing a prefix of 1024+ tokens are cached automatically
+            details = getattr(usage, "prompt_tokens_details", None)
             return ModelResult(response =raw_response, 
                               total_tokens=usage.total_tokens,
                               prompt_tokens=usage.prompt_tokens,
-                              completion_tokens=usage.completion_tokens)
+                              completion_tokens=usage.completion_tokens,
+                              cached_tokens=getattr(details, "cached_tokens", None) or 0)
         except (BadRequestError, OpenAIError) as e:
             error_message = str(e)
             if "context length" in error_message or "context_length_exceeded" in error_message or 'Request too larg' in error_message:
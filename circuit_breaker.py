@@ -0,0 +1,288 @@
+# circuit_breaker.py
+"""
+Circuit breakers around LLM and VCS provider backends.
+
+A breaker watches the outcome and latency of a backend's recent calls. Once
+enough of them fail (or are slower than a threshold) it opens and further
+calls fail immediately instead of each waiting for its own timeout. After a
+cool-down it lets a single probe call through (half-open): success closes it
+again, failure re-opens it.
+
+Only outages trip a VCS breaker: transport errors, timeouts, 5xx and 429
+answers. A missing file, a refused permission or bad input is the caller's
+problem and leaves the breaker as it is.
+
+Breakers are shared per backend name within a process, so all reviews of a
+batch see the same outage. ``FailoverLLM`` sends each prompt to the first
+backend whose breaker is closed and moves on to the next one on failure.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import requests
+
+from config import (BREAKER_ERROR_RATE, BREAKER_MIN_CALLS, BREAKER_RESET_SECONDS, BREAKER_SLOW_LLM_SECONDS,
+                    BREAKER_SLOW_VCSP_SECONDS, BREAKER_WINDOW)
+from deadline import DeadlineExceeded
+from llm_interface import LLMInterface, ModelResult
+from vcsp_interface import VCSPInterface
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose breaker is open."""
+    pass
+
+
+class CircuitBreaker:
+    """Thread-safe breaker over a sliding window of call outcomes."""
+
+    def __init__(
+            self,
+            name: str,
+            window: int = BREAKER_WINDOW,
+            min_calls: int = BREAKER_MIN_CALLS,
+            error_rate: float = BREAKER_ERROR_RATE,
+            reset_seconds: float = BREAKER_RESET_SECONDS,
+            slow_call_seconds: Optional[float] = None
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.reset_seconds = reset_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self._outcomes = deque(maxlen=window)  # True for a failed or slow call
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """True if a call may go ahead; in half-open state only one probe at a time is let through."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_seconds:
+                    return False
+                self._state = HALF_OPEN
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record(self, success: bool, seconds: float = 0.0):
+        """Record a call outcome; a call slower than slow_call_seconds counts as failed."""
+        failed = not success or (self.slow_call_seconds is not None and seconds > self.slow_call_seconds)
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probing = False
+                if failed:
+                    self._open()
+                else:
+                    logging.info(f"Circuit breaker for {self.name} closed again")
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                return
+            self._outcomes.append(failed)
+            if self._state == CLOSED and len(self._outcomes) >= self.min_calls \
+                    and sum(self._outcomes) / len(self._outcomes) >= self.error_rate:
+                self._open()
+
+    def release(self):
+        """Give up a probe slot without an outcome (e.g. the call was aborted by the deadline)."""
+        with self._lock:
+            self._probing = False
+
+    def _open(self):
+        logging.warning(f"Circuit breaker for {self.name} opened; failing fast for {self.reset_seconds:.0f}s")
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+
+
+def http_status(error: BaseException) -> Optional[int]:
+    """HTTP status of a PyGithub, python-gitlab or requests error, if it carries one."""
+    if isinstance(error, requests.HTTPError):
+        return error.response.status_code if error.response is not None else None
+    for name in ("status", "response_code"):
+        status = getattr(error, name, None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def is_outage(error: BaseException) -> bool:
+    """True if a provider error means the provider is unhealthy: a transport error, a timeout, a 5xx or a 429."""
+    # providers wrap client errors in their own, so follow the chain down to the original one
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, FileNotFoundError):
+            return False
+        status = http_status(error)
+        if status is not None:
+            return status == 429 or status >= 500
+        if isinstance(error, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError)):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def default_breaker(name: str, slow_call_seconds: Optional[float] = None) -> CircuitBreaker:
+    """Process-wide breaker for a backend name, so every user of the backend sees the same state."""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, slow_call_seconds=slow_call_seconds)
+        return _breakers[name]
+
+
+class BreakerLLM(LLMInterface):
+    """An LLM backend guarded by a circuit breaker; answers None right away while the breaker is open."""
+
+    def __init__(self, backend: LLMInterface, breaker: Optional[CircuitBreaker] = None):
+        self.backend = backend
+        self.breaker = breaker or default_breaker(f"llm:{backend.model_name}", BREAKER_SLOW_LLM_SECONDS)
+
+    @property
+    def model_name(self) -> str:
+        return self.backend.model_name
+
+    def set_deadline(self, deadline):
+        super().set_deadline(deadline)
+        self.backend.set_deadline(deadline)
+
+    def answer(self, system_prompt: str, user_prompt: str, content: str) -> Optional[ModelResult]:
+        if not self.breaker.allow():
+            logging.warning(f"Skipping {self.model_name}: circuit breaker is open")
+            return None
+        started = time.monotonic()
+        try:
+            result = self.backend.answer(system_prompt, user_prompt, content)
+        except DeadlineExceeded:
+            self.breaker.release()
+            raise
+        except Exception:
+            self.breaker.record(False)
+            raise
+        # backends return None on failure; a too-long request is the caller's problem, not an outage
+        self.breaker.record(result is not None, time.monotonic() - started)
+        return result
+
+
+class FailoverLLM(LLMInterface):
+    """Sends each prompt to the first healthy backend and fails over to the next one if it fails."""
+
+    def __init__(self, backends: List[LLMInterface]):
+        if not backends:
+            raise ValueError("Failover needs at least one LLM backend")
+        self.backends = [b if isinstance(b, BreakerLLM) else BreakerLLM(b) for b in backends]
+        self.failovers = 0
+
+    @property
+    def model_name(self) -> str:
+        return "failover(" + ",".join(backend.model_name for backend in self.backends) + ")"
+
+    def set_deadline(self, deadline):
+        super().set_deadline(deadline)
+        for backend in self.backends:
+            backend.set_deadline(deadline)
+
+    def answer(self, system_prompt: str, user_prompt: str, content: str) -> Optional[ModelResult]:
+        for index, backend in enumerate(self.backends):
+            if index:
+                self.failovers += 1
+                logging.warning(f"Failing over to {backend.model_name}")
+            try:
+                result = backend.answer(system_prompt, user_prompt, content)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                logging.error(f"LLM {backend.model_name} failed: {str(e)}")
+                continue
+            if result is not None:
+                return result
+        return None
+
+
+class BreakerVCSP(VCSPInterface):
+    """A VCS provider backend guarded by a circuit breaker; raises CircuitOpenError while it is open."""
+
+    def __init__(self, backend: VCSPInterface, breaker: Optional[CircuitBreaker] = None):
+        self.backend = backend
+        self.breaker = breaker or default_breaker(f"vcsp:{type(backend).__name__}", BREAKER_SLOW_VCSP_SECONDS)
+
+    def __getattr__(self, name):
+        # provider-specific attributes and helpers
+        if name == "backend":
+            raise AttributeError(name)
+        return getattr(self.backend, name)
+
+    def set_deadline(self, deadline):
+        super().set_deadline(deadline)
+        self.backend.set_deadline(deadline)
+
+    def _call(self, method: str, *args, **kwargs):
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{type(self.backend).__name__} is unavailable (circuit breaker open)")
+        started = time.monotonic()
+        try:
+            result = getattr(self.backend, method)(*args, **kwargs)
+        except (DeadlineExceeded, ValueError, NotImplementedError):
+            # out of time, bad input (e.g. a binary file) or unsupported: says nothing about the provider's health
+            self.breaker.release()
+            raise
+        except Exception as e:
+            if is_outage(e):
+                self.breaker.record(False)
+            else:
+                # e.g. a missing file or a refused permission: the provider is up
+                self.breaker.release()
+            raise
+        self.breaker.record(True, time.monotonic() - started)
+        return result
+
+    def get_pull_request(self, repo_name: str, pr_number: int):
+        return self._call("get_pull_request", repo_name, pr_number)
+
+    def get_open_pull_requests(self, repo_name: str) -> list:
+        return self._call("get_open_pull_requests", repo_name)
+
+    def get_files_in_pr(self, repo_name: str, pr_number: int):
+        return self._call("get_files_in_pr", repo_name, pr_number)
+
+    def get_file_content(self, repo_name: str, file_path: str, ref: str) -> str:
+        return self._call("get_file_content", repo_name, file_path, ref=ref)
+
+    def prefetch_file_contents(self, repo_name: str, file_paths, ref: str) -> int:
+        return self._call("prefetch_file_contents", repo_name, file_paths, ref)
+
+    def create_review_comment(self, repo_name: str, commit: str, file_path: str, line: int, comment: str, side: str):
+        return self._call("create_review_comment", repo_name=repo_name, commit=commit, file_path=file_path,
+                          line=line, comment=comment, side=side)
+
+    def get_commit(self, repo_name: str, commit_sha: str):
+        return self._call("get_commit", repo_name, commit_sha)
+
+    def get_ai_comments(self, repo_name: str, pr_number: int):
+        return self._call("get_ai_comments", repo_name, pr_number)
+
+    def resolve_comment(self, repo_name: str, pr_number: int, comment):
+        return self._call("resolve_comment", repo_name, pr_number, comment)
@@ -0,0 +1,111 @@
+# comment_sync.py
+"""
+Matching of new findings against the AI comments already on a pull request.
+
+A comment and a finding are the same when they are on the same file, in the
+same hunk of the current diff (compared by its normalized body, so shifted
+line numbers do not matter) and say the same thing once case, whitespace,
+punctuation and the severity counts are ignored. Matching findings are not
+posted again. An unresolved AI comment on a file reviewed in this run whose
+hunk was reviewed again without the same finding, or that the provider marks
+outdated, is resolved.
+"""
+import hashlib
+import logging
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+from diff_hunks import Hunk, split_patch
+from models import CodeReview
+from vcsp_interface import ReviewComment, VCSPInterface
+
+AI_MARKER = "AI Comment:"
+COUNT_LINE = re.compile(r'^\s*(bugCount|smellCount|optimizationCount|logicalErrors|performanceIssues)=\d+\s*$')
+PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+def normalize_text(text: str) -> str:
+    """Comment text without the AI marker, severity counts, case, punctuation and whitespace differences."""
+    lines = [line for line in text.replace(AI_MARKER, "", 1).splitlines() if not COUNT_LINE.match(line)]
+    return " ".join(PUNCTUATION.sub(" ", "\n".join(lines).lower()).split())
+
+
+def fingerprint(filename: str, hunk: Hunk, text: str) -> str:
+    """Identity of a comment: file, normalized hunk body and normalized text."""
+    hunk_digest = hashlib.sha256(hunk.normalized().encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{filename}\0{hunk_digest}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def hunks_by_file(pr_files: Iterable) -> Dict[str, List[Hunk]]:
+    hunks = defaultdict(list)
+    for file in pr_files:
+        if file.patch:
+            hunks[file.filename].extend(split_patch(file.patch)[1])
+    return hunks
+
+
+def containing_hunk(hunks: List[Hunk], line: Optional[int]) -> Optional[Hunk]:
+    """The hunk of the new file containing the line, or None."""
+    if line is None:
+        return None
+    return next((hunk for hunk in hunks if hunk.contains_new_line(line)), None)
+
+
+class CommentSync:
+    """The AI comments of one PR, fingerprinted against its current diff."""
+
+    def __init__(self, comments: List[ReviewComment], pr_files: Iterable, reviewed_files: Set[str]):
+        self.comments = [comment for comment in comments if comment.file_path]
+        self.hunks = hunks_by_file(pr_files)
+        self.reviewed_files = set(reviewed_files)
+        self.fingerprints = {}  # fingerprint -> comment; comments outside the diff have none
+        for comment in self.comments:
+            hunk = containing_hunk(self.hunks.get(comment.file_path, []), comment.line)
+            if hunk is not None:
+                self.fingerprints.setdefault(fingerprint(comment.file_path, hunk, comment.body), comment)
+
+    @classmethod
+    def fetch(cls, vcsp: VCSPInterface, repository: str, pr_number: int, pr_files: Iterable,
+              reviewed_files: Set[str]) -> Optional['CommentSync']:
+        """List the PR's AI comments once; None if they cannot be listed (every finding is then posted)."""
+        try:
+            return cls(vcsp.get_ai_comments(repository, pr_number), pr_files, reviewed_files)
+        except Exception as e:
+            logging.warning(f"Failed to list existing AI comments; posting every finding: {str(e)}")
+            return None
+
+    def _review_fingerprint(self, review: CodeReview) -> Optional[str]:
+        hunk = containing_hunk(self.hunks.get(review.file, []), review.line)
+        return fingerprint(review.file, hunk, "\n".join(review.comments)) if hunk is not None else None
+
+    def is_posted(self, review: CodeReview) -> bool:
+        """True if an AI comment with the same finding is already on the PR (resolved or not)."""
+        return self._review_fingerprint(review) in self.fingerprints
+
+    def outdated(self, reviews: List[CodeReview]) -> List[ReviewComment]:
+        """Unresolved comments whose finding is no longer reported."""
+        current = {self._review_fingerprint(review) for review in reviews}
+        stale = []
+        for comment in self.comments:
+            if comment.resolved or comment.file_path not in self.reviewed_files:
+                continue
+            hunk = containing_hunk(self.hunks.get(comment.file_path, []), comment.line)
+            if comment.line is None or (hunk is not None and
+                                        fingerprint(comment.file_path, hunk, comment.body) not in current):
+                stale.append(comment)
+        return stale
+
+
+def resolve_outdated(vcsp: VCSPInterface, repository: str, pr_number: int, sync: CommentSync,
+                     reviews: List[CodeReview]) -> int:
+    """Resolve the AI comments whose finding disappeared; returns how many were resolved."""
+    resolved = 0
+    for comment in sync.outdated(reviews):
+        try:
+            vcsp.resolve_comment(repository, pr_number, comment)
+            resolved += 1
+            logging.info(f"Resolved outdated comment on {comment.file_path} at line {comment.line}")
+        except Exception as e:
+            logging.error(f"Error resolving comment on {comment.file_path}: {str(e)}")
+    return resolved
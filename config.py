@@ -1,4 +1,73 @@
+import os
+
 # Global character limit for logging
 LOG_CHAR_LIMIT = 500
+# A file's diff longer than this is split at hunk boundaries into parts reviewed separately
 MAX_LENGTH_DIFF = 30000
 MAX_TOTAL_LENGTH = 500000
+# Diffs streamed from the VCS: patches kept in memory per file and per PR;
+# a file beyond either limit is not reviewed
+MAX_DIFF_FILE_CHARS = 2000000
+MAX_DIFF_TOTAL_CHARS = 50000000
+# describe-pr.py: a PR diff longer than this is summarized part by part (map-reduce)
+SUMMARY_CHUNK_CHARS = 60000
+# --repo-path symbol index: prompt characters of referenced definitions per file,
+# and lines kept of each definition
+SYMBOL_CONTEXT_CHARS = 8000
+MAX_SYMBOL_LINES = 60
+# Shards of one review sent to the LLM at the same time (without --deadline)
+SHARD_CONCURRENCY = 4
+
+# Unchanged context lines kept around each change in the prompt
+DIFF_CONTEXT_LINES = int(os.getenv("CODE_REVIEWER_DIFF_CONTEXT", "3"))
+
+# Estimated similarity (0-1) above which hunks count as the same repeated edit
+CLUSTER_SIMILARITY = 0.8
+
+# Gemini explicit context caching: a system prompt and PR context used a second
+# time are cached for GEMINI_CACHE_TTL seconds if they are at least this long
+GEMINI_CACHE_MIN_TOKENS = 4096
+GEMINI_CACHE_TTL = 300
+
+# Default per-request timeouts in seconds (capped further by --deadline)
+HTTP_TIMEOUT = 60
+LLM_TIMEOUT = 600
+# Pages of a VCS listing fetched at the same time, where the API numbers its pages
+PAGE_CONCURRENCY = 4
+
+# --deadline: seconds kept back for posting comments, the least time left for
+# which full file content is still fetched, the assumed duration of an LLM
+# call until latency samples exist, and the shard size used to review the
+# most important files first
+DEADLINE_POST_RESERVE = 30
+DEADLINE_MIN_FULL_CONTEXT = 180
+DEADLINE_DEFAULT_LLM_SECONDS = 60
+DEADLINE_SHARD_CHARS = 60000
+
+# Circuit breakers: a backend is cut off for BREAKER_RESET_SECONDS once at least
+# BREAKER_ERROR_RATE of its last BREAKER_WINDOW calls (and at least
+# BREAKER_MIN_CALLS) failed or took longer than the slow-call threshold
+BREAKER_WINDOW = 20
+BREAKER_MIN_CALLS = 5
+BREAKER_ERROR_RATE = 0.5
+BREAKER_RESET_SECONDS = 60
+BREAKER_SLOW_LLM_SECONDS = 300
+BREAKER_SLOW_VCSP_SECONDS = 30
+
+# LLM prices in USD per million (prompt, completion) tokens, used for --plan estimates
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "grok-3-mini": (0.30, 0.50),
+}
+
+# Token budgets per UTC day, across runs (0 = unlimited)
+DAILY_TOKEN_BUDGET = int(os.getenv("CODE_REVIEWER_DAILY_TOKEN_BUDGET", "0"))
+REPO_DAILY_TOKEN_BUDGET = int(os.getenv("CODE_REVIEWER_REPO_DAILY_TOKEN_BUDGET", "0"))
+
+# Local caches (set CODE_REVIEWER_CACHE_DIR to an empty string to disable them)
+CACHE_DIR = os.getenv("CODE_REVIEWER_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "code-reviewer"))
+BLOB_CACHE_MAX_BYTES = int(os.getenv("CODE_REVIEWER_BLOB_CACHE_MB", "256")) * 1024 * 1024
+# Conditional-request cache of VCS API responses (http.sqlite in CACHE_DIR)
+HTTP_CACHE_MAX_BYTES = int(os.getenv("CODE_REVIEWER_HTTP_CACHE_MB", "256")) * 1024 * 1024
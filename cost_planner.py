@@ -0,0 +1,171 @@
+# cost_planner.py
+"""
+Pre-flight estimates of what a review will cost before any LLM call.
+
+Prompt tokens are estimated from the prompt length with a characters-per-token
+ratio calibrated per model from the ``prompt_tokens`` that earlier calls
+reported; completion tokens, latency and price follow from the same
+observations and the price table in config.py.
+"""
+import json
+import logging
+import math
+import os
+import threading
+from typing import Dict, List, Optional
+
+from config import CACHE_DIR, MODEL_PRICES
+from latency import default_latency_stats
+
+# Used for a model without observations yet
+DEFAULT_CHARS_PER_TOKEN = 4.0
+DEFAULT_COMPLETION_TOKENS = 500
+# Weight of the newest observation in the running averages
+CALIBRATION_WEIGHT = 0.2
+
+
+def model_price(model: str) -> Optional[tuple]:
+    """(prompt, completion) USD per million tokens, or None if the model is not in MODEL_PRICES."""
+    return MODEL_PRICES.get(model.split("/")[-1])
+
+
+class TokenEstimator:
+    """Per-model token estimates, calibrated from observed usage and persisted as JSON."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._lock = threading.Lock()
+        # model -> {"chars_per_token": float, "completion_tokens": float}
+        self._models: Dict[str, Dict[str, float]] = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self._models = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable token calibration {path}: {str(e)}")
+
+    def observe(self, model: str, prompt_chars: int, prompt_tokens: int, completion_tokens: int):
+        """Update the model's calibration with the usage reported for a prompt of prompt_chars characters."""
+        if prompt_chars <= 0 or prompt_tokens <= 0:
+            return
+        ratio = prompt_chars / prompt_tokens
+        with self._lock:
+            stats = self._models.get(model)
+            if stats is None:
+                self._models[model] = {"chars_per_token": ratio, "completion_tokens": float(completion_tokens)}
+                return
+            stats["chars_per_token"] += CALIBRATION_WEIGHT * (ratio - stats["chars_per_token"])
+            stats["completion_tokens"] += CALIBRATION_WEIGHT * (completion_tokens - stats["completion_tokens"])
+
+    def prompt_tokens(self, model: str, prompt_chars: int) -> int:
+        with self._lock:
+            ratio = self._models.get(model, {}).get("chars_per_token", DEFAULT_CHARS_PER_TOKEN)
+        return math.ceil(prompt_chars / ratio)
+
+    def completion_tokens(self, model: str) -> int:
+        with self._lock:
+            return round(self._models.get(model, {}).get("completion_tokens", DEFAULT_COMPLETION_TOKENS))
+
+    def is_calibrated(self, model: str) -> bool:
+        with self._lock:
+            return model in self._models
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = json.dumps(self._models)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Failed to save token calibration {self.path}: {str(e)}")
+
+
+_default_estimator = None
+_default_lock = threading.Lock()
+
+
+def default_token_estimator() -> TokenEstimator:
+    """Process-wide estimator stored under CACHE_DIR (in memory only if caching is disabled)."""
+    global _default_estimator
+    with _default_lock:
+        if _default_estimator is None:
+            _default_estimator = TokenEstimator(os.path.join(CACHE_DIR, "tokens.json") if CACHE_DIR else None)
+        return _default_estimator
+
+
+class ShardEstimate:
+    """Estimated usage of one LLM call."""
+    def __init__(self, files: List[str], model: str, chars: int, prompt_tokens: int, completion_tokens: int,
+                 cost: Optional[float], latency: Optional[float]):
+        self.files = files
+        self.model = model
+        self.chars = chars
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.cost = cost
+        self.latency = latency
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+class CostEstimate:
+    """Estimated usage of a whole review, shard by shard."""
+    def __init__(self, shards: List[ShardEstimate], cached_findings: int = 0):
+        self.shards = shards
+        self.cached_findings = cached_findings
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(shard.total_tokens for shard in self.shards)
+
+    @property
+    def cost(self) -> Optional[float]:
+        """Estimated USD, or None if a model has no known price."""
+        if any(shard.cost is None for shard in self.shards):
+            return None
+        return sum(shard.cost for shard in self.shards)
+
+    @property
+    def latency(self) -> Optional[float]:
+        """Estimated seconds for sequential calls, or None without latency samples."""
+        if any(shard.latency is None for shard in self.shards):
+            return None
+        return sum(shard.latency for shard in self.shards)
+
+    def format(self) -> str:
+        lines = [f"Review plan: {len(self.shards)} LLM call(s), {self.cached_findings} cached finding(s) reused"]
+        for index, shard in enumerate(self.shards, 1):
+            lines.append(f"  Shard {index} ({shard.model}): {len(shard.files)} file(s), {shard.chars} chars, "
+                         f"~{shard.prompt_tokens} prompt + ~{shard.completion_tokens} completion tokens, "
+                         f"{_format_cost(shard.cost)}, {_format_latency(shard.latency)}")
+            lines.append(f"    {', '.join(shard.files)}")
+        lines.append(f"Total: ~{self.total_tokens} tokens, {_format_cost(self.cost)}, "
+                     f"{_format_latency(self.latency)}")
+        return "\n".join(lines)
+
+
+def _format_cost(cost: Optional[float]) -> str:
+    return f"~${cost:.4f}" if cost is not None else "cost unknown"
+
+
+def _format_latency(seconds: Optional[float]) -> str:
+    return f"~{seconds:.0f}s" if seconds is not None else "latency unknown"
+
+
+def estimate_shard(model: str, files: List[str], prompt: str,
+                   estimator: Optional[TokenEstimator] = None) -> ShardEstimate:
+    """Estimate one call of the model with the given full prompt (system prompt and content)."""
+    estimator = estimator or default_token_estimator()
+    prompt_tokens = estimator.prompt_tokens(model, len(prompt))
+    completion_tokens = estimator.completion_tokens(model)
+    price = model_price(model)
+    cost = (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000 if price else None
+    latency = default_latency_stats().tracker(model).percentile(50)
+    return ShardEstimate(files, model, len(prompt), prompt_tokens, completion_tokens, cost, latency)
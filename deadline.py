@@ -0,0 +1,44 @@
+# deadline.py
+"""
+End-to-end time budget shared by every VCS and LLM call of a review.
+"""
+import time
+from typing import Optional
+
+
+class DeadlineExceeded(Exception):
+    """Raised instead of starting a call that cannot finish within the deadline."""
+    pass
+
+
+class Deadline:
+    """A point in (monotonic) time by which the whole review must be done."""
+
+    def __init__(self, seconds: float, expires_at: Optional[float] = None):
+        self.expires_at = expires_at if expires_at is not None else time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left, never negative."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def reserve(self, seconds: float) -> 'Deadline':
+        """A deadline that expires `seconds` earlier, keeping that time for later steps (e.g. posting)."""
+        return Deadline(0, expires_at=self.expires_at - seconds)
+
+    def timeout(self, default: Optional[float] = None, what: str = "call") -> float:
+        """
+        Timeout for the next call: the default, capped by the remaining time.
+
+        Raises:
+            DeadlineExceeded: If no time is left.
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Deadline exceeded before {what}")
+        return remaining if default is None else min(default, remaining)
+
+    def __repr__(self):
+        return f"<Deadline {self.remaining():.1f}s left>"
@@ -0,0 +1,210 @@
+# diff_compaction.py
+"""
+Compaction of a PR's diffs before they are put into the prompt.
+
+Removes what costs prompt tokens without giving the model anything to review:
+
+- hunks that only change whitespace between tokens (leading indentation still
+  counts in indentation-sensitive files such as Python or YAML, and string
+  literals are compared as they are),
+- hunks whose changed lines are all blocks moved from or to another hunk of
+  the PR at the same indentation,
+- pure renames, which become a one-line note,
+- context lines beyond a configurable distance from the nearest change.
+
+Trimmed hunks get regenerated headers with their real start lines, so line
+numbers reported by the model keep referring to the new file.
+"""
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from config import DIFF_CONTEXT_LINES
+from diff_hunks import Hunk
+
+# Leading whitespace is significant in these files
+INDENT_SENSITIVE = ('.py', '.pyi', '.yaml', '.yml', '.coffee', '.haml', '.pug', '.sass', 'Makefile', '.mk')
+# Moved blocks with fewer non-trivial lines than this are too likely to match by accident
+MIN_MOVED_LINES = 3
+# Lines that say nothing about where code came from: brackets, bare keywords, "return None"
+TRIVIAL_LINE = re.compile(r'^([\W_]*|(return|pass|break|continue|else|end|try|finally|default)'
+                          r'(\s+(None|null|nil|true|false|True|False|0))?\s*[\W_]*)$')
+# A string literal (the rest of the line if it is not closed), a word or a run of punctuation
+TOKEN = re.compile(r'''"(?:\\.|[^"\\])*(?:"|$)|'(?:\\.|[^'\\])*(?:'|$)|`(?:\\.|[^`\\])*(?:`|$)|\w+|[^\w\s"'`]+''')
+
+WHITESPACE = "whitespace"
+MOVED = "moved"
+
+
+class CompactedPatch:
+    """One file's diff after compaction."""
+    def __init__(self, header_lines: List[str], hunks: List[Hunk], changed: bool,
+                 dropped: Optional[Dict[str, int]] = None, note: Optional[str] = None):
+        self.header_lines = header_lines
+        self.hunks = hunks
+        self.changed = changed  # hunks differ from the original ones
+        self.dropped = dropped or {}  # reason -> number of dropped hunks
+        self.note = note  # replaces the diff entirely (e.g. a pure rename)
+
+
+def _changes(hunk: Hunk, sign: str) -> List[str]:
+    return [line[1:] for line in hunk.lines if line.startswith(sign)]
+
+
+def _tokens(text: str) -> str:
+    """The line's tokens separated by single spaces; whitespace inside string literals is kept."""
+    return " ".join(TOKEN.findall(text))
+
+
+def _indented_tokens(text: str) -> str:
+    """The line's leading whitespace followed by its tokens."""
+    stripped = text.lstrip()
+    return text[:len(text) - len(stripped)] + _tokens(stripped)
+
+
+def is_whitespace_only(filename: str, hunk: Hunk) -> bool:
+    """True if the hunk's removed and added lines differ in whitespace between tokens (or blank lines) only."""
+    key = _indented_tokens if filename.endswith(INDENT_SENSITIVE) else _tokens
+    removed = [key(line) for line in _changes(hunk, '-') if line.strip()]
+    added = [key(line) for line in _changes(hunk, '+') if line.strip()]
+    has_changes = any(line.startswith(('+', '-')) for line in hunk.lines)
+    return has_changes and removed == added
+
+
+def rename_note(header_lines: List[str]) -> Optional[str]:
+    """One-line note for a rename without content changes (git's "rename from/to" headers), else None."""
+    old = next((line[len("rename from "):] for line in header_lines if line.startswith("rename from ")), None)
+    new = next((line[len("rename to "):] for line in header_lines if line.startswith("rename to ")), None)
+    if old is None or new is None:
+        return None
+    return f"{old} -> {new}"
+
+
+def trim_context(hunk: Hunk, context_lines: int) -> List[Hunk]:
+    """
+    Keep at most context_lines unchanged lines around each change, splitting the
+    hunk where a longer run of context separates two changes.
+    """
+    changed = [i for i, line in enumerate(hunk.lines) if line.startswith(('+', '-'))]
+    if not changed:
+        return [hunk]
+    keep = set()
+    for i in changed:
+        keep.update(range(max(0, i - context_lines), min(len(hunk.lines), i + context_lines + 1)))
+    if len(keep) == len(hunk.lines):
+        return [hunk]
+
+    pieces = []
+    current = None
+    old_line, new_line = hunk.old_start, hunk.new_start
+    for i, line in enumerate(hunk.lines):
+        if line.startswith('\\'):
+            # "\ No newline at end of file" belongs to the line before it
+            if current is not None and i - 1 in keep:
+                current[2].append(line)
+            continue
+        if i in keep:
+            if current is None:
+                current = [old_line, new_line, []]
+                pieces.append(current)
+            current[2].append(line)
+        else:
+            current = None
+        if not line.startswith('+'):
+            old_line += 1
+        if not line.startswith('-'):
+            new_line += 1
+    return [Hunk(f"@@ -{old} +{new} @@" + (hunk.section if index == 0 else ""), lines, old, new,
+                 hunk.section if index == 0 else "")
+            for index, (old, new, lines) in enumerate(pieces)]
+
+
+def _changed_runs(hunk: Hunk, sign: str) -> List[List[str]]:
+    """Runs of consecutive removed or added lines (blank lines skipped), keyed by indentation and tokens."""
+    runs = [[]]
+    for line in hunk.lines:
+        if line.startswith(sign):
+            if line[1:].strip():
+                runs[-1].append(_indented_tokens(line[1:]))
+        elif not line.startswith(('+', '-', '\\')) and runs[-1]:
+            runs.append([])
+    return [run for run in runs if run]
+
+
+class _MovedBlocks:
+    """Index of the removed (or added) runs of a PR, to find where a run of the opposite kind was moved from."""
+
+    def __init__(self, runs: List[Tuple[int, List[str]]]):
+        self.runs = runs
+        self.starts = defaultdict(list)  # line -> (run index, position) of its occurrences
+        for index, (_, run) in enumerate(runs):
+            for position, line in enumerate(run):
+                self.starts[line].append((index, position))
+
+    def _longest_match(self, run: List[str], start: int, hunk_id: int) -> int:
+        longest = 0
+        for index, position in self.starts.get(run[start], ()):
+            owner, other = self.runs[index]
+            if owner == hunk_id:
+                continue  # the counterpart must come from another hunk, not from the hunk itself
+            length = 0
+            while (start + length < len(run) and position + length < len(other)
+                   and run[start + length] == other[position + length]):
+                length += 1
+            longest = max(longest, length)
+        return longest
+
+    def covers(self, run: List[str], hunk_id: int) -> bool:
+        """True if the run is made of blocks found contiguously elsewhere, each with MIN_MOVED_LINES real lines."""
+        start = 0
+        while start < len(run):
+            length = self._longest_match(run, start, hunk_id)
+            block = run[start:start + length]
+            if sum(1 for line in block if not TRIVIAL_LINE.match(line.strip())) < MIN_MOVED_LINES:
+                return False
+            start += length
+        return True
+
+
+def compact_patches(patches: List[Tuple[str, List[str], List[Hunk]]],
+                    context_lines: int = DIFF_CONTEXT_LINES) -> List[CompactedPatch]:
+    """
+    Compact the split diffs of a PR, given as (filename, header_lines, hunks) in PR order.
+
+    Moved code is detected across the whole PR: a hunk is dropped if every run of
+    lines it adds is made of blocks removed elsewhere and every run it removes is
+    made of blocks added elsewhere. Blocks must be contiguous, hold at least
+    MIN_MOVED_LINES non-trivial lines and keep their indentation, so code moved
+    into a deeper or shallower block is still reviewed.
+    """
+    all_hunks = [hunk for _, _, hunks in patches for hunk in hunks]
+    removed_blocks = _MovedBlocks([(id(hunk), run) for hunk in all_hunks for run in _changed_runs(hunk, '-')])
+    added_blocks = _MovedBlocks([(id(hunk), run) for hunk in all_hunks for run in _changed_runs(hunk, '+')])
+
+    def is_moved(hunk: Hunk) -> bool:
+        removed = _changed_runs(hunk, '-')
+        added = _changed_runs(hunk, '+')
+        if not removed and not added:
+            return False
+        return all(added_blocks.covers(run, id(hunk)) for run in removed) and \
+            all(removed_blocks.covers(run, id(hunk)) for run in added)
+
+    result = []
+    for filename, header_lines, hunks in patches:
+        if not hunks:
+            result.append(CompactedPatch(header_lines, [], False, note=rename_note(header_lines)))
+            continue
+        kept = []
+        dropped = Counter()
+        changed = False
+        for hunk in hunks:
+            if is_whitespace_only(filename, hunk):
+                dropped[WHITESPACE] += 1
+            elif is_moved(hunk):
+                dropped[MOVED] += 1
+            else:
+                trimmed = trim_context(hunk, context_lines) if context_lines is not None else [hunk]
+                changed = changed or trimmed != [hunk]
+                kept.extend(trimmed)
+        result.append(CompactedPatch(header_lines, kept, changed or bool(dropped), dict(dropped)))
+    return result
@@ -0,0 +1,148 @@
+# diff_hunks.py
+"""
+Hunk-level parsing of unified diffs.
+"""
+import re
+from typing import List, Tuple
+
+# Counts are optional: remove_hunk_counts strips them before prompting
+HUNK_HEADER = re.compile(r'^@@ -(\d+)(?:,\d+)? \+(\d+)(?:,\d+)? @@(.*)$')
+
+
+class Hunk:
+    """One hunk of a unified diff; line counts are taken from the body, not the header."""
+    def __init__(self, header: str, lines: List[str], old_start: int, new_start: int, section: str = ""):
+        self.header = header
+        self.lines = lines
+        self.old_start = old_start
+        self.new_start = new_start
+        self.section = section
+        self.old_count = sum(1 for line in lines if not line.startswith(('+', '\\')))
+        self.new_count = sum(1 for line in lines if not line.startswith(('-', '\\')))
+
+    @property
+    def new_end(self) -> int:
+        """Last line of the hunk in the new file (inclusive)."""
+        return self.new_start + max(self.new_count, 1) - 1
+
+    @property
+    def old_end(self) -> int:
+        """Last line of the hunk in the old file (inclusive)."""
+        return self.old_start + max(self.old_count, 1) - 1
+
+    def contains_new_line(self, line: int) -> bool:
+        return self.new_start <= line <= self.new_end
+
+    def contains_old_line(self, line: int) -> bool:
+        return self.old_start <= line <= self.old_end
+
+    def normalized(self) -> str:
+        """
+        Body of the hunk without its position: the header (offsets and section
+        heading) is dropped and trailing whitespace is ignored, so the same
+        change hashes identically after a rebase or cherry-pick.
+        """
+        return "\n".join(line.rstrip() for line in self.lines)
+
+    def to_text(self) -> str:
+        return "\n".join([self.header] + self.lines)
+
+    def __repr__(self):
+        return f"<Hunk -{self.old_start},{self.old_count} +{self.new_start},{self.new_count}>"
+
+
+def split_patch(patch: str) -> Tuple[List[str], List[Hunk]]:
+    """
+    Split one file's unified diff into its header lines (diff --git, ---, +++, ...)
+    and its hunks.
+    """
+    header_lines = []
+    hunks = []
+    current = None
+    for line in patch.splitlines():
+        match = HUNK_HEADER.match(line)
+        if match:
+            current = (line, [], int(match.group(1)), int(match.group(2)), match.group(3))
+            hunks.append(current)
+        elif current is not None:
+            current[1].append(line)
+        else:
+            header_lines.append(line)
+    return header_lines, [Hunk(*hunk) for hunk in hunks]
+
+
+def join_patch(header_lines: List[str], hunks: List[Hunk]) -> str:
+    """Inverse of split_patch for a subset of hunks."""
+    return "\n".join(header_lines + [hunk.to_text() for hunk in hunks])
+
+
+def split_hunk(hunk: Hunk, max_chars: int) -> List[Hunk]:
+    """
+    Cut a hunk longer than max_chars into consecutive pieces at line
+    boundaries, each with a header giving its real start lines.
+    """
+    if len(hunk.to_text()) <= max_chars:
+        return [hunk]
+    pieces = []
+    current = None
+    size = 0
+    old_line, new_line = hunk.old_start, hunk.new_start
+    for line in hunk.lines:
+        # "\ No newline at end of file" stays with the line before it
+        if current is None or (size + len(line) + 1 > max_chars and not line.startswith('\\')):
+            current = [old_line, new_line, []]
+            pieces.append(current)
+            size = len(f"@@ -{old_line} +{new_line} @@{hunk.section}")
+        current[2].append(line)
+        size += len(line) + 1
+        if not line.startswith(('+', '\\')):
+            old_line += 1
+        if not line.startswith(('-', '\\')):
+            new_line += 1
+    return [Hunk(f"@@ -{old} +{new} @@" + (hunk.section if index == 0 else ""), lines, old, new,
+                 hunk.section if index == 0 else "")
+            for index, (old, new, lines) in enumerate(pieces)]
+
+
+def group_hunks(hunks: List[Hunk], max_chars: int) -> List[List[Hunk]]:
+    """
+    Group a file's hunks, in order, into parts of at most about max_chars each;
+    hunks are only cut (by split_hunk) if a single one is larger than that.
+    """
+    parts = [[]]
+    size = 0
+    for hunk in hunks:
+        for piece in split_hunk(hunk, max_chars):
+            length = len(piece.to_text()) + 1
+            if parts[-1] and size + length > max_chars:
+                parts.append([])
+                size = 0
+            parts[-1].append(piece)
+            size += length
+    return parts if parts[0] else []
+
+
+def anchor_line(hunk: Hunk, line: int) -> Tuple[str, int]:
+    """Express a reported line relative to the hunk: ("new" or "old" side, offset from that side's start)."""
+    if not hunk.contains_new_line(line) and hunk.contains_old_line(line):
+        return "old", line - hunk.old_start
+    return "new", line - hunk.new_start
+
+
+def reanchor_line(hunk: Hunk, anchor: str, offset: int) -> int:
+    """Inverse of anchor_line for another hunk with the same body."""
+    return (hunk.old_start if anchor == "old" else hunk.new_start) + offset
+
+
+def find_hunk(hunks: List[Hunk], line: int) -> int:
+    """
+    Return the index of the hunk a reported line belongs to: the hunk containing it
+    in the new file, else in the old file (deletions), else the nearest hunk.
+    """
+    for index, hunk in enumerate(hunks):
+        if hunk.contains_new_line(line):
+            return index
+    for index, hunk in enumerate(hunks):
+        if hunk.contains_old_line(line):
+            return index
+    return min(range(len(hunks)), key=lambda i: min(abs(line - hunks[i].new_start), abs(line - hunks[i].new_end)))
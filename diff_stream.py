@@ -0,0 +1,116 @@
+# diff_stream.py
+"""
+Streaming parser for multi-file unified diffs.
+
+The diff is consumed line by line from a chunked HTTP response, and one
+PRFile is yielded per file as soon as its diff ends, so the raw diff text is
+never held whole. Only files within MAX_DIFF_FILE_CHARS (and, overall,
+MAX_DIFF_TOTAL_CHARS) keep their patch; larger ones are yielded without one
+(like binary files) and are not reviewed. The review needs every patch at
+once, so memory is bounded by MAX_DIFF_TOTAL_CHARS (50M characters by
+default) for PRs with huge generated diffs, not constant.
+"""
+import logging
+import re
+from typing import Iterable, Iterator, List, Optional
+
+from config import MAX_DIFF_FILE_CHARS, MAX_DIFF_TOTAL_CHARS
+from vcsp_interface import PRFile
+
+NEW_START = re.compile(r'\+(\d+)')
+CHUNK_SIZE = 1 << 16
+
+
+def _decode(line: bytes) -> str:
+    return line.rstrip(b"\r").decode("utf-8", errors="replace")
+
+
+def iter_byte_lines(chunks: Iterable[bytes], max_line: int = MAX_DIFF_FILE_CHARS) -> Iterator[str]:
+    """
+    Decode byte chunks (e.g. requests' iter_content) into lines without line
+    endings. A line longer than max_line bytes is cut there and the rest of it
+    is dropped, so even a huge minified line cannot fill memory.
+    """
+    pending = b""
+    cut = False  # the rest of the current line is being dropped
+    for chunk in chunks:
+        if cut:
+            end = chunk.find(b"\n")
+            if end < 0:
+                continue
+            chunk = chunk[end:]
+            cut = False
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield _decode(line)
+        if len(pending) > max_line:
+            pending = pending[:max_line]
+            cut = True
+    if pending:
+        yield _decode(pending)
+
+
+class _FileDiff:
+    """The diff of one file while it is being read; its patch is kept up to max_chars."""
+    def __init__(self, filename: str, header: str, max_chars: int):
+        self.filename = filename
+        self.max_chars = max_chars
+        self.chars = len(header)
+        self.lines: Optional[List[str]] = [header] if self.chars <= max_chars else None
+        self.changed_lines = set()
+        self.new_line = None
+
+    def add(self, line: str):
+        self.chars += len(line) + 1
+        if self.lines is not None and self.chars > self.max_chars:
+            self.lines = None  # too large to review; stop keeping it
+            self.changed_lines = set()
+        if self.lines is None:
+            return
+        self.lines.append(line)
+        if line.startswith('@@'):
+            match = NEW_START.search(line)
+            if match:
+                self.new_line = int(match.group(1)) - 1
+        elif line.startswith('+') and not line.startswith('+++'):
+            if self.new_line is not None:
+                self.new_line += 1
+                self.changed_lines.add(self.new_line)
+        elif not line.startswith('-'):
+            if self.new_line is not None:
+                self.new_line += 1
+
+    def to_pr_file(self) -> PRFile:
+        if self.lines is None:
+            logging.warning(f"Not reviewing {self.filename}: its {self.chars}-character diff is over the "
+                            f"{self.max_chars}-character limit")
+            return PRFile(self.filename, None)
+        return PRFile(self.filename, "\n".join(self.lines), self.changed_lines)
+
+
+def iter_diff_files(lines: Iterable[str], max_file_chars: int = MAX_DIFF_FILE_CHARS,
+                    max_total_chars: int = MAX_DIFF_TOTAL_CHARS) -> Iterator[PRFile]:
+    """
+    Yield one PRFile per "diff --git" section of the diff lines, as soon as it
+    is complete. A file's patch is kept if it fits into max_file_chars and into
+    what is left of max_total_chars.
+    """
+    current: Optional[_FileDiff] = None
+    kept = 0
+    for line in lines:
+        if line.startswith('diff --git'):
+            if current:
+                kept += current.chars if current.lines is not None else 0
+                yield current.to_pr_file()
+            parts = line.split()
+            if len(parts) >= 3:
+                filename = parts[2][2:]  # strip "a/"
+            else:
+                logging.warning(f"Malformed diff header: {line}")
+                filename = "unknown"
+            current = _FileDiff(filename, line, max(0, min(max_file_chars, max_total_chars - kept)))
+        elif current:
+            current.add(line)
+    if current:
+        yield current.to_pr_file()
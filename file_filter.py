@@ -0,0 +1,159 @@
+# file_filter.py
+"""
+File-level filter that keeps generated, vendored, lock and minified files away from the LLM.
+
+A file is skipped, in order of precedence, if it matches an exclude glob; it
+is always reviewed if it matches an include glob. Otherwise it is skipped when
+the repository's ``.gitattributes`` marks it ``linguist-generated`` or
+``linguist-vendored``, when it matches a well-known lock/generated/vendored
+path, or when the added lines look machine-made: a generated-file header,
+minified (very long) lines, or high-entropy encoded data.
+"""
+import math
+import re
+from collections import Counter
+from fnmatch import translate
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from diff_hunks import split_patch
+
+LOCK_FILES = [
+    "package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml", "bun.lockb", "Pipfile.lock",
+    "poetry.lock", "uv.lock", "Cargo.lock", "go.sum", "composer.lock", "Gemfile.lock", "Podfile.lock",
+    "packages.lock.json", "flake.lock",
+]
+GENERATED_FILES = [
+    "*_pb2.py", "*_pb2_grpc.py", "*_pb2.pyi", "*.pb.go", "*.pb.cc", "*.pb.h", "*_grpc.pb.go", "*.g.dart",
+    "*.min.js", "*.min.css", "*.map", "*.snap", "*.designer.cs", "*_generated.*",
+]
+VENDORED_PATHS = ["vendor/*", "*/vendor/*", "node_modules/*", "*/node_modules/*", "third_party/*", "*/third_party/*"]
+
+GENERATED_HEADER = re.compile(r"@generated|\bDO NOT EDIT\b|\bauto-?generated\b|\bautomatically generated\b",
+                              re.IGNORECASE)
+# Only the top of a file carries a generated-file header
+HEADER_LINES = 10
+# Minified code: few, very long lines; one long line (a long string, a data URL) in an ordinary file is not enough
+MINIFIED_AVERAGE_LINE = 300
+MINIFIED_MIN_LONG_LINES = 3
+MINIFIED_MIN_CHARS = 20000
+# Source code stays below about 5.5 bits per character; base64 and similar encodings are near 6
+ENTROPY_BITS_PER_CHAR = 5.8
+ENTROPY_MIN_CHARS = 1000
+
+
+def compile_globs(patterns: Iterable[str]) -> Optional[re.Pattern]:
+    """Compile globs into one regex matched against the full path; a pattern without "/" also matches basenames."""
+    parts = []
+    for pattern in patterns:
+        pattern = pattern.lstrip("/")
+        parts.append(translate(pattern) if "/" in pattern else f"(?:.*/)?{translate(pattern)}")
+    return re.compile("|".join(parts)) if parts else None
+
+
+def parse_gitattributes(text: str) -> List[Tuple[re.Pattern, Dict[str, bool]]]:
+    """
+    Return (path regex, {attribute: value}) for the linguist-generated and
+    linguist-vendored attributes set in a .gitattributes file, in file order.
+    """
+    rules = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        pattern, *attributes = line.split()
+        values = {}
+        for attribute in attributes:
+            negated = attribute.startswith(("-", "!"))
+            name, _, value = attribute.lstrip("-!").partition("=")
+            if name in ("linguist-generated", "linguist-vendored"):
+                values[name] = not negated and value.lower() not in ("false", "0")
+        if values:
+            rules.append((compile_globs([pattern]), values))
+    return rules
+
+
+def added_lines(patch: str) -> List[str]:
+    return [line[1:] for line in patch.splitlines() if line.startswith("+") and not line.startswith("+++")]
+
+
+def header_lines(patch: str) -> List[str]:
+    """The first HEADER_LINES lines of the new file, as far as the patch shows them (hunks starting at line 1)."""
+    lines = []
+    for hunk in split_patch(patch)[1]:
+        if hunk.new_start > 1:
+            continue
+        lines.extend(line[1:] for line in hunk.lines if not line.startswith(("-", "\\")))
+    return lines[:HEADER_LINES]
+
+
+def entropy(text: str) -> float:
+    """Shannon entropy in bits per character."""
+    counts = Counter(text)
+    return -sum(n / len(text) * math.log2(n / len(text)) for n in counts.values())
+
+
+def content_skip_reason(patch: str) -> Optional[str]:
+    """Reason the added lines look machine-made, or None."""
+    added = added_lines(patch)
+    if not added:
+        return None
+    if any(GENERATED_HEADER.search(line) for line in header_lines(patch)):
+        return "generated file header"
+    text = "\n".join(added)
+    if len(text) / len(added) > MINIFIED_AVERAGE_LINE and (
+            len(text) >= MINIFIED_MIN_CHARS or
+            sum(len(line) > MINIFIED_AVERAGE_LINE for line in added) >= MINIFIED_MIN_LONG_LINES):
+        return "minified"
+    if len(text) >= ENTROPY_MIN_CHARS and entropy(text) > ENTROPY_BITS_PER_CHAR:
+        return "high-entropy content"
+    return None
+
+
+DEFAULT_RULES = [
+    (compile_globs(LOCK_FILES), "lock file"),
+    (compile_globs(GENERATED_FILES), "generated"),
+    (compile_globs(VENDORED_PATHS), "vendored"),
+]
+
+
+class FileFilter:
+    """Decides which PR files are worth an LLM review; globs are compiled once."""
+
+    def __init__(self, include: Iterable[str] = (), exclude: Iterable[str] = (), gitattributes: str = ""):
+        self.include_patterns = list(include)
+        self.exclude_patterns = list(exclude)
+        self.include = compile_globs(self.include_patterns)
+        self.exclude = compile_globs(self.exclude_patterns)
+        self.attributes = parse_gitattributes(gitattributes) if gitattributes else []
+
+    def with_gitattributes(self, gitattributes: Optional[str]) -> 'FileFilter':
+        """A copy of this filter that also honours the given .gitattributes content."""
+        return FileFilter(self.include_patterns, self.exclude_patterns, gitattributes or "")
+
+    def _attribute_reason(self, filename: str) -> Tuple[Optional[str], bool]:
+        """(skip reason, explicitly reviewable) from .gitattributes; later lines override earlier ones."""
+        values = {}
+        for pattern, attributes in self.attributes:
+            if pattern.match(filename):
+                values.update(attributes)
+        if values.get("linguist-generated"):
+            return "linguist-generated", False
+        if values.get("linguist-vendored"):
+            return "linguist-vendored", False
+        return None, bool(values)
+
+    def skip_reason(self, filename: str, patch: str) -> Optional[str]:
+        """Why the file should not be reviewed, or None to review it."""
+        if self.exclude and self.exclude.match(filename):
+            return "excluded"
+        if self.include and self.include.match(filename):
+            return None
+        reason, explicit = self._attribute_reason(filename)
+        if reason:
+            return reason
+        if not explicit:
+            # linguist-generated=false / linguist-vendored=false overrides the built-in patterns
+            for pattern, default_reason in DEFAULT_RULES:
+                if pattern.match(filename):
+                    return default_reason
+        return content_skip_reason(patch)
@@ -1,45 +1,122 @@
+import datetime
+import hashlib
 import logging
 import os
+import threading
+import time
 import google.generativeai as genai
+from google.generativeai import caching
 from llm_interface import LLMInterface, ModelResult
-from config import LOG_CHAR_LIMIT
+from config import GEMINI_CACHE_MIN_TOKENS, GEMINI_CACHE_TTL, LOG_CHAR_LIMIT
+
+# Rough size of a token, to skip caching prefixes below the provider's minimum
+CHARS_PER_TOKEN = 4
 
 
 class GeminiLLM(LLMInterface):
-    def __init__(self):
+    def __init__(self, model: str = None):
         api_key = os.getenv("GOOGLE_API_KEY")
         if not api_key:
             raise ValueError("GOOGLE_API_KEY environment variable is required for Gemini")
         genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(os.getenv("GEMINI_MODEL", "gemini-2.0-flash"))
+        self.model = genai.GenerativeModel(model or os.getenv("GEMINI_MODEL", "gemini-2.0-flash"))
+        self._lock = threading.Lock()
+        # system prompt -> model with that system instruction
+        self._models = {}
+        # prefix hash -> (model bound to a cached context or None if creating it failed, expiry),
+        # or None once the prefix was seen
+        self._contexts = {}
+        # prefix hashes whose context is being created
+        self._creating = set()
+
+    @property
+    def model_name(self) -> str:
+        return self.model.model_name
+
+    def _model_for(self, system_prompt: str):
+        with self._lock:
+            model = self._models.get(system_prompt)
+            if model is None:
+                model = genai.GenerativeModel(self.model.model_name, system_instruction=system_prompt)
+                self._models[system_prompt] = model
+            return model
+
+    def _cached_model_for(self, system_prompt: str, user_prompt: str, timeout: float):
+        """
+        A model bound to an explicit context cache of the system and user prompt,
+        or None. The cache is created when a long enough prefix is used a
+        second time (e.g. by the next shard of the same PR), by one thread only;
+        others send the whole prompt meanwhile. A failed creation is not retried
+        for GEMINI_CACHE_TTL seconds.
+        """
+        if (len(system_prompt) + len(user_prompt)) / CHARS_PER_TOKEN < GEMINI_CACHE_MIN_TOKENS:
+            return None
+        key = hashlib.sha256(f"{system_prompt}\0{user_prompt}".encode("utf-8")).hexdigest()
+        with self._lock:
+            if key not in self._contexts:
+                self._contexts[key] = None
+                return None
+            entry = self._contexts[key]
+            if entry is not None and entry[1] > time.monotonic():
+                return entry[0]
+            if key in self._creating:
+                return None
+            self._creating.add(key)
+        try:
+            model = genai.GenerativeModel.from_cached_content(
+                cached_content=self._create_context(system_prompt, user_prompt, timeout))
+            # stop using the cache a little before the provider expires it
+            entry = (model, time.monotonic() + GEMINI_CACHE_TTL * 0.9)
+        except Exception as e:
+            logging.debug(f"Gemini context caching unavailable: {str(e)}")
+            model = None
+            entry = (None, time.monotonic() + GEMINI_CACHE_TTL)
+        with self._lock:
+            self._contexts[key] = entry
+            self._creating.discard(key)
+        return model
+
+    def _create_context(self, system_prompt: str, user_prompt: str, timeout: float) -> caching.CachedContent:
+        # CachedContent.create takes no timeout, so send its request ourselves
+        request = caching.CachedContent._prepare_create_request(
+            model=self.model.model_name,
+            system_instruction=system_prompt,
+            contents=[{"role": "user", "parts": [user_prompt]}],
+            ttl=datetime.timedelta(seconds=GEMINI_CACHE_TTL),
+        )
+        response = caching.get_default_cache_client().create_cached_content(request, timeout=timeout)
+        return caching.CachedContent._from_obj(response)
 
     def answer(self, system_prompt: str, user_prompt: str, content: str) -> ModelResult:
         """Generate a response for the given prompts and content."""
-        full_input = f"{system_prompt}\n\n{user_prompt}\n\n{content}" if user_prompt else f"{system_prompt}\n\n{content}"
         logging.debug(
-            f"Gemini Request:\nModel: {self.model.model_name}\nContent: {full_input[:LOG_CHAR_LIMIT]}... (truncated)")
+            f"Gemini Request:\nModel: {self.model.model_name}\nSystem Prompt: {system_prompt[:LOG_CHAR_LIMIT]}..."
+            f"\nUser Prompt: {user_prompt[:LOG_CHAR_LIMIT]}...\nContent: {content[:LOG_CHAR_LIMIT]}... (truncated)")
 
+        timeout = self.request_timeout()
         try:
-            response = self.model.generate_content(
-                full_input,
+            # the system instruction and user prompt come first, so they can be served from a context cache
+            model = self._cached_model_for(system_prompt, user_prompt, timeout) if user_prompt else None
+            if model is not None:
+                contents = [{"role": "user", "parts": [content]}]
+            else:
+                model = self._model_for(system_prompt)
+                contents = [{"role": "user", "parts": [user_prompt, content] if user_prompt else [content]}]
+            response = model.generate_content(
+                contents,
                 generation_config={
                     "temperature": 0.0  # Maximum consistency
-                }
+                },
+                request_options={"timeout": timeout}
             )
             raw_response = response.text.strip()
-            if response.usage_metadata is None:
-                usage = {
-                    "total_token_count": 0,
-                    "prompt_token_count": 0,
-                    "candidates_token_count": 0
-                }
-            else:
-                usage = response.usage_metadata
+            usage = response.usage_metadata
             logging.debug(f"Raw Response:\n{raw_response[:LOG_CHAR_LIMIT]}... (truncated)")            
             return ModelResult(response=raw_response, 
-                             total_tokens=usage.total_token_count,
-                             prompt_tokens=usage.prompt_token_count,
-                             completion_tokens=usage.candidates_token_count)
+                             total_tokens=getattr(usage, "total_token_count", 0),
+                             prompt_tokens=getattr(usage, "prompt_token_count", 0),
+                             completion_tokens=getattr(usage, "candidates_token_count", 0),
+                             cached_tokens=getattr(usage, "cached_content_token_count", 0))
         except Exception as e:
             logging.error(f"Error communicating with Gemini API: {str(e)}")            
             return None
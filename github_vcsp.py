@@ -1,7 +1,78 @@
+import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable
+import requests
 from github import Github
-from vcsp_interface import PR, Commit, PRFile, VCSPInterface
+from blob_cache import content_keys, default_blob_cache
+from config import PAGE_CONCURRENCY
+from vcsp_interface import PR, Commit, PRFile, ReviewComment, VCSPInterface
 from github import Github, GithubException
+from github.Requester import HTTPSRequestsConnectionClass
+from http_cache import CachingAdapter, default_http_cache
+
+GRAPHQL_URL = "https://api.github.com/graphql"
+# REST list pages (PR files, open PRs) at GitHub's maximum instead of the default 30
+PER_PAGE = 100
+# Files whose content is fetched by one GraphQL query
+FILES_PER_QUERY = 50
+
+REVIEW_THREADS_QUERY = """
+query($owner: String!, $name: String!, $number: Int!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    pullRequest(number: $number) {
+      reviewThreads(first: 100, after: $cursor) {
+        pageInfo { hasNextPage endCursor }
+        nodes {
+          id isResolved isOutdated path line
+          comments(first: 1) { nodes { body createdAt } }
+        }
+      }
+    }
+  }
+}
+"""
+
+RESOLVE_THREAD_MUTATION = """
+mutation($threadId: ID!) {
+  resolveReviewThread(input: {threadId: $threadId}) { thread { isResolved } }
+}
+"""
+
+
+def blob_query(count: int) -> str:
+    """Query for the text of count files, one aliased object(expression: "<ref>:<path>") each."""
+    variables = "".join(f", $e{i}: String!" for i in range(count))
+    objects = "".join(f"    f{i}: object(expression: $e{i}) {{ ... on Blob {{ isBinary isTruncated text }} }}\n"
+                      for i in range(count))
+    return (f"query($owner: String!, $name: String!{variables}) {{\n"
+            f"  repository(owner: $owner, name: $name) {{\n{objects}  }}\n}}\n")
+
+
+class CachingHTTPSConnection(HTTPSRequestsConnectionClass):
+    """PyGithub connection whose GET requests are revalidated against the HTTP cache."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.adapter = CachingAdapter(default_http_cache(), max_retries=self.retry,
+                                      pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        self.session.mount("https://", self.adapter)
+
+
+def use_http_cache(client: Github):
+    """
+    Send the client's REST calls through CachingHTTPSConnection. PyGithub has no
+    per-client hook and Requester.injectConnectionClasses would change every
+    client and turn off connection reuse, so only this client's requester is
+    switched.
+    """
+    requester = getattr(client, "_Github__requester", None)
+    if requester is None or not hasattr(requester, "_Requester__connectionClass"):
+        logging.debug("PyGithub's requester has changed; GitHub requests bypass the HTTP cache")
+        return
+    if requester._Requester__connectionClass is HTTPSRequestsConnectionClass:
+        requester._Requester__connectionClass = CachingHTTPSConnection
+
 
 class GithubVCSP(VCSPInterface):
     def __init__(self):
@@ -9,11 +80,42 @@ class GithubVCSP(VCSPInterface):
         if not token:
             raise ValueError("GITHUB_TOKEN environment variable is required")
 
-        self.client = Github(token)
+        self.token = token
+        self.client = Github(token, per_page=PER_PAGE)
+        if default_http_cache():
+            use_http_cache(self.client)
+        self.blob_cache = default_blob_cache()
+        # (repo, head sha, path) -> blob sha, learned from the PR file listing
+        self._blob_shas = {}
+        # (repo, ref, path) -> text, fetched in bulk by prefetch_file_contents
+        self._contents = {}
+        self._repos = {}
+        # (repo, PR number) -> PR object of the last get_pull_request, reused to list its files
+        self._pulls = {}
+        # (repo, commit sha) -> (commit object, PR object) to post comments on
+        self._commit_pulls = {}
+
+    def _check_deadline(self):
+        """PyGithub fixes its timeout when the client is created, so only check that time is left."""
+        self.request_timeout()
+
+    def _repo(self, repo_name: str):
+        """The repository object; lazy, so it costs no request of its own."""
+        if repo_name not in self._repos:
+            self._repos[repo_name] = self.client.get_repo(repo_name, lazy=True)
+        return self._repos[repo_name]
+
+    def _pull(self, repo_name: str, pr_number: int):
+        pull = self._pulls.get((repo_name, pr_number))
+        if pull is None:
+            pull = self._pulls[(repo_name, pr_number)] = self._repo(repo_name).get_pull(pr_number)
+        return pull
 
     def get_pull_request(self, repo_name: str, pr_number: int):
+        self._check_deadline()
         try:
-            github_pr = self.client.get_repo(repo_name).get_pull(pr_number)
+            # always fetched anew, so a review sees the current head
+            github_pr = self._pulls[(repo_name, pr_number)] = self._repo(repo_name).get_pull(pr_number)
             return PR(
                 title=github_pr.title,
                 body=github_pr.body,
@@ -23,32 +125,110 @@ class GithubVCSP(VCSPInterface):
         except GithubException as e:
             raise Exception(f"Failed to get GitHub PR {pr_number} in {repo_name}: {str(e)}")
 
+    def get_open_pull_requests(self, repo_name: str):
+        self._check_deadline()
+        try:
+            return [pr.number for pr in self._repo(repo_name).get_pulls(state="open")]
+        except GithubException as e:
+            raise Exception(f"Failed to list open GitHub PRs in {repo_name}: {str(e)}")
+
     def get_files_in_pr(self, repo_name: str, pr_number: int):
+        self._check_deadline()
         try:
-            pr = self.client.get_repo(repo_name).get_pull(pr_number)
-            return [PRFile(file.filename, file.patch) for file in pr.get_files()]
+            pr = self._pull(repo_name, pr_number)
+            head_sha = pr.head.sha
+            files = []
+            for file in pr.get_files():
+                if file.status != "removed" and isinstance(file.sha, str):
+                    self._blob_shas[(repo_name, head_sha, file.filename)] = file.sha
+                files.append(PRFile(file.filename, file.patch))
+            return files
         except GithubException as e:
             raise Exception(f"Failed to get files in GitHub PR {pr_number}: {str(e)}")
 
+    def _content_keys(self, repo_name: str, file_path: str, ref: str) -> list:
+        return content_keys("github", repo_name, file_path, ref,
+                            self._blob_shas.get((repo_name, ref, file_path))) if self.blob_cache else []
+
+    def prefetch_file_contents(self, repo_name: str, file_paths: Iterable[str], ref: str) -> int:
+        """
+        Fetch the text of many files through GraphQL, FILES_PER_QUERY files per
+        query, instead of one REST request per file. Binary, truncated and
+        missing files are left to get_file_content.
+        """
+        wanted = []
+        for path in dict.fromkeys(file_paths):
+            if (repo_name, ref, path) in self._contents:
+                continue
+            cache_keys = self._content_keys(repo_name, path, ref)
+            cached = self.blob_cache.get_any(cache_keys) if cache_keys else None
+            if cached is not None:
+                self._contents[(repo_name, ref, path)] = cached
+            else:
+                wanted.append(path)
+        if not wanted:
+            return 0
+        owner, _, name = repo_name.partition("/")
+
+        def fetch(batch: list) -> dict:
+            variables = {"owner": owner, "name": name}
+            variables.update((f"e{i}", f"{ref}:{path}") for i, path in enumerate(batch))
+            return self._graphql(blob_query(len(batch)), variables)["repository"]
+
+        batches = [wanted[start:start + FILES_PER_QUERY] for start in range(0, len(wanted), FILES_PER_QUERY)]
+        fetched = 0
+        try:
+            with ThreadPoolExecutor(max_workers=min(PAGE_CONCURRENCY, len(batches)),
+                                    thread_name_prefix="github-blobs") as executor:
+                for batch, blobs in zip(batches, executor.map(fetch, batches)):
+                    for i, path in enumerate(batch):
+                        blob = blobs.get(f"f{i}")
+                        if not blob or blob.get("isBinary") or blob.get("isTruncated") or blob.get("text") is None:
+                            continue
+                        self._contents[(repo_name, ref, path)] = blob["text"]
+                        cache_keys = self._content_keys(repo_name, path, ref)
+                        if cache_keys:
+                            self.blob_cache.put_all(cache_keys, blob["text"])
+                        fetched += 1
+        except Exception as e:
+            logging.warning(f"Failed to fetch file contents in bulk; fetching them one by one: {str(e)}")
+        logging.debug(f"Fetched {fetched} of {len(wanted)} file(s) in {len(batches)} GraphQL request(s)")
+        return fetched
+
     def get_file_content(self, repo_name: str, file_path: str, ref: str = None) -> str:
+        prefetched = self._contents.get((repo_name, ref, file_path))
+        if prefetched is not None:
+            return prefetched
+        cache_keys = self._content_keys(repo_name, file_path, ref)
+        cached = self.blob_cache.get_any(cache_keys) if cache_keys else None
+        if cached is not None:
+            return cached
+        self._check_deadline()
         try:
-            content = self.client.get_repo(repo_name).get_contents(file_path, ref=ref)
+            content = self._repo(repo_name).get_contents(file_path, ref=ref)
             if content.decoded_content is None:
                 raise ValueError(f"File content is not decodable (possibly binary) for {file_path}")
-            return content.decoded_content.decode('utf-8')
+            text = content.decoded_content.decode('utf-8')
+            if cache_keys:
+                self.blob_cache.put_all(cache_keys, text)
+            return text
         except UnicodeDecodeError as e:
             raise ValueError(f"Failed to decode file content for {file_path} (possibly binary): {str(e)}")
         except GithubException as e:
+            if e.status == 404:
+                raise FileNotFoundError(f"{file_path} does not exist at {ref} in {repo_name}")
             raise Exception(f"Failed to get file content for {file_path} in {repo_name}: {str(e)}")
 
     def create_review_comment(self, repo_name: str, commit: str, file_path: str, line: int, comment: str, side: str):
+        self._check_deadline()
         try:
-            repo = self.client.get_repo(repo_name)
-            commit_obj = repo.get_commit(commit)
-            prs = commit_obj.get_pulls()
-            if not prs.totalCount:
-                raise Exception(f"No pull request found for commit {commit} in {repo_name}")
-            pr = prs[0]
+            if (repo_name, commit) not in self._commit_pulls:
+                commit_obj = self._repo(repo_name).get_commit(commit)
+                prs = commit_obj.get_pulls()
+                if not prs.totalCount:
+                    raise Exception(f"No pull request found for commit {commit} in {repo_name}")
+                self._commit_pulls[(repo_name, commit)] = (commit_obj, prs[0])
+            commit_obj, pr = self._commit_pulls[(repo_name, commit)]
             print(f"Posting comment on {file_path} at position {line} in commit {commit}")
             if file_path != "":                
                 pr.create_review_comment(comment, commit_obj, file_path, line)
@@ -60,9 +240,9 @@ class GithubVCSP(VCSPInterface):
 
     def get_commit(self, repo_name: str, commit_sha: str):
         """Retrieve a commit by its SHA from a GitHub repository."""
+        self._check_deadline()
         try:
-            repo = self.client.get_repo(repo_name)
-            commit = repo.get_commit(commit_sha)
+            commit = self._repo(repo_name).get_commit(commit_sha)
             return Commit(
                 sha=commit.sha,
                 message=commit.commit.message,
@@ -71,3 +251,41 @@ class GithubVCSP(VCSPInterface):
             )
         except GithubException as e:
             raise Exception(f"Failed to get GitHub commit {commit_sha} in {repo_name}: {str(e)}")
+
+    def _graphql(self, query: str, variables: dict) -> dict:
+        """Run a GraphQL query or mutation and return its data."""
+        response = requests.post(GRAPHQL_URL, json={"query": query, "variables": variables},
+                                 headers={"Authorization": f"bearer {self.token}"}, timeout=self.request_timeout())
+        response.raise_for_status()
+        payload = response.json()
+        if payload.get("errors"):
+            raise Exception(f"GitHub GraphQL error: {payload['errors'][0].get('message')}")
+        return payload["data"]
+
+    def get_ai_comments(self, repo_name: str, pr_number: int):
+        """List the PR's review threads started by an AI comment, 100 threads per request."""
+        owner, _, name = repo_name.partition("/")
+        comments = []
+        cursor = None
+        try:
+            while True:
+                data = self._graphql(REVIEW_THREADS_QUERY,
+                                     {"owner": owner, "name": name, "number": pr_number, "cursor": cursor})
+                threads = data["repository"]["pullRequest"]["reviewThreads"]
+                for thread in threads["nodes"]:
+                    first = thread["comments"]["nodes"]
+                    if first and "AI Comment:" in first[0]["body"]:
+                        comments.append(ReviewComment(thread["id"], thread["path"],
+                                                      None if thread["isOutdated"] else thread["line"],
+                                                      first[0]["body"], thread["isResolved"], first[0]["createdAt"]))
+                if not threads["pageInfo"]["hasNextPage"]:
+                    return comments
+                cursor = threads["pageInfo"]["endCursor"]
+        except (requests.RequestException, KeyError, TypeError) as e:
+            raise Exception(f"Failed to list review comments of GitHub PR {pr_number} in {repo_name}: {str(e)}")
+
+    def resolve_comment(self, repo_name: str, pr_number: int, comment: ReviewComment):
+        try:
+            self._graphql(RESOLVE_THREAD_MUTATION, {"threadId": comment.id})
+        except requests.RequestException as e:
+            raise Exception(f"Failed to resolve GitHub review thread {comment.id}: {str(e)}")
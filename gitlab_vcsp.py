@@ -1,8 +1,19 @@
 # gitlab_vcsp.py
+import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 import gitlab
-from gitlab.exceptions import GitlabGetError, GitlabCreateError
-from vcsp_interface import PR, Commit, PRFile, VCSPInterface
+import requests
+from gitlab.exceptions import (GitlabGetError, GitlabCreateError, GitlabHeadError, GitlabHttpError, GitlabListError,
+                               GitlabUpdateError)
+from gitlab.utils import EncodedId
+from blob_cache import content_keys, default_blob_cache
+from config import HTTP_TIMEOUT, PAGE_CONCURRENCY
+from http_cache import mount_http_cache
+from vcsp_interface import PR, Commit, PRFile, ReviewComment, VCSPInterface
+
+# Largest page length of the MR diffs listing
+DIFFS_PER_PAGE = 100
 
 
 class GitlabVCSP(VCSPInterface):
@@ -11,18 +22,32 @@ class GitlabVCSP(VCSPInterface):
         if not token:
             raise ValueError("GITLAB_TOKEN environment variable is required")
 
-        self.client = gitlab.Gitlab("https://gitlab.com", private_token=token)
+        self.client = gitlab.Gitlab("https://gitlab.com", private_token=token, timeout=HTTP_TIMEOUT,
+                                    session=mount_http_cache(requests.Session()))
+        self.blob_cache = default_blob_cache()
+        # (repo, MR iid) -> merge request, fetched once per run
+        self._merge_requests = {}
+        # (repo, MR iid) -> {path: diff} read without size limits, for collapsed diffs
+        self._raw_changes = {}
 
     def get_repository(self, repo_name: str):
+        timeout = self.request_timeout()
         try:
-            return self.client.projects.get(repo_name)
+            return self.client.projects.get(repo_name, timeout=timeout)
         except GitlabGetError as e:
             raise Exception(f"Failed to get GitLab repository {repo_name}: {str(e)}")
 
+    def _merge_request(self, repo_name: str, pr_number: int):
+        """The merge request, fetched once; the project itself is never fetched for it."""
+        key = (repo_name, pr_number)
+        if key not in self._merge_requests:
+            project = self.client.projects.get(repo_name, lazy=True)
+            self._merge_requests[key] = project.mergerequests.get(pr_number, timeout=self.request_timeout())
+        return self._merge_requests[key]
+
     def get_pull_request(self, repo_name: str, pr_number: int):
         try:
-            project = self.client.projects.get(repo_name)
-            mr = project.mergerequests.get(pr_number)
+            mr = self._merge_request(repo_name, pr_number)
             return PR(
                 title=mr.title,
                 body=mr.description,
@@ -32,38 +57,116 @@ class GitlabVCSP(VCSPInterface):
         except GitlabGetError as e:
             raise Exception(f"Failed to get GitLab MR {pr_number} in {repo_name}: {str(e)}")
 
+    def get_open_pull_requests(self, repo_name: str):
+        timeout = self.request_timeout()
+        try:
+            project = self.client.projects.get(repo_name, lazy=True)
+            return [mr.iid for mr in project.mergerequests.list(state="opened", iterator=True, timeout=timeout)]
+        except (GitlabGetError, GitlabListError) as e:
+            raise Exception(f"Failed to list open GitLab MRs in {repo_name}: {str(e)}")
+
+    def _diffs_page(self, path: str, page: int):
+        """One page of the MR diffs listing and the number of pages (None if GitLab does not count them)."""
+        response = self.client.http_request("get", path, query_data={"page": page, "per_page": DIFFS_PER_PAGE},
+                                            timeout=self.request_timeout())
+        total_pages = response.headers.get("X-Total-Pages")
+        return response.json(), int(total_pages) if total_pages else None
+
     def get_files_in_pr(self, repo_name: str, pr_number: int):
+        """
+        The MR's files, in order. When GitLab reports the page count the remaining
+        pages are fetched concurrently; otherwise pages are requested until one
+        comes back short.
+        """
+        path = f"/projects/{EncodedId(repo_name)}/merge_requests/{pr_number}/diffs"
         try:
-            project = self.client.projects.get(repo_name)
-            mr = project.mergerequests.get(pr_number)
-            changes = mr.changes()['changes']
-            return [PRFile(change['new_path'], change.get('diff', '')) for change in changes]
-        except GitlabGetError as e:
+            diffs, total_pages = self._diffs_page(path, 1)
+            files = self._to_pr_files(repo_name, pr_number, diffs)
+            if total_pages is not None:
+                pages = range(2, total_pages + 1)
+                with ThreadPoolExecutor(max_workers=max(1, min(PAGE_CONCURRENCY, len(pages))),
+                                        thread_name_prefix="gitlab-page") as executor:
+                    for diffs, _ in executor.map(lambda page: self._diffs_page(path, page), pages):
+                        files.extend(self._to_pr_files(repo_name, pr_number, diffs))
+                return files
+            page = 1
+            while len(diffs) == DIFFS_PER_PAGE:
+                page += 1
+                diffs, _ = self._diffs_page(path, page)
+                files.extend(self._to_pr_files(repo_name, pr_number, diffs))
+            return files
+        except GitlabHttpError as e:
             raise Exception(f"Failed to get files in GitLab MR {pr_number}: {str(e)}")
 
+    def _to_pr_files(self, repo_name: str, pr_number: int, diffs: list):
+        """PRFiles of a page of diffs; diffs GitLab collapsed for size are fetched raw from Gitaly."""
+        overflow = [diff["new_path"] for diff in diffs
+                    if not diff.get("diff") and (diff.get("too_large") or diff.get("collapsed"))]
+        raw = self._raw_diffs(repo_name, pr_number, overflow) if overflow else {}
+        return [PRFile(diff["new_path"], diff.get("diff") or raw.get(diff["new_path"], "")) for diff in diffs]
+
+    def _raw_diffs(self, repo_name: str, pr_number: int, paths: list) -> dict:
+        """{path: diff} of the given files, read without GitLab's diff size limits."""
+        key = (repo_name, pr_number)
+        if key not in self._raw_changes:
+            logging.info(f"Fetching collapsed diff(s) of MR {pr_number} from Gitaly: {', '.join(paths)}")
+            try:
+                mr = self._merge_request(repo_name, pr_number)
+                changes = mr.changes(access_raw_diffs=True, timeout=self.request_timeout())
+            except GitlabGetError as e:
+                logging.warning(f"Failed to fetch raw diffs of MR {pr_number}; not reviewing {', '.join(paths)}: "
+                                f"{str(e)}")
+                return {}
+            self._raw_changes[key] = {change["new_path"]: change.get("diff", "") for change in changes["changes"]}
+        return {path: self._raw_changes[key].get(path, "") for path in paths}
+
     def get_file_content(self, repo_name: str, file_path: str, ref: str = None) -> str:
         try:
-            project = self.client.projects.get(repo_name)
             ref = ref or 'main'
-            file = project.files.get(file_path=file_path, ref=ref)
+            cache_keys = content_keys("gitlab", repo_name, file_path, ref) if self.blob_cache else []
+            cached = self.blob_cache.get_any(cache_keys) if cache_keys else None
+            if cached is not None:
+                return cached
+            timeout = self.request_timeout()
+            project = self.client.projects.get(repo_name, lazy=True)
+            if self.blob_cache:
+                # A HEAD request returns the blob id without the body, so files
+                # unchanged since an earlier review are served from the cache
+                try:
+                    blob_id = project.files.head(file_path, ref=ref, timeout=timeout).get("X-Gitlab-Blob-Id")
+                except GitlabHeadError:
+                    blob_id = None
+                blob_keys = content_keys("gitlab", repo_name, file_path, blob_sha=blob_id)
+                cached = self.blob_cache.get_any(blob_keys)
+                if cached is not None:
+                    self.blob_cache.put_all(cache_keys, cached)
+                    return cached
+                cache_keys += blob_keys
+            file = project.files.get(file_path=file_path, ref=ref, timeout=timeout)
             content_bytes = file.decode()
             if not content_bytes:
                 raise ValueError(f"File content is empty or not decodable for {file_path}")
-            return content_bytes.decode("utf-8")
+            text = content_bytes.decode("utf-8")
+            if cache_keys:
+                self.blob_cache.put_all(cache_keys, text)
+            return text
         except UnicodeDecodeError as e:
             raise ValueError(f"Failed to decode file content for {file_path} (possibly binary): {str(e)}")
         except GitlabGetError as e:
+            if e.response_code == 404:
+                raise FileNotFoundError(f"{file_path} does not exist at {ref} in {repo_name}")
             raise Exception(f"Failed to get file content for {file_path} in {repo_name}: {str(e)}")
 
     def create_review_comment(self, repo_name: str, commit: str, file_path: str, line: int, comment: str, side: str):
+        timeout = self.request_timeout()
         try:
-            project = self.client.projects.get(repo_name)
+            project = self.client.projects.get(repo_name, lazy=True)
             # Find the merge request associated with the commit
-            mrs = project.commits.get(commit).merge_requests()
+            mrs = project.commits.get(commit, lazy=True).merge_requests(timeout=timeout)
             if not mrs:
                 raise Exception(f"No merge request found for commit {commit}")
             mr_id = mrs[0]['iid']  # Get the ID of the first merge request
-            mr = project.mergerequests.get(mr_id)  # Fetch the merge request object
+            mr = self._merge_request(repo_name, mr_id)  # Fetch the merge request object (once per run)
             if file_path != "":
                 # Create a discussion with a position-based comment
                 mr.discussions.create({
@@ -76,10 +179,10 @@ class GitlabVCSP(VCSPInterface):
                         'new_path': file_path,
                         'new_line': line
                     }
-                })
+                }, timeout=timeout)
             else:
                 # Create a comment on the merge request
-                mr.notes.create({'body': comment})
+                mr.notes.create({'body': comment}, timeout=timeout)
 
             return True
         except GitlabCreateError as e:
@@ -87,9 +190,10 @@ class GitlabVCSP(VCSPInterface):
 
     def get_commit(self, repo_name: str, commit_sha: str):
         """Retrieve a commit by its SHA from a GitLab repository."""
+        timeout = self.request_timeout()
         try:
-            project = self.client.projects.get(repo_name)
-            commit = project.commits.get(commit_sha)
+            project = self.client.projects.get(repo_name, lazy=True)
+            commit = project.commits.get(commit_sha, timeout=timeout)
             return Commit(
                 sha=commit.id,
                 message=commit.message,
@@ -98,3 +202,29 @@ class GitlabVCSP(VCSPInterface):
             )
         except GitlabGetError as e:
             raise Exception(f"Failed to get GitLab commit {commit_sha} in {repo_name}: {str(e)}")
+
+    def get_ai_comments(self, repo_name: str, pr_number: int):
+        """List the MR's discussions started by an AI comment."""
+        timeout = self.request_timeout()
+        try:
+            mr = self.client.projects.get(repo_name, lazy=True).mergerequests.get(pr_number, lazy=True)
+            comments = []
+            for discussion in mr.discussions.list(iterator=True, per_page=100, timeout=timeout):
+                notes = discussion.attributes.get("notes") or []
+                if not notes or "AI Comment:" not in notes[0].get("body", ""):
+                    continue
+                position = notes[0].get("position") or {}
+                comments.append(ReviewComment(discussion.id, position.get("new_path", ""), position.get("new_line"),
+                                              notes[0]["body"], bool(notes[0].get("resolved")),
+                                              notes[0].get("created_at")))
+            return comments
+        except (GitlabGetError, GitlabListError) as e:
+            raise Exception(f"Failed to list discussions of GitLab MR {pr_number} in {repo_name}: {str(e)}")
+
+    def resolve_comment(self, repo_name: str, pr_number: int, comment: ReviewComment):
+        timeout = self.request_timeout()
+        try:
+            mr = self.client.projects.get(repo_name, lazy=True).mergerequests.get(pr_number, lazy=True)
+            mr.discussions.update(comment.id, {"resolved": True}, timeout=timeout)
+        except GitlabUpdateError as e:
+            raise Exception(f"Failed to resolve GitLab discussion {comment.id}: {str(e)}")
@@ -5,14 +5,14 @@ from llm_interface import LLMInterface, ModelResult
 from config import LOG_CHAR_LIMIT
 
 class GrokLLM(LLMInterface):
-    def __init__(self):
+    def __init__(self, model: str = None):
         api_key = os.getenv("XAI_API_KEY")
         if not api_key:
             raise ValueError("XAI_API_KEY environment variable is required for Grok")
         self.api_key = api_key
         self.base_url = "https://api.x.ai/v1"
         self.endpoint = "/chat/completions"
-        self.model = os.getenv("GROK_MODEL", "grok-3-mini")
+        self.model = model or os.getenv("GROK_MODEL", "grok-3-mini")
         self.headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
@@ -34,15 +34,19 @@ class GrokLLM(LLMInterface):
             "temperature": 0.0  # Maximum consistency
         }
 
+        timeout = self.request_timeout()
         try:
-            response = requests.post(f"{self.base_url}{self.endpoint}", headers=self.headers, json=payload)
+            response = requests.post(f"{self.base_url}{self.endpoint}", headers=self.headers, json=payload,
+                                     timeout=timeout)
             response.raise_for_status()
             result = response.json()
             raw_response = result["choices"][0]["message"]["content"].strip()
             logging.debug(f"Raw Response:\n{raw_response[:LOG_CHAR_LIMIT]}... (truncated)")
             usage = result.get("usage")            
+            details = usage.get('prompt_tokens_details') or {}
             return ModelResult(response=raw_response, total_tokens=usage['total_tokens'], 
-                    prompt_tokens=usage['prompt_tokens'], completion_tokens= usage['completion_tokens'])
+                    prompt_tokens=usage['prompt_tokens'], completion_tokens= usage['completion_tokens'],
+                    cached_tokens=details.get('cached_tokens') or 0)
         except requests.exceptions.HTTPError as e:
             logging.error(f"Grok API HTTP Error: {e.response.text}")
             return None
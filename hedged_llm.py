@@ -0,0 +1,227 @@
+# hedged_llm.py
+"""
+Hedged LLM requests across interchangeable backends.
+
+The prompt goes to the primary backend first. If it has not answered within
+a percentile of its observed latency, the same prompt is also sent to the
+next backend, and so on. The first valid answer wins. Losers still running
+are left to finish on daemon threads, so they never hold up the caller or the
+process exit; the tokens of a loser that finishes after its answer was
+returned are handed to the late-result handler (or kept for
+take_late_results), so ledgers can account for every call. ``usage`` totals
+every call per backend, so tail latency can be traded against spend knowingly.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Callable, Dict, List, Optional
+
+from json_cleaner import JsonResponseCleaner
+from latency import LatencyStats, default_latency_stats
+from llm_interface import LLMInterface, ModelResult
+from models import LLMReviewResult
+
+HEDGE_PERCENTILE = 95
+# Used until a backend has enough latency samples for a percentile
+HEDGE_INITIAL_DELAY = 30.0
+
+_json_cleaner = JsonResponseCleaner()
+
+
+def is_valid_review(result: ModelResult, combined: bool = False) -> bool:
+    """True if the answer parses into an LLMReviewResult (combined: the describe mode's object is allowed)."""
+    cleaned = _json_cleaner.strip(result.response)
+    if not cleaned:
+        return False
+    try:
+        LLMReviewResult.from_json(cleaned, 0, 0, 0, combined=combined)
+        return True
+    except ValueError:
+        return False
+
+
+class HedgedLLM(LLMInterface):
+    """Sends a slow request to the next backend as well and returns whichever valid answer comes first."""
+
+    def __init__(
+            self,
+            backends: List[LLMInterface],
+            percentile: float = HEDGE_PERCENTILE,
+            initial_delay: float = HEDGE_INITIAL_DELAY,
+            validator: Callable[[ModelResult], bool] = is_valid_review,
+            stats: Optional[LatencyStats] = None
+    ):
+        if len(backends) < 2:
+            raise ValueError("Hedging needs at least two LLM backends")
+        self.backends = backends
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.validator = validator
+        self.stats = stats or default_latency_stats()
+        self.hedges = 0
+        self.running = 0
+        self._lock = threading.Lock()
+        # results of calls that finished after their answer was returned
+        self._late: List[ModelResult] = []
+        self._late_handler: Optional[Callable[[ModelResult], None]] = None
+        self.usage: Dict[str, Dict[str, int]] = {
+            backend.model_name: {"calls": 0, "wins": 0, "failures": 0, "cancelled": 0,
+                                 "total_tokens": 0, "prompt_tokens": 0, "completion_tokens": 0}
+            for backend in backends
+        }
+
+    @property
+    def model_name(self) -> str:
+        return "hedged(" + ",".join(backend.model_name for backend in self.backends) + ")"
+
+    def set_deadline(self, deadline):
+        super().set_deadline(deadline)
+        for backend in self.backends:
+            backend.set_deadline(deadline)
+
+    def _hedge_delay(self, backend: LLMInterface) -> float:
+        delay = self.stats.tracker(backend.model_name).percentile(self.percentile)
+        return delay if delay is not None else self.initial_delay
+
+    def _call(self, backend: LLMInterface, system_prompt: str, user_prompt: str, content: str,
+              answer_state: dict) -> Optional[ModelResult]:
+        """Runs on a worker thread; accounts the call even if its result is never used."""
+        started = time.monotonic()
+        try:
+            result = backend.answer(system_prompt, user_prompt, content)
+        except Exception as e:
+            logging.error(f"Hedged call to {backend.model_name} failed: {str(e)}")
+            result = None
+        late = False
+        with self._lock:
+            self.running -= 1
+            usage = self.usage[backend.model_name]
+            usage["calls"] += 1
+            if result is None:
+                usage["failures"] += 1
+            else:
+                usage["total_tokens"] += result.total_tokens
+                usage["prompt_tokens"] += result.prompt_tokens
+                usage["completion_tokens"] += result.completion_tokens
+                if answer_state["returned"]:
+                    late = True
+                    handler = self._late_handler
+                    if handler is None:
+                        self._late.append(result)
+                else:
+                    answer_state["results"].append(result)
+        if late and handler is not None:
+            self._handle_late(handler, result)
+        if result is not None and result.response != "Long_Request":
+            # the only place hedged calls are timed: per backend, which also sets the hedge delays
+            self.stats.tracker(backend.model_name).record(time.monotonic() - started)
+        return result
+
+    def _submit(self, backend: LLMInterface, *args) -> Future:
+        """Run a call on a daemon thread (a loser must not keep the process alive)."""
+        future = Future()
+
+        def run():
+            if future.set_running_or_notify_cancel():
+                future.set_result(self._call(backend, *args))
+
+        with self._lock:
+            self.running += 1
+        threading.Thread(target=run, name=f"hedge-{backend.model_name}", daemon=True).start()
+        return future
+
+    @staticmethod
+    def _handle_late(handler: Callable[[ModelResult], None], result: ModelResult):
+        try:
+            handler(result)
+        except Exception as e:
+            logging.error(f"Failed to account a late hedged call: {str(e)}")
+
+    def take_late_results(self) -> List[ModelResult]:
+        """Results of losers that finished after their answer was returned, not yet taken or handled."""
+        with self._lock:
+            late, self._late = self._late, []
+        return late
+
+    def set_late_result_handler(self, handler: Optional[Callable[[ModelResult], None]]):
+        """Hand every late result (those kept so far, then each as it finishes) to handler."""
+        with self._lock:
+            self._late_handler = handler
+            late, self._late = (self._late, []) if handler else ([], self._late)
+        for result in late:
+            self._handle_late(handler, result)
+
+    def answer(self, system_prompt: str, user_prompt: str, content: str) -> ModelResult:
+        """Return the first valid answer; its token counts include every call finished by then."""
+        pending = {}
+        finished = []
+        launched = 0
+        # calls finishing after "returned" is set are late; the others are summed into the answer
+        answer_state = {"returned": False, "results": []}
+
+        def launch():
+            nonlocal launched
+            backend = self.backends[launched]
+            launched += 1
+            pending[self._submit(backend, system_prompt, user_prompt, content, answer_state)] = backend
+
+        launch()
+        while pending:
+            can_hedge = launched < len(self.backends)
+            # hedge when the most recently launched backend is slower than its usual percentile
+            timeout = self._hedge_delay(self.backends[launched - 1]) if can_hedge else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                self.hedges += 1
+                logging.info(f"{self.backends[launched - 1].model_name} did not answer within {timeout:.1f}s; "
+                             f"hedging with {self.backends[launched].model_name}")
+                launch()
+                continue
+            for future in done:
+                backend = pending.pop(future)
+                result = future.result()
+                if result is None:
+                    continue
+                finished.append(result)
+                if self.validator(result):
+                    self._cancel(pending)
+                    with self._lock:
+                        self.usage[backend.model_name]["wins"] += 1
+                        answer_state["returned"] = True
+                        finished = list(answer_state["results"])
+                    return ModelResult(
+                        response=result.response,
+                        total_tokens=sum(r.total_tokens for r in finished),
+                        prompt_tokens=sum(r.prompt_tokens for r in finished),
+                        completion_tokens=sum(r.completion_tokens for r in finished),
+                        cached_tokens=sum(r.cached_tokens for r in finished),
+                    )
+            if not pending and launched < len(self.backends):
+                # every launched backend failed: fail over right away
+                launch()
+        # no valid answer; hand back the last one (e.g. "Long_Request") for the caller to handle
+        with self._lock:
+            answer_state["returned"] = True
+        return finished[-1] if finished else None
+
+    def _cancel(self, pending: dict):
+        for future, backend in pending.items():
+            if future.cancel():
+                with self._lock:
+                    self.usage[backend.model_name]["cancelled"] += 1
+
+    def usage_summary(self) -> str:
+        with self._lock:
+            parts = [f"{model}: {u['calls']} calls, {u['wins']} wins, {u['total_tokens']} tokens"
+                     for model, u in self.usage.items()]
+        return f"Hedged LLM usage ({self.hedges} hedges) - " + "; ".join(parts)
+
+    def close(self):
+        """Persist latency samples; losers still running are not waited for."""
+        with self._lock:
+            running = self.running
+        if running:
+            logging.info(f"Not waiting for {running} hedged call(s) still running; "
+                         f"they are accounted only if they finish before the process exits")
+        self.stats.save()
@@ -0,0 +1,188 @@
+# http_cache.py
+"""
+Persistent cache of VCS API responses, revalidated with conditional requests.
+
+GET responses that carry an ETag or Last-Modified header are stored in a
+SQLite file under CACHE_DIR. The next request for the same URL (with the same
+credentials and Accept header) sends If-None-Match / If-Modified-Since, and a
+304 Not Modified answer is turned back into the stored response, so unchanged
+PR metadata, file lists and contents are not downloaded again (on GitHub, 304s
+do not count against the rate limit). Entries are never served without
+revalidation, so a push is seen immediately. Streamed responses (large diffs)
+and requests that already carry validators are passed through.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from config import CACHE_DIR, HTTP_CACHE_MAX_BYTES
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_used ON responses (used_at);
+"""
+# Request headers that select what the response contains; tokens are only stored hashed
+KEY_HEADERS = ("Authorization", "PRIVATE-TOKEN", "Accept")
+# Response headers that describe the transfer of the original body, not the stored one
+TRANSFER_HEADERS = ("Content-Length", "Content-Encoding", "Transfer-Encoding")
+
+
+class CachedResponse(NamedTuple):
+    etag: Optional[str]
+    last_modified: Optional[str]
+    headers: dict
+    body: bytes
+
+
+def request_key(request: requests.PreparedRequest) -> str:
+    """Cache key of a GET request: URL plus the headers that select the response."""
+    selectors = "\0".join(request.headers.get(name, "") for name in KEY_HEADERS)
+    return hashlib.sha256(f"{request.url}\0{selectors}".encode("utf-8")).hexdigest()
+
+
+class HTTPCache:
+    """Thread-safe SQLite store of validated responses, evicting least recently used ones past max_bytes."""
+
+    def __init__(self, path: str = ":memory:", max_bytes: int = HTTP_CACHE_MAX_BYTES):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_bytes = max_bytes
+        self.revalidated = 0
+        self._lock = threading.Lock()
+        # several CI jobs may share the file; wait for each other's writes instead of failing
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.executescript(SCHEMA)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            row = self._db.execute("SELECT etag, last_modified, headers, body FROM responses WHERE key = ?",
+                                   (key,)).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, headers, body = row
+        return CachedResponse(etag, last_modified, json.loads(headers), bytes(body))
+
+    def put(self, key: str, etag: Optional[str], last_modified: Optional[str], headers: dict, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (key, etag, last_modified, json.dumps(headers), body, len(body), time.time()))
+            self._evict()
+
+    def touch(self, key: str):
+        """Mark an entry as used (it was revalidated)."""
+        with self._lock, self._db:
+            self.revalidated += 1
+            self._db.execute("UPDATE responses SET used_at = ? WHERE key = ?", (time.time(), key))
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY used_at").fetchall():
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                return
+
+    def close(self):
+        self._db.close()
+
+
+class CachingAdapter(HTTPAdapter):
+    """requests transport adapter that revalidates GET responses against an HTTPCache."""
+
+    def __init__(self, cache: Optional[HTTPCache] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = cache
+
+    def send(self, request, stream=False, **kwargs):
+        if (self.cache is None or request.method != "GET" or stream
+                or "If-None-Match" in request.headers or "If-Modified-Since" in request.headers):
+            return super().send(request, stream=stream, **kwargs)
+        key = request_key(request)
+        cached = self.cache.get(key)
+        if cached:
+            if cached.etag:
+                request.headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                request.headers["If-Modified-Since"] = cached.last_modified
+        response = super().send(request, stream=stream, **kwargs)
+        if response.status_code == 304 and cached:
+            self.cache.touch(key)
+            return self._cached_response(request, response, cached)
+        if response.status_code == 200:
+            self._store(key, response)
+        return response
+
+    def _store(self, key: str, response: requests.Response):
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not (etag or last_modified) or "no-store" in response.headers.get("Cache-Control", ""):
+            return
+        headers = {name: value for name, value in response.headers.items() if name not in TRANSFER_HEADERS}
+        self.cache.put(key, etag, last_modified, headers, response.content)
+
+    def _cached_response(self, request, not_modified: requests.Response, cached: CachedResponse) -> requests.Response:
+        """The stored response, with the fresh headers (rate limits, validators) of the 304."""
+        not_modified.close()
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.headers = CaseInsensitiveDict(cached.headers)
+        response.headers.update(not_modified.headers)
+        for name in TRANSFER_HEADERS:
+            response.headers.pop(name, None)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = cached.body
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.elapsed = not_modified.elapsed
+        return response
+
+
+def mount_http_cache(session: requests.Session, cache: Optional[HTTPCache] = None) -> requests.Session:
+    """Route the session's requests through the cache (the default one if none is given)."""
+    cache = cache or default_http_cache()
+    if cache is not None:
+        adapter = CachingAdapter(cache)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+    return session
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def default_http_cache() -> Optional[HTTPCache]:
+    """Return the process-wide cache stored in CACHE_DIR/http.sqlite, or None if caching is disabled."""
+    global _default_cache
+    if not CACHE_DIR:
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = HTTPCache(os.path.join(CACHE_DIR, "http.sqlite"))
+        return _default_cache
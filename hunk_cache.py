@@ -0,0 +1,69 @@
+# hunk_cache.py
+"""
+Rebase-stable cache of review findings per diff hunk.
+
+A hunk is identified by a hash of its normalized body (no offsets, no section
+heading) together with the model and the prompt, so a force-push, rebase or
+cherry-pick that only moves a hunk reuses its findings. Findings are stored
+relative to the hunk start and re-anchored to the hunk's new position on a hit.
+"""
+import hashlib
+import json
+import logging
+from typing import List, Optional
+
+from blob_cache import BlobCache
+from diff_hunks import Hunk, anchor_line, find_hunk, reanchor_line
+from models import CodeReview
+
+
+class HunkFindingCache:
+    """Stores the CodeReview entries found in each hunk, keyed by hunk content, model and prompt."""
+
+    def __init__(self, store: BlobCache, model: str, prompt: str):
+        self.store = store
+        # model and prompt are folded into every key once
+        self.salt = hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, hunk: Hunk) -> str:
+        digest = hashlib.sha256(hunk.normalized().encode("utf-8")).hexdigest()
+        return f"hunk:{self.salt}:{digest}"
+
+    def lookup(self, filename: str, hunk: Hunk) -> Optional[List[CodeReview]]:
+        """Return the cached findings re-anchored to the hunk's current position, or None on a miss."""
+        raw = self.store.get(self.key(hunk))
+        if raw is None:
+            self.misses += 1
+            return None
+        try:
+            entries = json.loads(raw)
+            reviews = []
+            for entry in entries:
+                data = dict(entry["review"], file=filename)
+                data["line"] = reanchor_line(hunk, entry["anchor"], entry["offset"])
+                reviews.append(CodeReview.from_dict(data))
+        except (ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Ignoring corrupt hunk cache entry: {str(e)}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return reviews
+
+    def store_findings(self, hunks: List[Hunk], reviews: List[CodeReview]):
+        """
+        Assign each finding of one file to the hunk it was reported in and store
+        every hunk, including clean ones (an empty list is a valid cached result).
+        """
+        if not hunks:
+            return
+        per_hunk = [[] for _ in hunks]
+        for review in reviews:
+            index = find_hunk(hunks, review.line)
+            anchor, offset = anchor_line(hunks[index], review.line)
+            data = review.to_dict()
+            del data["file"], data["line"]
+            per_hunk[index].append({"review": data, "anchor": anchor, "offset": offset})
+        for hunk, entries in zip(hunks, per_hunk):
+            self.store.put(self.key(hunk), json.dumps(entries))
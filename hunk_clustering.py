@@ -0,0 +1,132 @@
+# hunk_clustering.py
+"""
+Clustering of near-duplicate hunks, so a mechanical mass edit is reviewed once.
+
+Codemods and API migrations apply the same edit to many files. Each hunk's
+changed lines are shingled into token 3-grams and summarised by a MinHash
+signature; locality-sensitive hashing over bands of the signature finds
+candidate pairs cheaply, and a hunk joins the first cluster whose
+representative it resembles closely enough. Only representatives are sent to
+the LLM; their findings are copied to every member at the corresponding line.
+"""
+import hashlib
+import random
+import re
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from config import CLUSTER_SIMILARITY
+from diff_hunks import Hunk, anchor_line, find_hunk, reanchor_line
+from models import CodeReview
+
+SHINGLE_TOKENS = 3
+NUM_HASHES = 64
+BANDS = 16  # 4 rows per band: pairs above ~0.5 similarity almost always share a band
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_HASHES)]
+
+TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+class HunkCluster:
+    """A hunk sent to the LLM and the near-duplicate hunks that share its findings."""
+    def __init__(self, filename: str, hunk: Hunk):
+        self.filename = filename
+        self.hunk = hunk
+        self.members: List[Tuple[str, Hunk]] = []
+
+
+def _shingles(hunk: Hunk) -> set:
+    tokens = []
+    for line in hunk.lines:
+        if line.startswith(('+', '-')):
+            tokens.append(line[0])  # an added line differs from the same line removed
+            tokens.extend(TOKEN.findall(line[1:]))
+    if len(tokens) <= SHINGLE_TOKENS:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + SHINGLE_TOKENS]) for i in range(len(tokens) - SHINGLE_TOKENS + 1)}
+
+
+def minhash(shingles: set) -> Tuple[int, ...]:
+    """MinHash signature of a set of shingles."""
+    values = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+              for s in shingles]
+    return tuple(min((a * v + b) % _PRIME for v in values) for a, b in _PERMUTATIONS)
+
+
+def similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return sum(x == y for x, y in zip(first, second)) / NUM_HASHES
+
+
+def cluster_hunks(hunks: List[Tuple[str, Hunk]], threshold: float = CLUSTER_SIMILARITY) -> List[HunkCluster]:
+    """
+    Group (filename, hunk) pairs, in PR order, into clusters of near-duplicates.
+    The first hunk of each cluster is its representative; clusters without
+    members are not returned.
+    """
+    rows = NUM_HASHES // BANDS
+    buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = defaultdict(list)
+    clusters: List[HunkCluster] = []
+    signatures: List[Tuple[int, ...]] = []
+    for filename, hunk in hunks:
+        shingles = _shingles(hunk)
+        if not shingles:
+            continue
+        signature = minhash(shingles)
+        bands = [(band, signature[band * rows:(band + 1) * rows]) for band in range(BANDS)]
+        candidates = sorted({index for key in bands for index in buckets.get(key, ())})
+        best = max(candidates, key=lambda index: similarity(signature, signatures[index]), default=None)
+        if best is not None and similarity(signature, signatures[best]) >= threshold:
+            clusters[best].members.append((filename, hunk))
+            continue
+        # a new representative; only representatives are indexed, so clusters do not drift
+        for key in bands:
+            buckets[key].append(len(clusters))
+        clusters.append(HunkCluster(filename, hunk))
+        signatures.append(signature)
+    return [cluster for cluster in clusters if cluster.members]
+
+
+def fan_out(reviews: List[CodeReview], clusters: List[HunkCluster],
+            hunks_by_file: Dict[str, List[Hunk]]) -> Dict[Tuple[str, int], List[CodeReview]]:
+    """
+    Copy each representative's findings to its members.
+
+    Args:
+        reviews: Findings reported for the hunks that were sent.
+        clusters: Clusters whose representatives were sent.
+        hunks_by_file: The hunks sent per file, to assign findings to hunks.
+
+    Returns:
+        {(member filename, id of member hunk): findings re-anchored to the member}
+    """
+    by_representative = {id(cluster.hunk): cluster for cluster in clusters}
+    copies: Dict[Tuple[str, int], List[CodeReview]] = defaultdict(list)
+    for review in reviews:
+        hunks = hunks_by_file.get(review.file)
+        if not hunks:
+            continue
+        hunk = hunks[find_hunk(hunks, review.line)]
+        cluster: Optional[HunkCluster] = by_representative.get(id(hunk))
+        if cluster is None:
+            continue
+        anchor, offset = anchor_line(hunk, review.line)
+        for filename, member in cluster.members:
+            data = review.to_dict()
+            line = reanchor_line(member, anchor, offset)
+            # near-duplicates may differ in length; stay inside the member hunk
+            if anchor == "new":
+                line = min(max(line, member.new_start), member.new_end)
+            else:
+                line = min(max(line, member.old_start), member.old_end)
+            data.update(file=filename, line=line)
+            copies[(filename, id(member))].append(CodeReview.from_dict(data))
+    # members of a reviewed representative without findings are clean too
+    sent = {id(hunk) for hunks in hunks_by_file.values() for hunk in hunks}
+    for cluster in clusters:
+        if id(cluster.hunk) in sent:
+            for filename, member in cluster.members:
+                copies.setdefault((filename, id(member)), [])
+    return copies
@@ -0,0 +1,95 @@
+# latency.py
+"""
+Per-model latency observations with percentile lookup.
+
+Samples are kept in a sliding window and persisted under CACHE_DIR, so a
+short CLI run can use percentiles observed by earlier runs.
+"""
+import json
+import logging
+import math
+import os
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+from config import CACHE_DIR
+
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 5
+
+
+class LatencyTracker:
+    """Thread-safe sliding window of call latencies (seconds) for one model."""
+
+    def __init__(self, window: int = LATENCY_WINDOW, samples=()):
+        self._samples = deque(samples, maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def samples(self) -> list:
+        with self._lock:
+            return list(self._samples)
+
+    def percentile(self, p: float, min_samples: int = MIN_SAMPLES) -> Optional[float]:
+        """Nearest-rank percentile (0-100), or None with fewer than min_samples observations."""
+        samples = sorted(self.samples())
+        if len(samples) < min_samples:
+            return None
+        rank = max(1, math.ceil(p / 100 * len(samples)))
+        return samples[rank - 1]
+
+
+class LatencyStats:
+    """Latency trackers of all models, loaded from and saved to a JSON file."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._lock = threading.Lock()
+        self._trackers: Dict[str, LatencyTracker] = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+                self._trackers = {model: LatencyTracker(samples=samples) for model, samples in data.items()}
+            except (OSError, ValueError, TypeError) as e:
+                logging.warning(f"Ignoring unreadable latency stats {path}: {str(e)}")
+
+    def tracker(self, model: str) -> LatencyTracker:
+        with self._lock:
+            if model not in self._trackers:
+                self._trackers[model] = LatencyTracker()
+            return self._trackers[model]
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {model: tracker.samples() for model, tracker in self._trackers.items()}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Failed to save latency stats {self.path}: {str(e)}")
+
+
+_default_stats = None
+_default_lock = threading.Lock()
+
+
+def default_latency_stats() -> LatencyStats:
+    """Process-wide latency stats stored under CACHE_DIR (in memory only if caching is disabled)."""
+    global _default_stats
+    with _default_lock:
+        if _default_stats is None:
+            _default_stats = LatencyStats(os.path.join(CACHE_DIR, "latency.json") if CACHE_DIR else None)
+        return _default_stats
@@ -1,12 +1,29 @@
 import logging
-from typing import Any
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Set
 
-from config import LOG_CHAR_LIMIT, MAX_LENGTH_DIFF, MAX_TOTAL_LENGTH
+from blob_cache import default_blob_cache
+from cost_planner import CostEstimate, default_token_estimator, estimate_shard
+from config import (DEADLINE_DEFAULT_LLM_SECONDS, DEADLINE_MIN_FULL_CONTEXT, DEADLINE_SHARD_CHARS, LOG_CHAR_LIMIT,
+                    MAX_LENGTH_DIFF, MAX_TOTAL_LENGTH, SHARD_CONCURRENCY)
+from deadline import Deadline, DeadlineExceeded
+from diff_compaction import compact_patches
+from diff_hunks import Hunk, group_hunks, join_patch, split_patch
+from file_filter import FileFilter
+from hedged_llm import HedgedLLM
+from hunk_cache import HunkFindingCache
+from hunk_clustering import HunkCluster, cluster_hunks, fan_out
 from json_cleaner import JsonResponseCleaner
+from latency import default_latency_stats
+from local_analyzers import run_analyzers
 from llm_interface import LLMInterface, ModelResult
 from collections import defaultdict
+from model_router import CHEAP, ModelRouter
+from pr_summarizer import PRSummarizer
 from prompts import get_prompt
-from models import LLMReviewResult
+from symbol_index import SymbolIndex
+from models import CodeReview, LLMReviewResult
 import re
 
 from vcsp_interface import VCSPInterface
@@ -24,6 +41,11 @@ def remove_hunk_counts(diff_text: str) -> str:
     # Replace each match with commas removed
     return pattern.sub(r'@@ -\1 +\2 @@', diff_text)
 
+def count_changed_lines(diff_text: str) -> int:
+    """Number of added and removed lines in a unified diff."""
+    return sum(1 for line in diff_text.splitlines()
+               if line.startswith(('+', '-')) and not line.startswith(('+++', '---')))
+
 def is_new_file(diff_lines):
     """
     Given the lines of a unified diff for one file,
@@ -52,6 +74,80 @@ def is_deleted_file(diff_lines):
             return True
     return False
 
+# Returned for a request that does not fit the model's context window
+LONG_REQUEST = object()
+
+# Members of a repeated edit named next to its representative in the prompt
+MAX_LISTED_REPEATS = 10
+
+# Skip reason of files (or parts of files) that did not fit into MAX_TOTAL_LENGTH
+OVER_SIZE_LIMIT = "over the prompt size limit"
+
+# Reviewed last when time is short
+DOC_EXTENSIONS = ('.md', '.rst', '.txt', '.adoc')
+
+
+class FileChunk:
+    """The part of one file's diff that is sent to the LLM."""
+    def __init__(self, filename: str, text: str, hunks: List[Hunk], part: Optional[tuple] = None):
+        self.filename = filename
+        self.text = text
+        self.hunks = hunks
+        self.part = part  # (index, count) of a diff split because it is longer than MAX_LENGTH_DIFF
+
+    @property
+    def priority(self) -> tuple:
+        """Sort key putting code before docs, then the most changed lines first."""
+        changed = sum(1 for hunk in self.hunks for line in hunk.lines if line.startswith(('+', '-')))
+        return self.filename.lower().endswith(DOC_EXTENSIONS), -changed
+
+
+class ReviewPlan:
+    """Prepared LLM input for a PR: the file chunks to send and findings already known without the LLM."""
+    def __init__(self, base_content: str, chunks: List[FileChunk], known_reviews: List[CodeReview],
+                 full_context: bool, pr_lines: int = 0, clusters: Optional[List[HunkCluster]] = None,
+                 files: Optional[Set[str]] = None):
+        self.base_content = base_content
+        self.chunks = chunks
+        self.known_reviews = known_reviews
+        self.full_context = full_context
+        self.pr_lines = pr_lines  # changed lines in the whole PR
+        self.clusters = clusters or []  # near-duplicate hunks whose representative is in a chunk
+        self.files = files or set()  # files whose changes are covered by the plan
+
+    @property
+    def content(self) -> Optional[str]:
+        """The content sent to the LLM in a single call, or None if every hunk is already reviewed."""
+        return self.shard_content(self.chunks) if self.chunks else None
+
+    def shard_content(self, shard: List[FileChunk]) -> str:
+        # Combine PR title, description, and diffs
+        return self.base_content + self.shard_diffs(shard)
+
+    def shard_diffs(self, shard: List[FileChunk]) -> str:
+        """The part of a shard's content that differs between shards."""
+        return "Diffs:\n" + "\n\n".join(chunk.text for chunk in shard)
+
+    def shards(self, max_chars: Optional[int] = None) -> List[List[FileChunk]]:
+        """
+        Group the chunks into shards of at most max_chars of diff each (a larger
+        chunk gets a shard of its own); without a limit all chunks share one
+        shard. Each part of a split diff is always a shard of its own.
+        """
+        shards = [[]]
+        size = 0
+        for chunk in self.chunks:
+            if chunk.part:
+                # ahead of the shard still being filled
+                shards.insert(-1, [chunk])
+                continue
+            if shards[-1] and max_chars and size + len(chunk.text) > max_chars:
+                shards.append([])
+                size = 0
+            shards[-1].append(chunk)
+            size += len(chunk.text)
+        return [shard for shard in shards if shard]
+
 
 class LLMCodeReviewer:
     """Handles code review generation by constructing prompts and parsing LLM JSON responses."""
@@ -61,13 +157,46 @@ class LLMCodeReviewer:
             llm: LLMInterface,
             vcsp: VCSPInterface,  # VCS interface (e.g., GithubVCSP); type depends on implementation
             full_context: bool = False,
-            deep: bool = False
+            deep: bool = False,
+            finding_cache: bool = True,
+            router: Optional[ModelRouter] = None,
+            deadline: Optional[Deadline] = None,
+            file_filter: Optional[FileFilter] = None,
+            describe: bool = False,
+            local_analyzers: bool = True,
+            skip_broken_files: bool = False,
+            symbol_index: Optional[SymbolIndex] = None
     ):
         self.llm = llm
         self.vcsp = vcsp
         self.full_context = full_context
         self.deep = deep
         self.json_cleaner = JsonResponseCleaner()
+        # combined mode: the same calls also summarize the PR, so every hunk has to be sent
+        self.describe = describe
+        self.finding_store = default_blob_cache("hunks") if finding_cache and not describe else None
+        self.router = router
+        # with a deadline the most important shards are reviewed first and the rest is skipped once time runs out
+        self.deadline = deadline
+        self.file_filter = file_filter or FileFilter()
+        # (filename, reason) of the files the last build_plan left out of the review
+        self.skipped_files = []
+        # files fully reviewed by the last review_plan; earlier AI comments on them may be resolved
+        self.reviewed_files = set()
+        # syntax errors and the like are found locally; with skip_broken_files such files are not sent to the LLM
+        self.local_analyzers = local_analyzers
+        self.skip_broken_files = skip_broken_files
+        # definitions of symbols a hunk references in other files of a local clone
+        self.symbol_index = symbol_index
+        # a routed cheap pass also rates its confidence, used to decide on escalation
+        self.system_prompt = get_prompt(self.deep, confidence=router is not None, summary=describe)
+
+    def _finding_cache(self, full_context: bool) -> Optional[HunkFindingCache]:
+        if not self.finding_store:
+            return None
+        model_name = self.router.model_name if self.router else self.llm.model_name
+        return HunkFindingCache(self.finding_store, model_name,
+                                f"{self.system_prompt}\0full_context={full_context}")
 
     def review_pr(self, pr: Any, repository: str, pr_number: int) -> LLMReviewResult:
         """
@@ -80,69 +209,443 @@ class LLMCodeReviewer:
 
         Returns:
             LLMReviewResult containing the parsed reviews with adjusted line numbers.
-        """        
-        retry_count = 0
-        while retry_count < 2:
-            retry_count += 1
-            # Prepare PR title and description
-            pr_title = pr.title or "No title provided"
-            pr_description = pr.body or "No description provided"
-            base_content = f"PR Title: {pr_title}\nPR Description:\n{pr_description}\n\n"
-
-            # Prepare content based on full-context flag
-            pr_files = self.vcsp.get_files_in_pr(repository, pr_number)
-            
-            all_content = [] 
-            all_content_length = 0
-            for file in pr_files:
-                if file.patch and len(file.patch) <= MAX_LENGTH_DIFF:
-                    file.patch = remove_hunk_counts(file.patch)
-                    if self.full_context and not is_new_file(file.patch) and not is_deleted_file(file.patch):                    
-                        try:
-                            file_content = self.vcsp.get_file_content(repository, file.filename, ref=pr.head_sha)
-                            file_chunk = f"File: {file.filename}\n{file_content}\n\nDiff:\n{file.patch}"
-                        except ValueError as e:
-                            logging.error(f"Skipping file {file.filename}: {str(e)}")
+        """
+        pr_files, plan = self.plan_pr(pr, repository, pr_number)
+        return self.review_plan(pr, repository, pr_files, plan)
+
+    def plan_pr(self, pr: Any, repository: str, pr_number: int):
+        """Fetch the PR's files and build the review plan without calling the LLM; returns (files, plan)."""
+        pr_files = self.vcsp.get_files_in_pr(repository, pr_number)
+        full_context = self.full_context
+        if full_context and not self._has_time_for_full_context():
+            logging.warning("Not enough time left before the deadline; reviewing diffs without full context.")
+            full_context = False
+        return pr_files, self.build_plan(pr, repository, pr_files, full_context)
+
+    def estimate(self, plan: Optional[ReviewPlan]) -> CostEstimate:
+        """
+        Estimate tokens, cost and latency of reviewing the plan, shard by shard,
+        without calling the LLM. Escalations by a router are not included.
+        """
+        if not plan:
+            return CostEstimate([])
+        shards = []
+        for shard in plan.shards(self._max_shard_chars()):
+            filenames = [chunk.filename for chunk in shard]
+            llm = self.router.llm(self.router.route(filenames, plan.pr_lines).tier) if self.router else self.llm
+            shards.append(estimate_shard(llm.model_name, filenames, self.system_prompt + plan.shard_content(shard)))
+        return CostEstimate(shards, len(plan.known_reviews))
+
+    def build_plan(self, pr: Any, repository: str, pr_files: list, full_context: bool) -> Optional[ReviewPlan]:
+        """
+        Build the LLM input (PR title, description and diffs) for the given files.
+
+        Hunks whose findings are cached from an earlier review of the same change
+        (possibly at other line numbers, e.g. after a rebase) are left out of the
+        prompt and their findings are re-anchored to the current lines.
 
+        Returns:
+            The plan, or None if there is no reviewable diff.
+        """
+        # Prepare PR title and description
+        pr_title = pr.title or "No title provided"
+        pr_description = pr.body or "No description provided"
+        base_content = f"PR Title: {pr_title}\nPR Description:\n{pr_description}\n\n"
+        finding_cache = self._finding_cache(full_context)
+
+        chunks = []
+        known_reviews = []
+        all_content_length = 0
+        file_filter = self.file_filter.with_gitattributes(self._gitattributes(repository, pr.head_sha))
+        reviewable = []
+        self.skipped_files = []
+        for file in pr_files:
+            if not file.patch:
+                continue
+            reason = file_filter.skip_reason(file.filename, file.patch)
+            if reason:
+                self.skipped_files.append((file.filename, reason))
+            else:
+                reviewable.append(file)
+        if self.skipped_files:
+            logging.info(f"Skipping {len(self.skipped_files)} file(s): " +
+                         ", ".join(f"{name} ({reason})" for name, reason in self.skipped_files))
+        for file in reviewable:
+            file.patch = remove_hunk_counts(file.patch)
+        if full_context and self._has_time_for_full_context():
+            # one bulk fetch where the provider supports it, instead of a request per file below
+            self.vcsp.prefetch_file_contents(repository, [
+                file.filename for file in reviewable
+                if not is_new_file(file.patch.splitlines()) and not is_deleted_file(file.patch.splitlines())],
+                pr.head_sha)
+        if self.local_analyzers:
+            local_findings = self._run_analyzers(repository, pr.head_sha, reviewable)
+            for reviews in local_findings.values():
+                known_reviews.extend(reviews)
+            if self.skip_broken_files and local_findings:
+                logging.info(f"Not sending {len(local_findings)} file(s) with local findings to the LLM: "
+                             f"{', '.join(local_findings)}")
+                reviewable = [file for file in reviewable if file.filename not in local_findings]
+        planned = {file.filename for file in reviewable}
+        # whitespace-only and moved hunks, renames and excess context cost tokens without telling the model anything
+        compacted = compact_patches([(file.filename, *split_patch(file.patch)) for file in reviewable])
+        renames = []
+        pending = []  # (file, header lines, hunks to send, patch)
+        for file, compact in zip(reviewable, compacted):
+            header_lines, hunks = compact.header_lines, compact.hunks
+            patch = join_patch(header_lines, hunks) if compact.changed else file.patch
+            if compact.note:
+                renames.append(compact.note)
+                continue
+            if compact.dropped:
+                logging.info(f"Compacted {file.filename}: dropped " +
+                             ", ".join(f"{count} {reason}" for reason, count in compact.dropped.items()) +
+                             " hunk(s)")
+                if not hunks:
+                    continue
+            if finding_cache and hunks:
+                missed = []
+                for hunk in hunks:
+                    cached = finding_cache.lookup(file.filename, hunk)
+                    if cached is None:
+                        missed.append(hunk)
                     else:
-                        file_chunk = f"File: {file.filename}\nDiff:\n{file.patch}"
-                    all_content.append(file_chunk)
-                    all_content_length += len(file_chunk)
-                    if all_content_length > MAX_TOTAL_LENGTH:
-                        logging.warning(f"Content length exceeded {MAX_LENGTH_DIFF} characters. Truncating.")
+                        known_reviews.extend(cached)
+                if not missed:
+                    logging.info(f"All hunks of {file.filename} reviewed before; using cached findings.")
+                    continue
+                if len(missed) < len(hunks):
+                    patch = join_patch(header_lines, missed)
+                hunks = missed
+            pending.append((file, header_lines, hunks, patch))
+
+        # a mass edit repeated across files is sent once; members get the representative's findings
+        clusters = cluster_hunks([(file.filename, hunk) for file, _, hunks, _ in pending for hunk in hunks])
+        members = {id(hunk) for cluster in clusters for _, hunk in cluster.members}
+        representatives = {id(cluster.hunk): cluster for cluster in clusters}
+        if clusters:
+            logging.info(f"Reviewing {len(clusters)} repeated edit(s) once instead of "
+                         f"{len(clusters) + len(members)} times")
+
+        for position, (file, header_lines, hunks, patch) in enumerate(pending):
+            if members and any(id(hunk) in members for hunk in hunks):
+                hunks = [hunk for hunk in hunks if id(hunk) not in members]
+                if not hunks:
+                    continue
+                patch = join_patch(header_lines, hunks)
+            if len(patch) > MAX_LENGTH_DIFF:
+                # too long for one prompt: each part is reviewed as a shard of its own
+                parts = group_hunks(hunks, MAX_LENGTH_DIFF)
+                logging.info(f"Splitting the {len(patch)}-character diff of {file.filename} into {len(parts)} parts")
+                for index, part in enumerate(parts, 1):
+                    chunk = FileChunk(file.filename,
+                                      f"File: {file.filename} (part {index} of {len(parts)}, lines "
+                                      f"{part[0].new_start}-{part[-1].new_end})\n"
+                                      f"Diff:\n{join_patch(header_lines, part)}"
+                                      + self._symbol_context(file.filename, part)
+                                      + self._repeats_note(part, representatives),
+                                      part, (index, len(parts)))
+                    chunks.append(chunk)
+                    all_content_length += len(chunk.text)
+                    if all_content_length > MAX_TOTAL_LENGTH and index < len(parts):
+                        # the rest of the file is not reviewed, so its old comments must not be resolved either
+                        planned.discard(file.filename)
+                        self.skipped_files.append(
+                            (file.filename, f"lines {parts[index][0].new_start}-{parts[-1][-1].new_end} "
+                                            f"{OVER_SIZE_LIMIT}"))
                         break
+            else:
+                file_chunk = f"File: {file.filename}\nDiff:\n{patch}"
+                if full_context and not self._has_time_for_full_context():
+                    logging.warning("Deadline approaching; fetching no more full file content.")
+                    full_context = False
+                patch_lines = file.patch.splitlines()
+                if full_context and not is_new_file(patch_lines) and not is_deleted_file(patch_lines):
+                    try:
+                        file_content = self.vcsp.get_file_content(repository, file.filename, ref=pr.head_sha)
+                        if file_content is not None:
+                            file_chunk = f"File: {file.filename}\n{file_content}\n\nDiff:\n{patch}"
+                    except (ValueError, FileNotFoundError) as e:
+                        logging.error(f"Skipping full content of {file.filename}: {str(e)}")
+                chunk = FileChunk(file.filename, file_chunk + self._symbol_context(file.filename, hunks) +
+                                  self._repeats_note(hunks, representatives), hunks)
+                chunks.append(chunk)
+                all_content_length += len(chunk.text)
+            if all_content_length > MAX_TOTAL_LENGTH:
+                logging.warning(f"Content length exceeded {MAX_TOTAL_LENGTH} characters. Truncating.")
+                rest = [file.filename for file, _, _, _ in pending[position + 1:]]
+                planned -= set(rest)
+                self.skipped_files.extend((filename, OVER_SIZE_LIMIT) for filename in rest)
+                break
+
+        if not chunks and not known_reviews:
+            return None
+        if renames:
+            base_content += "Renamed files (content unchanged):\n" + "\n".join(renames) + "\n\n"
+        if finding_cache and finding_cache.hits:
+            logging.info(f"Hunk finding cache: {finding_cache.hits} hits, {finding_cache.misses} misses")
+        pr_lines = sum(count_changed_lines(file.patch) for file in pr_files if file.patch)
+        if self.deadline:
+            chunks.sort(key=lambda chunk: chunk.priority)
+        return ReviewPlan(base_content, chunks, known_reviews, full_context, pr_lines, clusters, planned)
+
+    def review_plan(self, pr: Any, repository: str, pr_files: list, plan: Optional[ReviewPlan]) -> Optional[LLMReviewResult]:
+        """
+        Send a prepared plan to the LLM shard by shard (concurrently without a
+        deadline) and merge the answers.
 
+        If a request is too long for the model and full context was used,
+        the plan is rebuilt from diffs only and sent once more. A shard that
+        fails is logged and skipped; None is returned only if all of them fail.
+        """
+        retry_count = 0
+        self.reviewed_files = set()
+        while retry_count < 2 and plan:
+            retry_count += 1
+            shards = plan.shards(self._max_shard_chars())
+            results = []
+            answered = set()  # ids of the shards with a review
+            long_request = False
+            for shard, result in self._review_shards(plan, shards):
+                if result is LONG_REQUEST:
+                    long_request = True
+                    if plan.full_context:
+                        break
+                    logging.error("Shard is too long for the model even without full context; skipping it.")
+                elif result is not None:
+                    answered.add(id(shard))
+                    self._store_findings(plan, shard, result.reviews)
+                    copies = self._fan_out(plan, shard, result.reviews)
+                    results.append(LLMReviewResult.merge([result], copies) if copies else result)
+            if long_request and plan.full_context:
+                # retry with less context
+                logging.warning("LLM response indicates request was too long; retrying with less context.")
+                plan = self.build_plan(pr, repository, pr_files, False)
+                continue
+            if shards and not results:
+                return None
+            self.reviewed_files = self._reviewed_files(plan, shards, answered)
+            if len(results) == 1 and not plan.known_reviews:
+                return results[0]
+            merged = LLMReviewResult.merge(results, plan.known_reviews)
+            return self._combine_summaries(pr, merged, results) if self.describe else merged
+        return None
 
-            diff_content = "\n\n".join(all_content)
-
-            # Combine PR title, description, and diffs
-            content = base_content + "Diffs:\n" + diff_content
-
-            # Get system prompt
-            system_prompt = get_prompt(self.deep)        
-            # Call LLM
-            llm_answer = self.llm.answer(
-                                system_prompt=system_prompt,
-                                user_prompt="",  # No separate user prompt needed; content includes all info
-                                content=content
-                            ) if all_content_length > 0 else None
-
-            if llm_answer:
-                if llm_answer.response == "Long_Request" and self.full_context:
-                    self.full_context = False #retrun with less context
-                    logging.warning("LLM response indicates request was too long; retrying with less context.")
-                    continue  # Retry with reduced context
-                retry_count = 2  # Exit retry loop if we got a valid response
-                # Parse JSON response
-                cleaned_response = self.json_cleaner.strip(llm_answer.response)
-                logging.debug(f"Cleaned Response:\n{cleaned_response[:LOG_CHAR_LIMIT]}... (truncated)")
-                if not cleaned_response:
-                    logging.error("Error: No valid JSON found in LLM response")
-                    return None
-                try:
-                    review_result = LLMReviewResult.from_json(cleaned_response, 
-                        llm_answer.total_tokens,llm_answer.prompt_tokens, llm_answer.completion_tokens)                
-                    return review_result
-                except ValueError as e:
-                    logging.error(f"Error parsing LLM response: {str(e)}")
+    @staticmethod
+    def _reviewed_files(plan: ReviewPlan, shards: List[List[FileChunk]], answered: set) -> Set[str]:
+        """Files of the plan none of whose shards (or representatives of their repeated edits) went unreviewed."""
+        missed = [chunk for shard in shards if id(shard) not in answered for chunk in shard]
+        missed_hunks = {id(hunk) for chunk in missed for hunk in chunk.hunks}
+        unreviewed = {chunk.filename for chunk in missed}
+        unreviewed.update(filename for cluster in plan.clusters if id(cluster.hunk) in missed_hunks
+                          for filename, _ in cluster.members)
+        return plan.files - unreviewed
+
+    def _combine_summaries(self, pr: Any, merged: LLMReviewResult,
+                           results: List[LLMReviewResult]) -> LLMReviewResult:
+        """Reduce the summaries of several shards into one PR summary (combined mode)."""
+        summaries = [result.summary for result in results if result.summary]
+        if len(summaries) < 2:
+            return merged
+        combined = PRSummarizer(self.llm).combine(pr, summaries)
+        if combined is None:
+            logging.warning("Failed to combine the shard summaries; keeping them side by side.")
+            return merged
+        spent = LLMReviewResult(reviews=[], total_tokens=combined.total_tokens, prompt_tokens=combined.prompt_tokens,
+                                completion_tokens=combined.completion_tokens, cached_tokens=combined.cached_tokens)
+        result = LLMReviewResult.merge([merged, spent])
+        result.summary = combined.response
+        return result
+
+    def _review_shards(self, plan: ReviewPlan, shards: List[List[FileChunk]]):
+        """
+        Yield (shard, result) in shard order. Without a deadline the shards are
+        reviewed concurrently; with one they are reviewed one after another,
+        most important first, until time runs out.
+        """
+        if not self.deadline and len(shards) > 1:
+            with ThreadPoolExecutor(max_workers=min(SHARD_CONCURRENCY, len(shards)),
+                                    thread_name_prefix="shard") as executor:
+                futures = [executor.submit(self._review_shard, plan, shard) for shard in shards]
+                for shard, future in zip(shards, futures):
+                    yield shard, future.result()
+            return
+        answered = False
+        for index, shard in enumerate(shards):
+            if self.deadline and not self._has_time_for(self.llm, started=answered):
+                skipped = ", ".join(chunk.filename for rest in shards[index:] for chunk in rest)
+                logging.warning(f"Deadline reached; skipping review of {len(shards) - index} shard(s): {skipped}")
+                return
+            try:
+                result = self._review_shard(plan, shard)
+            except DeadlineExceeded as e:
+                logging.warning(f"{str(e)}; skipping the remaining shards.")
+                return
+            answered = answered or (result is not None and result is not LONG_REQUEST)
+            yield shard, result
+
+    def _review_shard(self, plan: ReviewPlan, shard: List[FileChunk]):
+        """Review one shard, routing it between cheap and strong models when a router is set."""
+        if not self.router:
+            return self._ask(self.llm, plan, shard)
+
+        filenames = [chunk.filename for chunk in shard]
+        route = self.router.route(filenames, plan.pr_lines)
+        result = self._ask(self.router.llm(route.tier), plan, shard)
+        if route.tier != CHEAP or not route.escalate or result is LONG_REQUEST \
+                or not self.router.should_escalate(result):
+            return result
+        if self.deadline and not self._has_time_for(self.router.strong):
+            logging.warning(f"Not enough time left to escalate {', '.join(filenames)}; keeping the cheap review.")
+            return result
+        self.router.record_escalation()
+        logging.info(f"Escalating review of {', '.join(filenames)} to {self.router.strong.model_name}")
+        strong_result = self._ask(self.router.strong, plan, shard)
+        if strong_result is None or strong_result is LONG_REQUEST:
+            return result
+        if result is None:
+            return strong_result
+        # the strong model's findings replace the cheap ones, but both calls were paid for
+        spent = LLMReviewResult(reviews=[], total_tokens=result.totals["total_tokens"],
+                                prompt_tokens=result.totals["prompt_tokens"],
+                                completion_tokens=result.totals["completion_tokens"],
+                                cached_tokens=result.totals["cached_tokens"])
+        return LLMReviewResult.merge([strong_result, spent])
+
+    def _ask(self, llm: LLMInterface, plan: ReviewPlan, shard: List[FileChunk]):
+        """Call the LLM; returns the parsed result, None on failure or LONG_REQUEST."""
+        started = time.monotonic()
+        # static instructions, then the PR context shared by every shard, then the shard's diffs:
+        # the first two form a prefix the provider can serve from its prompt cache
+        content = plan.shard_diffs(shard)
+        llm_answer = llm.answer(
+                            system_prompt=self.system_prompt,
+                            user_prompt=plan.base_content,
+                            content=content
+                        )
+        if llm_answer and llm_answer.response != "Long_Request":
+            if not isinstance(llm, HedgedLLM):  # a hedged call is timed per backend by HedgedLLM
+                default_latency_stats().tracker(llm.model_name).record(time.monotonic() - started)
+            default_token_estimator().observe(llm.model_name,
+                                              len(self.system_prompt) + len(plan.base_content) + len(content),
+                                              llm_answer.prompt_tokens, llm_answer.completion_tokens)
+            if llm_answer.cached_tokens:
+                logging.info(f"{llm.model_name}: {llm_answer.cached_tokens} of {llm_answer.prompt_tokens} "
+                             f"prompt tokens served from the provider's prompt cache")
+        if not llm_answer:
+            return None
+        if llm_answer.response == "Long_Request":
+            return LONG_REQUEST
+        return self.parse_answer(llm_answer)
+
+    def _run_analyzers(self, repository: str, ref: str, files: list) -> dict:
+        """Run the local analyzers over the files' diffs; returns {filename: findings}."""
+        # like full context, file content is only fetched while there is time for it
+        can_fetch = self._has_time_for_full_context()
+
+        def load_content(filename: str) -> Optional[str]:
+            if not can_fetch:
+                return None
+            try:
+                return self.vcsp.get_file_content(repository, filename, ref=ref)
+            except Exception as e:
+                logging.debug(f"No content of {filename} for local analysis: {str(e)}")
+                return None
+
+        started = time.monotonic()
+        findings = run_analyzers([(file.filename, split_patch(file.patch)[1], is_new_file(file.patch.splitlines()))
+                                  for file in files if not is_deleted_file(file.patch.splitlines())], load_content)
+        for reviews in findings.values():
+            for review in reviews:
+                logging.info(f"Local finding in {review.file} at line {review.line}: {review.comments[0]}")
+        logging.debug(f"Local analyzers took {time.monotonic() - started:.3f}s")
+        return findings
+
+    def _symbol_context(self, filename: str, hunks: List[Hunk]) -> str:
+        """Prompt section with the definitions the hunks reference in other files, if a symbol index is set."""
+        if not self.symbol_index:
+            return ""
+        context = self.symbol_index.context_for(filename, hunks)
+        return f"\n{context}" if context else ""
+
+    @staticmethod
+    def _repeats_note(hunks: List[Hunk], representatives: dict) -> str:
+        """Prompt note naming the other files in which the chunk's repeated edits are made."""
+        repeated = sorted({name for hunk in hunks if id(hunk) in representatives
+                           for name, _ in representatives[id(hunk)].members})
+        if not repeated:
+            return ""
+        return ("\nThe same change is also made in: " + ", ".join(repeated[:MAX_LISTED_REPEATS]) +
+                (f" and {len(repeated) - MAX_LISTED_REPEATS} more" if len(repeated) > MAX_LISTED_REPEATS else ""))
+
+    def _gitattributes(self, repository: str, ref: str) -> Optional[str]:
+        """The repository's .gitattributes at the PR head, or None if there is none."""
+        try:
+            content = self.vcsp.get_file_content(repository, ".gitattributes", ref=ref)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logging.debug(f"No .gitattributes in {repository}: {str(e)}")
+            return None
+        return content if isinstance(content, str) else None
+
+    def _max_shard_chars(self) -> Optional[int]:
+        if self.router:
+            return self.router.max_shard_chars
+        return DEADLINE_SHARD_CHARS if self.deadline else None
+
+    def _has_time_for_full_context(self) -> bool:
+        return not self.deadline or self.deadline.remaining() >= DEADLINE_MIN_FULL_CONTEXT
+
+    def _has_time_for(self, llm: LLMInterface, started: bool = True) -> bool:
+        """
+        True if an LLM call is expected to finish before the deadline (its p95
+        latency). Before any shard is reviewed, any time left is enough: the
+        call's own timeout is capped by the deadline.
+        """
+        remaining = self.deadline.remaining()
+        if not started:
+            return remaining > 0
+        # hedging keeps a call within about the primary backend's latency
+        model = llm.backends[0].model_name if isinstance(llm, HedgedLLM) else llm.model_name
+        expected = default_latency_stats().tracker(model).percentile(95)
+        return remaining >= (expected if expected is not None else DEADLINE_DEFAULT_LLM_SECONDS)
+
+    def _fan_out(self, plan: ReviewPlan, shard: List[FileChunk], reviews: List[CodeReview]) -> List[CodeReview]:
+        """Copy findings of repeated edits in the shard to the other places the edit was made."""
+        if not plan.clusters:
+            return []
+        hunks_by_file = defaultdict(list)
+        for chunk in shard:
+            hunks_by_file[chunk.filename].extend(chunk.hunks)
+        copies = fan_out(reviews, plan.clusters, hunks_by_file)
+        finding_cache = self._finding_cache(plan.full_context)
+        members = {id(hunk): hunk for cluster in plan.clusters for _, hunk in cluster.members}
+        fanned = []
+        for (filename, hunk_id), member_reviews in copies.items():
+            if finding_cache and hunk_id in members:
+                finding_cache.store_findings([members[hunk_id]], member_reviews)
+            fanned.extend(member_reviews)
+        return fanned
+
+    def _store_findings(self, plan: ReviewPlan, shard: List[FileChunk], reviews: List[CodeReview]):
+        finding_cache = self._finding_cache(plan.full_context)
+        if not finding_cache:
+            return
+        for chunk in shard:
+            finding_cache.store_findings(chunk.hunks, [r for r in reviews if r.file == chunk.filename])
+
+    def parse_answer(self, llm_answer: ModelResult) -> Optional[LLMReviewResult]:
+        """Parse the JSON review out of a raw LLM answer."""
+        cleaned_response = self.json_cleaner.strip(llm_answer.response)
+        logging.debug(f"Cleaned Response:\n{(cleaned_response or '')[:LOG_CHAR_LIMIT]}... (truncated)")
+        if not cleaned_response:
+            logging.error("Error: No valid JSON found in LLM response")
+            return None
+        try:
+            return LLMReviewResult.from_json(cleaned_response,
+                llm_answer.total_tokens, llm_answer.prompt_tokens, llm_answer.completion_tokens,
+                llm_answer.cached_tokens, combined=self.describe)
+        except ValueError as e:
+            logging.error(f"Error parsing LLM response: {str(e)}")
             return None
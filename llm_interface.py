@@ -1,5 +1,9 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
+from typing import Optional
+
+from config import LLM_TIMEOUT
+from deadline import Deadline
 
 
 
@@ -9,10 +13,40 @@ class ModelResult:
     total_tokens: int
     prompt_tokens: int
     completion_tokens: int
+    # prompt tokens served from the provider's prompt cache (included in prompt_tokens)
+    cached_tokens: int = 0
 
 
 class LLMInterface(ABC):
+    # Shared review deadline; set with set_deadline()
+    deadline: Optional[Deadline] = None
+
+    def set_deadline(self, deadline: Optional[Deadline]):
+        """Bound every following request by the given deadline."""
+        self.deadline = deadline
+
+    def request_timeout(self, default: float = LLM_TIMEOUT) -> float:
+        """
+        Timeout for the next request.
+
+        Raises:
+            DeadlineExceeded: If the deadline has already passed.
+        """
+        return self.deadline.timeout(default, f"calling {self.model_name}") if self.deadline else default
+
+    @property
+    def model_name(self) -> str:
+        """Name of the model answering requests, used in cache keys and accounting."""
+        model = getattr(self, "model", None)
+        return model if isinstance(model, str) else type(self).__name__
+
     @abstractmethod
     def answer(self, system_prompt: str, user_prompt: str, content: str) -> ModelResult:
-        """Generate a JSON response for the given prompts and content."""
+        """
+        Generate a JSON response for the given prompts and content.
+
+        The prompts are sent in this order so that calls sharing a system
+        prompt and user prompt (e.g. the shards of one PR) share a
+        byte-identical prefix that providers can serve from their prompt cache.
+        """
         pass
\ No newline at end of file
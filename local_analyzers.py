@@ -0,0 +1,245 @@
+# local_analyzers.py
+"""
+Local analyzers that find obvious defects in changed files before any LLM call.
+
+Parsers catch what the default prompt mostly hunts for, syntax errors, in
+microseconds: Python via ``compile`` (errors on added lines only, and not in
+syntax newer than the running interpreter), JSON, YAML (if PyYAML is installed) and
+TOML (Python 3.11+), plus leftover merge-conflict markers in any file. Their
+findings are ordinary CodeReview entries; a file with one is broken, so the
+LLM may optionally be skipped for it.
+
+Further analyzers can be added with register_analyzer().
+"""
+import json
+import logging
+import re
+import sys
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import SHARD_CONCURRENCY
+from diff_hunks import Hunk, find_hunk
+from models import CodeReview
+
+try:
+    import yaml
+except ImportError:  # optional dependency
+    yaml = None
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    tomllib = None
+
+# Prefix of every comment written by a local analyzer
+LOCAL_PREFIX = "[local]"
+
+# JSON files that are commonly JSON with comments
+JSONC_NAMES = ("tsconfig", "jsconfig", ".eslintrc", "devcontainer", ".vscode/", "launch.json", "settings.json")
+CONFLICT_MARKER = re.compile(r'^(<{7} |>{7} |<{7}$|>{7}$)')
+TOML_POSITION = re.compile(r'at line (\d+)')
+# (Python version, line pattern) of syntax the running interpreter may not know yet
+NEWER_PYTHON_SYNTAX = [
+    ((3, 12), re.compile(r'^\s*type\s+\w+\s*(\[.*\])?\s*=')),  # type aliases
+    ((3, 12), re.compile(r'^\s*((async\s+)?def|class)\s+\w+\s*\[')),  # type parameters
+    ((3, 12), re.compile(r'(?<!\w)([rRbB]?[fF]|[fF][rRbB])["\']')),  # f-strings reusing quotes, spanning lines
+    ((3, 14), re.compile(r'^\s*except\*?\s+[^(\s:][^:]*,')),  # except clauses without parentheses
+    ((3, 14), re.compile(r'(?<!\w)([rR]?[tT]|[tT][rR])["\']')),  # template strings
+]
+
+
+class Analyzer(ABC):
+    """Checks one changed file; returns (line in the new file, message) for each defect found."""
+    name: str = "analyzer"
+    # file suffixes the analyzer applies to; empty for every file
+    extensions: Tuple[str, ...] = ()
+    # False if added_lines are enough and the full file content is not needed
+    needs_content: bool = True
+
+    def applies_to(self, filename: str) -> bool:
+        return not self.extensions or filename.lower().endswith(self.extensions)
+
+    @abstractmethod
+    def analyze(self, filename: str, content: Optional[str],
+                added_lines: List[Tuple[int, str]]) -> List[Tuple[int, str]]:
+        pass
+
+
+class PythonSyntaxAnalyzer(Analyzer):
+    name = "python-syntax"
+    extensions = (".py", ".pyi")
+
+    def analyze(self, filename, content, added_lines):
+        try:
+            compile(content, filename, "exec", dont_inherit=True)
+        except SyntaxError as e:
+            line = e.lineno or 1
+            text = dict(added_lines).get(line)
+            # an unchanged line was there before the PR; newer syntax may be fine for the project's Python
+            if text is None or self._newer_syntax(text):
+                logging.debug(f"Not reporting Python syntax error in {filename} at line {line}: {e.msg}")
+                return []
+            return [(line, f"Python syntax error: {e.msg}")]
+        except ValueError:  # e.g. null bytes; not a syntax problem the reviewer can point at
+            pass
+        return []
+
+    @staticmethod
+    def _newer_syntax(text: str) -> bool:
+        return any(sys.version_info < version and pattern.search(text) for version, pattern in NEWER_PYTHON_SYNTAX)
+
+
+class JsonAnalyzer(Analyzer):
+    name = "json"
+    extensions = (".json",)
+
+    def applies_to(self, filename):
+        return super().applies_to(filename) and not any(name in filename.lower() for name in JSONC_NAMES)
+
+    def analyze(self, filename, content, added_lines):
+        try:
+            json.loads(content)
+        except json.JSONDecodeError as e:
+            return [(e.lineno, f"Invalid JSON: {e.msg}")]
+        return []
+
+
+if yaml is not None:
+    class _TolerantLoader(yaml.SafeLoader):
+        """SafeLoader that accepts unknown tags (e.g. CloudFormation's !Ref)."""
+
+    _TolerantLoader.add_multi_constructor("", lambda loader, suffix, node: None)
+
+
+class YamlAnalyzer(Analyzer):
+    name = "yaml"
+    extensions = (".yaml", ".yml")
+
+    def applies_to(self, filename):
+        return yaml is not None and super().applies_to(filename)
+
+    def analyze(self, filename, content, added_lines):
+        if "{{" in content or "{%" in content:
+            return []  # a template (Helm, Jinja), not plain YAML
+        try:
+            for _ in yaml.load_all(content, Loader=_TolerantLoader):
+                pass
+        except yaml.MarkedYAMLError as e:
+            mark = e.problem_mark or e.context_mark
+            return [((mark.line + 1) if mark else 1, f"Invalid YAML: {e.problem or e.context}")]
+        except yaml.YAMLError as e:
+            return [(1, f"Invalid YAML: {str(e)}")]
+        return []
+
+
+class TomlAnalyzer(Analyzer):
+    name = "toml"
+    extensions = (".toml",)
+
+    def applies_to(self, filename):
+        return tomllib is not None and super().applies_to(filename)
+
+    def analyze(self, filename, content, added_lines):
+        try:
+            tomllib.loads(content)
+        except tomllib.TOMLDecodeError as e:
+            match = TOML_POSITION.search(str(e))
+            return [(int(match.group(1)) if match else 1, f"Invalid TOML: {str(e)}")]
+        return []
+
+
+class ConflictMarkerAnalyzer(Analyzer):
+    name = "conflict-markers"
+    needs_content = False
+
+    def analyze(self, filename, content, added_lines):
+        return [(line, "Leftover merge conflict marker") for line, text in added_lines
+                if CONFLICT_MARKER.match(text)]
+
+
+_analyzers: List[Analyzer] = [PythonSyntaxAnalyzer(), JsonAnalyzer(), YamlAnalyzer(), TomlAnalyzer(),
+                              ConflictMarkerAnalyzer()]
+
+
+def register_analyzer(analyzer: Analyzer):
+    """Add an analyzer to the ones run before every review."""
+    _analyzers.append(analyzer)
+
+
+def default_analyzers() -> List[Analyzer]:
+    return list(_analyzers)
+
+
+def added_lines(hunks: List[Hunk]) -> List[Tuple[int, str]]:
+    """(line in the new file, text) of every added line."""
+    lines = []
+    for hunk in hunks:
+        new_line = hunk.new_start
+        for line in hunk.lines:
+            if line.startswith('+'):
+                lines.append((new_line, line[1:]))
+            if not line.startswith(('-', '\\')):
+                new_line += 1
+    return lines
+
+
+def new_file_content(hunks: List[Hunk]) -> str:
+    """Content of a file added by the diff, rebuilt from its added lines."""
+    return "\n".join(text for _, text in added_lines(hunks)) + "\n"
+
+
+def to_review(filename: str, hunks: List[Hunk], line: int, message: str, analyzer: str) -> CodeReview:
+    """A finding as a CodeReview, moved into the nearest hunk if the reported line is outside the diff."""
+    comment = f"{LOCAL_PREFIX} {message} ({analyzer})"
+    if hunks:
+        hunk = hunks[find_hunk(hunks, line)]
+        if not hunk.contains_new_line(line):
+            comment += f" at line {line}"
+            line = min(max(line, hunk.new_start), hunk.new_end)
+    return CodeReview(file=filename, line=line, comments=[comment], bug_count=1, smell_count=0,
+                      optimization_count=0, logical_errors=0, performance_issues=0)
+
+
+def run_analyzers(files: List[Tuple[str, List[Hunk], bool]], load_content: Callable[[str], Optional[str]],
+                  analyzers: Optional[List[Analyzer]] = None,
+                  workers: int = SHARD_CONCURRENCY) -> Dict[str, List[CodeReview]]:
+    """
+    Run the analyzers over the changed files concurrently.
+
+    Args:
+        files: (filename, hunks, is_new_file) of each changed file.
+        load_content: Returns a file's content at the PR head, or None if unavailable.
+        analyzers: The analyzers to run (default: all registered ones).
+
+    Returns:
+        {filename: findings} for the files with findings.
+    """
+    analyzers = default_analyzers() if analyzers is None else analyzers
+
+    def analyze_file(filename: str, hunks: List[Hunk], is_new: bool) -> List[CodeReview]:
+        applicable = [analyzer for analyzer in analyzers if analyzer.applies_to(filename)]
+        if not applicable:
+            return []
+        content = None
+        if any(analyzer.needs_content for analyzer in applicable):
+            content = new_file_content(hunks) if is_new else load_content(filename)
+        added = added_lines(hunks)
+        reviews = []
+        for analyzer in applicable:
+            if analyzer.needs_content and not isinstance(content, str):
+                continue
+            try:
+                findings = analyzer.analyze(filename, content, added)
+            except Exception as e:
+                logging.warning(f"Analyzer {analyzer.name} failed on {filename}: {str(e)}")
+                continue
+            reviews.extend(to_review(filename, hunks, line, message, analyzer.name) for line, message in findings)
+        return reviews
+
+    if not files:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(files))), thread_name_prefix="analyzer") as executor:
+        results = list(executor.map(lambda file: analyze_file(*file), files))
+    return {filename: reviews for (filename, _, _), reviews in zip(files, results) if reviews}
@@ -0,0 +1,154 @@
+# model_router.py
+"""
+Cost/latency-aware routing of review shards between a cheap and a strong model.
+
+Every shard goes to the cheap model first, unless a routing rule sends it
+straight to the strong one. Only shards where the cheap pass reported bugs or
+logical errors, or rated its own confidence low, are escalated to the strong
+model, so most PRs finish at small-model latency and cost.
+
+Example routing config (JSON):
+
+    {
+      "cheap": "chatgpt:gpt-4o-mini",
+      "strong": "chatgpt:gpt-4o",
+      "escalate_on": ["bugCount", "logicalErrors"],
+      "min_confidence": 0.6,
+      "max_shard_chars": 60000,
+      "rules": [
+        {"paths": ["migrations/*", "*.sql"], "model": "strong"},
+        {"min_pr_lines": 3000, "model": "strong"},
+        {"paths": ["docs/*", "*.md"], "model": "cheap", "escalate": false}
+      ]
+    }
+
+Rules are checked in order and the first rule whose conditions all match wins.
+"""
+import json
+import re
+import threading
+from fnmatch import translate
+from typing import List, Optional
+
+from circuit_breaker import BreakerLLM
+from llm_interface import LLMInterface
+from models import LLMReviewResult
+from providers import create_llm
+
+CHEAP = "cheap"
+STRONG = "strong"
+
+DEFAULT_ESCALATE_ON = ["bugCount", "logicalErrors"]
+DEFAULT_MIN_CONFIDENCE = 0.6
+# Small shards keep escalations targeted: only the shard with findings is re-sent
+DEFAULT_MAX_SHARD_CHARS = 60000
+
+
+class RoutingRule:
+    """Sends matching shards to a tier; paths are globs matched against any file of the shard."""
+    def __init__(self, model: str, paths: Optional[List[str]] = None, min_pr_lines: Optional[int] = None,
+                 max_pr_lines: Optional[int] = None, escalate: bool = True):
+        if model not in (CHEAP, STRONG):
+            raise ValueError(f"Routing rule model must be '{CHEAP}' or '{STRONG}', got '{model}'")
+        self.model = model
+        # compiled once into a single regex
+        self.paths = re.compile("|".join(translate(p) for p in paths)) if paths else None
+        self.min_pr_lines = min_pr_lines
+        self.max_pr_lines = max_pr_lines
+        self.escalate = escalate
+
+    def matches(self, filenames: List[str], pr_lines: int) -> bool:
+        if self.paths and not any(self.paths.match(name) for name in filenames):
+            return False
+        if self.min_pr_lines is not None and pr_lines < self.min_pr_lines:
+            return False
+        if self.max_pr_lines is not None and pr_lines > self.max_pr_lines:
+            return False
+        return True
+
+
+class Route:
+    """The routing decision for one shard."""
+    def __init__(self, tier: str, escalate: bool):
+        self.tier = tier
+        self.escalate = escalate
+
+
+class ModelRouter:
+    """Chooses the model for each shard and decides whether the cheap result needs a second opinion."""
+
+    def __init__(
+            self,
+            cheap: LLMInterface,
+            strong: LLMInterface,
+            rules: Optional[List[RoutingRule]] = None,
+            escalate_on: Optional[List[str]] = None,
+            min_confidence: float = DEFAULT_MIN_CONFIDENCE,
+            max_shard_chars: int = DEFAULT_MAX_SHARD_CHARS
+    ):
+        self.cheap = cheap
+        self.strong = strong
+        self.rules = rules or []
+        self.escalate_on = escalate_on if escalate_on is not None else DEFAULT_ESCALATE_ON
+        self.min_confidence = min_confidence
+        self.max_shard_chars = max_shard_chars
+        self.escalations = 0
+        self.downgraded = False
+        # shards (and, in batch mode, PRs) are reviewed concurrently
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, path: str) -> 'ModelRouter':
+        """Load a router from a JSON routing config, instantiating both models behind circuit breakers."""
+        with open(path, encoding="utf-8") as f:
+            config = json.load(f)
+        rules = [RoutingRule(**rule) for rule in config.get("rules", [])]
+        return cls(
+            cheap=BreakerLLM(create_llm(config[CHEAP])),
+            strong=BreakerLLM(create_llm(config[STRONG])),
+            rules=rules,
+            escalate_on=config.get("escalate_on"),
+            min_confidence=config.get("min_confidence", DEFAULT_MIN_CONFIDENCE),
+            max_shard_chars=config.get("max_shard_chars", DEFAULT_MAX_SHARD_CHARS),
+        )
+
+    @property
+    def model_name(self) -> str:
+        return f"{self.cheap.model_name}->{self.strong.model_name}"
+
+    def set_deadline(self, deadline):
+        """Bound the calls of both models by the given deadline."""
+        self.cheap.set_deadline(deadline)
+        self.strong.set_deadline(deadline)
+
+    def downgrade(self):
+        """Review every shard with the cheap model only, without escalation (e.g. when over budget)."""
+        self.downgraded = True
+
+    def record_escalation(self):
+        with self._lock:
+            self.escalations += 1
+
+    def llm(self, tier: str) -> LLMInterface:
+        return self.strong if tier == STRONG else self.cheap
+
+    def route(self, filenames: List[str], pr_lines: int) -> Route:
+        """Return the tier a shard starts on; without a matching rule that is the cheap model."""
+        if self.downgraded:
+            return Route(CHEAP, False)
+        for rule in self.rules:
+            if rule.matches(filenames, pr_lines):
+                return Route(rule.model, rule.escalate)
+        return Route(CHEAP, True)
+
+    def should_escalate(self, result: Optional[LLMReviewResult]) -> bool:
+        """True if the cheap pass failed, found escalation-worthy issues or was not confident."""
+        if result is None:
+            return True
+        for review in result.reviews:
+            data = review.to_dict()
+            if any(data.get(key, 0) for key in self.escalate_on):
+                return True
+            if review.confidence is not None and review.confidence < self.min_confidence:
+                return True
+        return False
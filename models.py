@@ -1,11 +1,11 @@
-from typing import List, Dict
+from typing import List, Dict, Optional
 import json
 
 class CodeReview:
     """Represents a single code review for a file."""
     def __init__(self, file: str, line: int, comments: List[str],
         bug_count: int, smell_count: int, optimization_count: int,
-        logical_errors: int, performance_issues: int):
+        logical_errors: int, performance_issues: int, confidence: Optional[float] = None):
         self.file = file
         self.line = line
         self.comments = comments
@@ -14,10 +14,11 @@ class CodeReview:
         self.optimization_count = optimization_count
         self.logical_errors = logical_errors
         self.performance_issues = performance_issues
+        self.confidence = confidence
 
     def to_dict(self) -> dict:
         """Convert to dictionary for JSON serialization."""
-        return {
+        data = {
             "file": self.file,
             "line": self.line,
             "comments": self.comments,
@@ -27,6 +28,9 @@ class CodeReview:
             "logicalErrors": self.logical_errors,  
             "performanceIssues": self.performance_issues,            
         }
+        if self.confidence is not None:
+            data["confidence"] = self.confidence
+        return data
 
     @classmethod
     def from_dict(cls, data: dict) -> 'CodeReview':
@@ -53,6 +57,10 @@ class CodeReview:
         optimization_count = get_count("optimizationCount")
         logical_errors = get_count("logicalErrors")
         performance_issues = get_count("performanceIssues")
+        confidence = data.get("confidence")
+        if confidence is not None and (isinstance(confidence, bool) or not isinstance(confidence, (int, float))
+                                       or not 0 <= confidence <= 1):
+            raise ValueError("'confidence' must be a number between 0 and 1")
 
         return cls(
             file=file,
@@ -63,6 +71,7 @@ class CodeReview:
             optimization_count=optimization_count,
             logical_errors=logical_errors,
             performance_issues=performance_issues,
+            confidence=confidence,
         )
 
     def __str__(self) -> str:
@@ -71,9 +80,11 @@ class CodeReview:
 
 class LLMReviewResult:
     """Represents the LLM's review output as a collection of CodeReview objects."""
-    def __init__(self, reviews: List[CodeReview], total_tokens: int, prompt_tokens: int, completion_tokens: int):
+    def __init__(self, reviews: List[CodeReview], total_tokens: int, prompt_tokens: int, completion_tokens: int,
+                 cached_tokens: int = 0, summary: Optional[str] = None):
         self.reviews = reviews
-        self.totals = self.summarize_reviews(reviews, total_tokens, prompt_tokens, completion_tokens)
+        self.summary = summary  # high-level PR summary, when requested together with the review
+        self.totals = self.summarize_reviews(reviews, total_tokens, prompt_tokens, completion_tokens, cached_tokens)
 
     def to_json(self) -> str:
         """Serialize to JSON string."""
@@ -94,6 +105,7 @@ class LLMReviewResult:
             'total_tokens': 'Total tokens',
             'prompt_tokens': 'Prompt tokens',
             'completion_tokens': 'Completion tokens',
+            'cached_tokens': 'Cached prompt tokens',
             'bug_count': 'Bugs found',
             'smell_count': 'Code smells',
             'optimization_count': 'Optimizations suggested',
@@ -115,7 +127,7 @@ class LLMReviewResult:
                 
 
     def summarize_reviews(self, reviews: List[CodeReview], total_tokens: int, 
-                prompt_tokens: int, completion_tokens: int) -> Dict[str, int]:
+                prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> Dict[str, int]:
         totals = {
             "bug_count": 0,
             "smell_count": 0,
@@ -125,6 +137,7 @@ class LLMReviewResult:
             "total_tokens": total_tokens,
             "prompt_tokens": prompt_tokens,
             "completion_tokens": completion_tokens,
+            "cached_tokens": cached_tokens,
         }
         for r in reviews:
             totals["bug_count"]          += r.bug_count
@@ -135,15 +148,48 @@ class LLMReviewResult:
         return totals    
 
     @classmethod
-    def from_json(cls, json_str: str, total_tokens: int,prompt_tokens:int, completion_tokens : int) -> 'LLMReviewResult':
-        """Create from JSON string, validating structure."""
+    def merge(cls, results: List['LLMReviewResult'], reviews: Optional[List[CodeReview]] = None) -> 'LLMReviewResult':
+        """
+        Combine the results of several LLM calls (e.g. one per shard), summing their
+        token usage; their summaries, if any, are joined in order.
+        """
+        all_reviews = [review for result in results for review in result.reviews] + (reviews or [])
+        summaries = [result.summary for result in results if result.summary]
+        return cls(reviews=all_reviews,
+                   summary="\n\n".join(summaries) if summaries else None,
+                   total_tokens=sum(result.totals["total_tokens"] for result in results),
+                   prompt_tokens=sum(result.totals["prompt_tokens"] for result in results),
+                   completion_tokens=sum(result.totals["completion_tokens"] for result in results),
+                   cached_tokens=sum(result.totals["cached_tokens"] for result in results))
+
+    @classmethod
+    def from_json(cls, json_str: str, total_tokens: int,prompt_tokens:int, completion_tokens : int,
+                  cached_tokens: int = 0, combined: bool = False) -> 'LLMReviewResult':
+        """
+        Create from JSON string, validating structure: an array of reviews, or
+        (only if combined, the describe mode) an object with a "summary" string
+        and a "reviews" array.
+
+        Raises:
+            ValueError: If the JSON does not have that structure; an answer of
+                another shape must not pass for "no findings".
+        """
         try:
             data = json.loads(json_str)
+            summary = None
+            if isinstance(data, dict) and combined:
+                summary = data.get("summary")
+                if summary is not None and not isinstance(summary, str):
+                    raise ValueError("LLM response summary must be a string")
+                if not isinstance(data.get("reviews"), list):
+                    raise ValueError('LLM response object must have a "reviews" array')
+                data = data["reviews"]
             if not isinstance(data, list):
                 raise ValueError("LLM response must be a JSON array")
             reviews = [CodeReview.from_dict(item) for item in data]
             return cls(reviews=reviews, total_tokens=total_tokens,
-                prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+                prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, cached_tokens=cached_tokens,
+                summary=summary)
         except json.JSONDecodeError as e:
             raise ValueError(f"Invalid JSON response: {str(e)}")
 
@@ -0,0 +1,152 @@
+# pr_summarizer.py
+"""
+Map-reduce summaries of pull requests of any size.
+
+A PR whose diff fits into one prompt is summarized in a single call. A larger
+one is grouped by directory into parts of bounded size (a huge file is split
+at hunk boundaries); the parts are summarized concurrently, each cached by the
+hash of its diff, and the part summaries are then reduced, level by level if
+they do not fit into one prompt either, into the final description.
+"""
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+
+from blob_cache import default_blob_cache
+from config import SHARD_CONCURRENCY, SUMMARY_CHUNK_CHARS
+from diff_hunks import group_hunks, join_patch, split_patch
+from llm_interface import LLMInterface, ModelResult
+from prompts import SUMMARY_SYSTEM_PROMPT, get_summary_prompt
+
+
+def pr_context(pr: Any) -> str:
+    """PR title and description, as sent ahead of the diffs."""
+    pr_title = pr.title or "No title provided"
+    pr_description = pr.body or "No description provided"
+    return f"PR Title: {pr_title}\nPR Description:\n{pr_description}\n\n"
+
+
+def group_by_directory(pr_files: list, max_chars: int) -> List[str]:
+    """
+    Pack the files' diffs, directory by directory, into parts of at most about
+    max_chars; a file diff longer than that is split into several parts.
+    """
+    directories = OrderedDict()
+    for file in pr_files:
+        if file.patch:
+            directories.setdefault(os.path.dirname(file.filename), []).append(file)
+    texts = []
+    for files in directories.values():
+        for file in files:
+            text = f"File: {file.filename}\nDiff:\n{file.patch}"
+            if len(text) <= max_chars:
+                texts.append(text)
+                continue
+            header_lines, hunks = split_patch(file.patch)
+            parts = group_hunks(hunks, max_chars)
+            texts.extend(f"File: {file.filename} (part {index} of {len(parts)})\nDiff:\n"
+                         f"{join_patch(header_lines, part)}" for index, part in enumerate(parts, 1))
+    return _pack(texts, max_chars)
+
+
+def _pack(texts: List[str], max_chars: int) -> List[str]:
+    """Join consecutive texts into groups of at most max_chars (a longer text stays alone)."""
+    groups = []
+    size = 0
+    for text in texts:
+        if groups and size + len(text) + 2 <= max_chars:
+            groups[-1] += "\n\n" + text
+            size += len(text) + 2
+        else:
+            groups.append(text)
+            size = len(text)
+    return groups
+
+
+class PRSummarizer:
+    """Writes a high-level PR description with bounded prompts and parallel LLM calls."""
+
+    def __init__(self, llm: LLMInterface, cache: bool = True, max_chars: int = SUMMARY_CHUNK_CHARS,
+                 workers: int = SHARD_CONCURRENCY):
+        self.llm = llm
+        self.store = default_blob_cache("summaries") if cache else None
+        self.max_chars = max_chars
+        self.workers = workers
+
+    def summarize(self, pr: Any, pr_files: list) -> Optional[ModelResult]:
+        """
+        Summarize the PR; the token counts of the result include every call made.
+
+        Returns:
+            The summary, or None if the LLM failed.
+        """
+        base_content = pr_context(pr)
+        diff_content = "\n\n".join(f"File: {file.filename}\nDiff:\n{file.patch}" for file in pr_files if file.patch)
+        if len(diff_content) <= self.max_chars:
+            return self._ask(get_summary_prompt(), base_content + "Diffs:\n" + diff_content)
+
+        parts = group_by_directory(pr_files, self.max_chars)
+        logging.info(f"Summarizing the {len(diff_content)}-character diff in {len(parts)} parts")
+        # part summaries do not depend on the PR description, so they stay cached when it is edited
+        results = self._ask_all(get_summary_prompt(partial=True), ["Diffs:\n" + part for part in parts])
+        if any(result is None for result in results):
+            return None
+        return self.combine(pr, [result.response for result in results], results)
+
+    def combine(self, pr: Any, summaries: List[str],
+                results: Optional[List[ModelResult]] = None) -> Optional[ModelResult]:
+        """
+        Reduce summaries of parts of the PR into one description. The token counts
+        of the result also include those of the given earlier results.
+        """
+        base_content = pr_context(pr)
+        results = list(results or [])
+        while len("\n\n".join(summaries)) > self.max_chars:
+            groups = _pack(summaries, self.max_chars)
+            if len(groups) == len(summaries):
+                # every summary needs a prompt of its own; combining them cannot shrink the input
+                break
+            logging.info(f"Combining {len(summaries)} part summaries into {len(groups)}")
+            reduced = self._ask_all(get_summary_prompt(partial=True),
+                                    ["Summaries of parts of the PR:\n" + group for group in groups])
+            if any(result is None for result in reduced):
+                return None
+            results += reduced
+            summaries = [result.response for result in reduced]
+        final = self._ask(get_summary_prompt(reduce=True),
+                          base_content + "Summaries of parts of the PR:\n" + "\n\n".join(summaries))
+        if final is None:
+            return None
+        results.append(final)
+        return ModelResult(response=final.response,
+                           total_tokens=sum(result.total_tokens for result in results),
+                           prompt_tokens=sum(result.prompt_tokens for result in results),
+                           completion_tokens=sum(result.completion_tokens for result in results),
+                           cached_tokens=sum(result.cached_tokens for result in results))
+
+    def _ask_all(self, user_prompt: str, contents: List[str]) -> List[Optional[ModelResult]]:
+        """Ask for each content concurrently, keeping the order."""
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(contents))),
+                                thread_name_prefix="summary") as executor:
+            return list(executor.map(lambda content: self._ask(user_prompt, content), contents))
+
+    def _ask(self, user_prompt: str, content: str) -> Optional[ModelResult]:
+        """Call the LLM, or answer from the summary cache without tokens spent."""
+        key = None
+        if self.store:
+            digest = hashlib.sha256(f"{self.llm.model_name}\0{SUMMARY_SYSTEM_PROMPT}\0{user_prompt}\0{content}"
+                                    .encode("utf-8")).hexdigest()
+            key = f"summary:{digest}"
+            cached = self.store.get(key)
+            if cached is not None:
+                return ModelResult(response=cached, total_tokens=0, prompt_tokens=0, completion_tokens=0)
+        result = self.llm.answer(SUMMARY_SYSTEM_PROMPT, user_prompt, content)
+        if not result or result.response == "Long_Request":
+            logging.error(f"Failed to summarize {len(content)} characters of the PR")
+            return None
+        if key:
+            self.store.put(key, result.response)
+        return result
@@ -1,30 +1,40 @@
-def get_prompt(deep: bool = False) -> str:
+def get_prompt(deep: bool = False, confidence: bool = False, summary: bool = False) -> str:
     """
     Returns the prompt for the given mode and deep flag, instructing LLM to return JSON output.
 
     Args:
         mode: The mode ('issues', 'comments').
         deep: Whether deep mode is enabled (verbose feedback).
+        confidence: Whether each element must also rate the reviewer's confidence.
+        summary: Whether to also ask for a high-level summary of the changes (combined mode).
 
     Returns:
         The prompt to use for the LLM.
     """
+    summary_wrapper = (
+        "Return a JSON object with two keys: 'summary' - string: a high-level summary of the changes in plain "
+        "text, explaining their purpose and overall impact as a cohesive set of changes, without listing "
+        "individual files; and 'reviews' - a JSON array where each element represents feedback for a file's diff. "
+    ) if summary else "Return a JSON array where each element represents feedback for a file's diff. "
     base_json_schema = (
-        "Return a JSON array where each element represents feedback for a file's diff. "
+        summary_wrapper +
         "Each element must have the following structure: {\n"        
         " 'file'               - string: the file path or name\n"
-        " 'line':  integer (the line number of issue in the new file from 'Line in new file', or old file from 'Line in old file' for deletions)",
+        " 'line':  integer (the line number of issue in the new file from 'Line in new file', or old file from 'Line in old file' for deletions)\n"
         " 'comments'           - array of strings: detailed feedback items\n"
         " 'bugCount'           - integer: total number of bugs detected in this diff\n"
         " 'smellCount'         - integer: total number of code-smell issues found\n"
         " 'optimizationCount'  - integer: total number of optimization suggestions\n"
         " 'logicalErrors'      - integer: total number of logical errors\n"
         " 'performanceIssues'  - integer: total number of performance issues\n"
+        + (" 'confidence'         - number between 0 and 1: how certain you are that this element is complete and correct\n"
+           if confidence else "") +
         "}\n"
         "Rules:\n"
         "  1. Include one object per file, even if all counts are zero and comments is empty.\n"
         "  2. If a file has no issues, set bugCount, smellCount, optimizationCount, logicalErrors, performanceIssues to 0 and comments to [].\n"
-        "  3. If the entire diff is empty or missing, return an empty array.\n"
+        "  3. If the entire diff is empty or missing, return an empty array" +
+        (" of reviews and say so in the summary.\n" if summary else ".\n") +
         "  4. Output must be valid, parsable JSON (no trailing commas, use double-quotes for keys/strings).\n"
     )
 
@@ -43,4 +53,45 @@ def get_prompt(deep: bool = False) -> str:
             "Do not provide general suggestions or speculative concerns. "
             f"{base_json_schema} "
             "For each file, include only critical bugs in the 'comments' array, referencing the modified lines."
-        )
\ No newline at end of file
+        )
+
+SUMMARY_SYSTEM_PROMPT = "You are experienced programmer and code reviewer."
+
+
+def get_summary_prompt(partial: bool = False, reduce: bool = False) -> str:
+    """
+    Returns the instructions for summarizing a PR in plain text.
+
+    Args:
+        partial: Summarize one part of a large PR's diffs, to be combined later.
+        reduce: Combine summaries of parts of the PR into the final summary.
+
+    Returns:
+        The user prompt to send with the PR content.
+    """
+    if partial:
+        return (
+            "Summarize the provided code diffs, which are one part of a larger pull request, in plain text. "
+            "Explain what changes and why it matters in a few sentences, grouped by area rather than by file. "
+            "Mention new or changed public interfaces, behaviour changes and risky changes. "
+            "Do not review the code or give suggestions."
+        )
+    if reduce:
+        return (
+            "Review the provided pull request details, including the PR title, description, and summaries of the "
+            "parts of its code diffs. "
+            "Provide a high-level summary of the changes in plain text, explaining their purpose and overall impact. "
+            "Use the PR description to understand the intent of the changes, and combine the part summaries into a "
+            "cohesive description of the whole set of changes. "
+            "Do not list changes for individual files or provide file-specific feedback. "
+            "If the PR description is missing, base the summary solely on the part summaries and title."
+        )
+    return (
+        "Review the provided pull request details, including the PR title, description, and code diffs. "
+        "Provide a high-level summary of the changes in plain text, explaining their purpose and overall impact. "
+        "Use the PR description to understand the intent of the changes, and focus on summarizing the diffs as a "
+        "cohesive set of changes. "
+        "Do not list changes for individual files or provide file-specific feedback. "
+        "If the diff is empty, state that no changes were found. "
+        "If the PR description is missing, base the summary solely on the diffs and title."
+    )
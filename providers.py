@@ -0,0 +1,107 @@
+# providers.py
+"""
+Lazy registry of LLM and version control system provider backends.
+
+Backends are referenced by "module:ClassName" strings and are imported only
+when selected, so a run that uses one LLM and one VCS does not pay the import
+cost of every SDK (openai, google-generativeai, PyGithub, python-gitlab, ...).
+
+Third-party backends can be added without touching this file by registering
+an entry point in the ``code_reviewer.llm`` or ``code_reviewer.vcsp`` group:
+
+    [project.entry-points."code_reviewer.llm"]
+    claude = "my_package.claude_llm:ClaudeLLM"
+"""
+import importlib
+import logging
+from functools import lru_cache
+from importlib.metadata import entry_points
+from typing import Dict, List
+
+LLM_ENTRY_POINT_GROUP = "code_reviewer.llm"
+VCSP_ENTRY_POINT_GROUP = "code_reviewer.vcsp"
+
+# Built-in backends; these always win over plugins registering the same name.
+LLM_PROVIDERS = {
+    "chatgpt": "chatgpt_llm:ChatGPTLLM",
+    "gemini": "gemini_llm:GeminiLLM",
+    "grok": "grok_llm:GrokLLM",
+}
+
+VCSP_PROVIDERS = {
+    "github": "github_vcsp:GithubVCSP",
+    "gitlab": "gitlab_vcsp:GitlabVCSP",
+    "bitbucket": "bitbucket_vcsp:BitbucketVCSP",
+}
+
+
+def _plugin_providers(group: str) -> Dict[str, str]:
+    """Return {name: "module:attr"} for entry points registered in the group."""
+    try:
+        return {ep.name: ep.value for ep in entry_points(group=group)}
+    except Exception as e:
+        logging.warning(f"Failed to read entry points for {group}: {str(e)}")
+        return {}
+
+
+@lru_cache(maxsize=None)
+def _registry(kind: str) -> Dict[str, str]:
+    builtins, group = {
+        "llm": (LLM_PROVIDERS, LLM_ENTRY_POINT_GROUP),
+        "vcsp": (VCSP_PROVIDERS, VCSP_ENTRY_POINT_GROUP),
+    }[kind]
+    providers = {}
+    for name, target in _plugin_providers(group).items():
+        if name in builtins:
+            logging.warning(f"Ignoring plugin {kind} '{name}' ({target}): name is reserved for a built-in backend")
+            continue
+        providers[name] = target
+    providers.update(builtins)
+    return providers
+
+
+def _load(target: str):
+    """Import "module:attr" and return the attribute."""
+    module_name, _, attr = target.partition(":")
+    module = importlib.import_module(module_name)
+    obj = module
+    for part in attr.split(".") if attr else []:
+        obj = getattr(obj, part)
+    return obj
+
+
+def available_llms() -> List[str]:
+    """Names of all selectable LLM backends (built-in and plugins)."""
+    return list(_registry("llm"))
+
+
+def available_vcsps() -> List[str]:
+    """Names of all selectable VCS provider backends (built-in and plugins)."""
+    return list(_registry("vcsp"))
+
+
+def get_llm_class(name: str):
+    """Import and return the LLM backend class registered under name."""
+    registry = _registry("llm")
+    if name not in registry:
+        raise ValueError(f"Unknown LLM '{name}'. Available: {', '.join(registry)}")
+    return _load(registry[name])
+
+
+def get_vcsp_class(name: str):
+    """Import and return the VCS provider class registered under name."""
+    registry = _registry("vcsp")
+    if name not in registry:
+        raise ValueError(f"Unknown VCS provider '{name}'. Available: {', '.join(registry)}")
+    return _load(registry[name])
+
+
+def create_llm(spec: str):
+    """
+    Instantiate an LLM backend from "name" or "name:model" (e.g. "chatgpt:gpt-4o-mini").
+
+    Without a model part the backend's own default (usually an environment variable) applies.
+    """
+    name, _, model = spec.partition(":")
+    cls = get_llm_class(name)
+    return cls(model=model) if model else cls()
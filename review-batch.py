@@ -0,0 +1,266 @@
+__version__ = "2.0.1"
+
+import argparse
+import json
+import logging
+import sqlite3
+import sys
+from budget_ledger import BudgetLedger, default_ledger_path
+from circuit_breaker import BreakerLLM, BreakerVCSP, FailoverLLM
+from config import DAILY_TOKEN_BUDGET, REPO_DAILY_TOKEN_BUDGET
+from providers import available_llms, available_vcsps, get_llm_class, get_vcsp_class
+from model_router import ModelRouter
+from file_filter import FileFilter
+from review_pipeline import BatchReviewer, PRJob
+from review_history import ReviewHistory, default_history_path
+
+# Configure logging (stdout carries the JSONL stream, so logs go to stderr)
+logging.basicConfig(
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    level=logging.INFO,
+    handlers=[logging.StreamHandler(sys.stderr)]
+)
+
+# Parse command-line arguments
+parser = argparse.ArgumentParser(
+    description="AI Code Review for many PRs/MRs; prints one JSON line per PR as it completes")
+parser.add_argument(
+    "targets",
+    nargs="*",
+    help="PRs as 'owner/repo#123', or 'owner/repo' to review all open PRs in the repository",
+)
+parser.add_argument(
+    "--targets-file",
+    help="File with one target per line (use '-' for stdin)",
+)
+parser.add_argument(
+    "--mode",
+    choices=["issues", "comments"],
+    default="issues",
+    help="Mode: 'issues' (issues only), 'comments' (issues as PR comments)",
+)
+parser.add_argument(
+    "--full-context",
+    action="store_true",
+    default=False,
+    help="Send full files with diffs to the LLM (default: diffs only)",
+)
+parser.add_argument(
+    "--llm",
+    choices=available_llms(),
+    default=["chatgpt"],
+    nargs="+",
+    help="LLM to use; with several, each call fails over to the next one while a backend is down "
+         "(default: chatgpt)",
+)
+parser.add_argument(
+    "--deep",
+    action="store_true",
+    default=False,
+    help="Enable deep mode for verbose reviews including non-bug feedback",
+)
+parser.add_argument(
+    "--vcsp",
+    choices=available_vcsps(),
+    default="github",
+    help="Version control system provider to use (default: github)",
+)
+parser.add_argument(
+    "--add_statistic_info",
+    action="store_true",
+    help="Post the overall review statistics as a PR comment in 'comments' mode",
+)
+parser.add_argument(
+    "--fetch-workers",
+    type=int,
+    default=2,
+    help="Concurrent VCS fetch/prompt build workers (default: 2)",
+)
+parser.add_argument(
+    "--llm-workers",
+    type=int,
+    default=4,
+    help="Concurrent LLM calls (default: 4)",
+)
+parser.add_argument(
+    "--queue-size",
+    type=int,
+    default=2,
+    help="Maximum PRs waiting between two stages (default: 2)",
+)
+parser.add_argument(
+    "--output",
+    help="Write the JSONL results to this file instead of stdout",
+)
+parser.add_argument(
+    "--routing-config",
+    help="JSON routing config: review with a cheap model first and escalate risky shards to a strong one "
+         "(overrides --llm; see model_router.py)",
+)
+parser.add_argument(
+    "--no-finding-cache",
+    action="store_true",
+    help="Re-review every hunk instead of reusing findings cached from earlier reviews of the same change",
+)
+parser.add_argument(
+    "--keep-outdated-comments",
+    action="store_true",
+    help="In comments mode, do not resolve earlier AI comments whose finding is no longer reported",
+)
+parser.add_argument(
+    "--daily-token-budget",
+    type=int,
+    default=DAILY_TOKEN_BUDGET,
+    help="Tokens all reviews may use per UTC day, across runs (default: $CODE_REVIEWER_DAILY_TOKEN_BUDGET, "
+         "0 = unlimited); PRs that do not fit are downgraded or deferred",
+)
+parser.add_argument(
+    "--repo-token-budget",
+    type=int,
+    default=REPO_DAILY_TOKEN_BUDGET,
+    help="Tokens reviews of each repository may use per UTC day (default: "
+         "$CODE_REVIEWER_REPO_DAILY_TOKEN_BUDGET, 0 = unlimited)",
+)
+parser.add_argument(
+    "--no-history",
+    action="store_true",
+    help="Do not record the review in the local history read by review-history.py",
+)
+parser.add_argument(
+    "--include",
+    action="append",
+    default=[],
+    metavar="GLOB",
+    help="Always review files matching the glob, even if they look generated or vendored (repeatable)",
+)
+parser.add_argument(
+    "--exclude",
+    action="append",
+    default=[],
+    metavar="GLOB",
+    help="Never review files matching the glob (repeatable); lock, generated, vendored and minified files "
+         "are skipped by default",
+)
+parser.add_argument(
+    "--debug",
+    action="store_true",
+    help="Enable debug logging for LLM API requests and responses",
+)
+parser.add_argument(
+    "--version",
+    action="version",
+    version=f"AI Code Reviewer {__version__}",
+    help="Show the version and exit",
+)
+
+args = parser.parse_args()
+
+if args.debug:
+    logging.getLogger().setLevel(logging.DEBUG)
+logging.getLogger("openai").setLevel(logging.WARNING)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+targets = list(args.targets)
+if args.targets_file:
+    with (sys.stdin if args.targets_file == "-" else open(args.targets_file, encoding="utf-8")) as f:
+        targets += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+if not targets:
+    parser.error("no PRs given; pass targets or --targets-file")
+
+
+def parse_target(target: str):
+    """(repository, PR number or None for all open PRs) of a target; raises ValueError if malformed."""
+    repository, separator, number = target.partition("#")
+    if not repository or (separator and not number.isdigit()):
+        raise ValueError(f"invalid target '{target}': expected 'owner/repo#123' or 'owner/repo'")
+    return repository, int(number) if separator else None
+
+
+try:
+    parsed_targets = [parse_target(target) for target in targets]
+except ValueError as e:
+    parser.error(str(e))
+
+try:
+    router = ModelRouter.from_config(args.routing_config) if args.routing_config else None
+    if router:
+        llm = router.cheap
+    else:
+        llms = [get_llm_class(name)() for name in args.llm]
+        # every PR of the batch shares the backends' circuit breakers, so an outage is detected once
+        llm = BreakerLLM(llms[0]) if len(llms) == 1 else FailoverLLM(llms)
+    vcsp_class = get_vcsp_class(args.vcsp)
+    listing_vcsp = BreakerVCSP(vcsp_class())
+except (ValueError, ImportError, OSError, KeyError, TypeError) as e:
+    logging.error(f"Failed to initialize providers: {str(e)}")
+    exit(1)
+
+
+def iter_jobs():
+    """Expand targets lazily, so the first PRs start before all repositories are listed."""
+    for repository, number in parsed_targets:
+        if number is not None:
+            yield PRJob(repository, number)
+            continue
+        try:
+            pr_numbers = listing_vcsp.get_open_pull_requests(repository)
+        except NotImplementedError:
+            logging.error(f"The {args.vcsp} provider cannot list open PRs; pass {repository}#<number> targets")
+            continue
+        except Exception as e:
+            logging.error(f"Failed to list open PRs in {repository}: {str(e)}")
+            continue
+        logging.info(f"{len(pr_numbers)} open PRs in {repository}")
+        for pr_number in pr_numbers:
+            yield PRJob(repository, pr_number)
+
+
+model_label = router.model_name if router else "+".join(args.llm)
+# spend is recorded even without budgets, so other runs see it
+ledger_path = default_ledger_path()
+ledger = BudgetLedger(ledger_path, args.daily_token_budget, args.repo_token_budget) if ledger_path else None
+batch = BatchReviewer(
+    llm=llm,
+    vcsp_factory=lambda: BreakerVCSP(vcsp_class()),
+    full_context=args.full_context,
+    deep=args.deep,
+    post_comments=args.mode == "comments",
+    overall_review=(lambda result: result.get_overall_review(args.deep, args.full_context, model_label))
+    if args.add_statistic_info else None,
+    finding_cache=not args.no_finding_cache,
+    router=router,
+    file_filter=FileFilter(args.include, args.exclude),
+    resolve_outdated=not args.keep_outdated_comments,
+    ledger=ledger,
+    model_label=model_label,
+)
+
+history_path = None if args.no_history else default_history_path()
+history = ReviewHistory(history_path) if history_path else None
+
+out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+failures = 0
+try:
+    for job in batch.run(iter_jobs(), queue_size=args.queue_size,
+                         fetch_workers=args.fetch_workers, llm_workers=args.llm_workers):
+        failures += job.status == "error"
+        if history and job.review_result:
+            try:
+                history.record(args.vcsp, job.repository, job.pr_number, job.pr.head_sha, model_label,
+                               job.review_result)
+            except sqlite3.Error as e:
+                logging.warning(f"Failed to record {job.repository}#{job.pr_number} in the history: {str(e)}")
+        out.write(json.dumps(job.to_dict()) + "\n")
+        out.flush()
+except Exception as e:
+    logging.error(f"Batch aborted: {str(e)}")
+    failures += 1
+finally:
+    if out is not sys.stdout:
+        out.close()
+    if history:
+        history.close()
+    if ledger:
+        ledger.close()
+
+exit(1 if failures else 0)
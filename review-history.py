@@ -0,0 +1,78 @@
+__version__ = "2.0.1"
+
+import argparse
+import json
+import sys
+from review_history import METRICS, PERIODS, ReviewHistory, default_history_path
+
+# Parse command-line arguments
+parser = argparse.ArgumentParser(description="Reports over the history of past AI code reviews")
+parser.add_argument(
+    "--history",
+    default=default_history_path(),
+    help="History file to read (default: history.sqlite in the local cache directory)",
+)
+parser.add_argument(
+    "--repository",
+    help="Only report on this repository (e.g., 'username/repo')",
+)
+parser.add_argument(
+    "--json",
+    action="store_true",
+    help="Print one JSON object per row instead of a table",
+)
+parser.add_argument(
+    "--version",
+    action="version",
+    version=f"AI Code Review History {__version__}",
+    help="Show the version and exit",
+)
+subparsers = parser.add_subparsers(dest="report", required=True)
+tokens_parser = subparsers.add_parser("tokens", help="Tokens spent per repository and period")
+tokens_parser.add_argument(
+    "--by",
+    choices=list(PERIODS),
+    default="week",
+    help="Period to total the tokens over (default: week)",
+)
+tokens_parser.add_argument(
+    "--since",
+    help="Only count runs on or after this date (YYYY-MM-DD)",
+)
+files_parser = subparsers.add_parser("files", help="Files with the most findings")
+files_parser.add_argument(
+    "--metric",
+    choices=METRICS,
+    default="bug_count",
+    help="What to rank the files by (default: bug_count)",
+)
+files_parser.add_argument(
+    "--top",
+    type=int,
+    default=20,
+    help="Number of files to list (default: 20)",
+)
+
+args = parser.parse_args()
+if not args.history:
+    print("No history file: the local cache directory is disabled; pass --history.", file=sys.stderr)
+    exit(1)
+
+history = ReviewHistory(args.history)
+if args.report == "tokens":
+    columns = [args.by, "repository", "runs", "prompt_tokens", "completion_tokens", "cached_tokens", "total_tokens"]
+    rows = history.tokens_by_period(args.by, args.repository, args.since)
+else:
+    columns = ["repository", "file", "findings", args.metric]
+    rows = history.top_files(args.metric, args.repository, args.top)
+history.close()
+
+if args.json:
+    for row in rows:
+        print(json.dumps(dict(zip(columns, row))))
+else:
+    widths = [max([len(column)] + [len(str(row[i])) for row in rows]) for i, column in enumerate(columns)]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(value).rjust(width) if isinstance(value, int) else str(value).ljust(width)
+                        for value, width in zip(row, widths)))
@@ -2,14 +2,27 @@ __version__ = "2.0.1"
 
 import argparse
 import logging
-from chatgpt_llm import ChatGPTLLM
-from gemini_llm import GeminiLLM
-from github_vcsp import GithubVCSP
-from gitlab_vcsp import GitlabVCSP
-from bitbucket_vcsp import BitbucketVCSP
-from grok_llm import GrokLLM
-from models import LLMReviewResult, CodeReview
+import sqlite3
+from budget_ledger import BudgetLedger, default_ledger_path
+from config import DAILY_TOKEN_BUDGET, DEADLINE_POST_RESERVE, REPO_DAILY_TOKEN_BUDGET
+from cost_planner import default_token_estimator
+from deadline import Deadline
+from providers import available_llms, available_vcsps, get_llm_class, get_vcsp_class
+from llm_interface import ModelResult
+from models import LLMReviewResult
 from llm_code_reviewer import LLMCodeReviewer
+from circuit_breaker import BreakerLLM, BreakerVCSP, FailoverLLM
+from hedged_llm import HEDGE_PERCENTILE, HedgedLLM, is_valid_review
+from latency import default_latency_stats
+from model_router import ModelRouter
+from file_filter import FileFilter
+from symbol_index import SymbolIndex
+from review_history import ReviewHistory, default_history_path
+from comment_sync import CommentSync, resolve_outdated
+from review_output import format_review_summary, format_skipped_files, post_review_comments
+
+# Exit status of a review deferred because it would exceed a token budget (EX_TEMPFAIL)
+EXIT_DEFERRED = 75
 
 # Configure logging
 logging.basicConfig(
@@ -36,8 +49,8 @@ parser.add_argument(
 )
 parser.add_argument(
     "--llm",
-    choices=["chatgpt", "gemini", "grok"],
-    default="chatgpt",
+    choices=available_llms(),
+    default=["chatgpt"],
     nargs="+",
     help="LLM to use (one or more): 'chatgpt', 'gemini', 'grok' (default: chatgpt)",
 )
@@ -48,6 +61,103 @@ parser.add_argument(
     default=False,
     help="Enable deep mode for verbose reviews including non-bug feedback",
 )
+parser.add_argument(
+    "--hedge",
+    action="store_true",
+    help="Hedge slow LLM calls: if the first --llm is slower than its usual latency, "
+         "also ask the next one and keep the first valid answer (both calls are paid for)",
+)
+parser.add_argument(
+    "--hedge-percentile",
+    type=float,
+    default=HEDGE_PERCENTILE,
+    help=f"Latency percentile of the primary LLM after which a hedge is sent (default: {HEDGE_PERCENTILE})",
+)
+parser.add_argument(
+    "--routing-config",
+    help="JSON routing config: review with a cheap model first and escalate risky shards to a strong one "
+         "(overrides --llm; see model_router.py)",
+)
+parser.add_argument(
+    "--no-finding-cache",
+    action="store_true",
+    help="Re-review every hunk instead of reusing findings cached from earlier reviews of the same change",
+)
+parser.add_argument(
+    "--keep-outdated-comments",
+    action="store_true",
+    help="In comments mode, do not resolve earlier AI comments whose finding is no longer reported",
+)
+parser.add_argument(
+    "--no-history",
+    action="store_true",
+    help="Do not record the review in the local history read by review-history.py",
+)
+parser.add_argument(
+    "--deadline",
+    type=float,
+    metavar="SECONDS",
+    help="Time budget for the whole run: when it runs short, full context is skipped, only the most "
+         f"important shards are reviewed and the findings so far are posted ({DEADLINE_POST_RESERVE}s are "
+         "kept for posting)",
+)
+parser.add_argument(
+    "--plan",
+    action="store_true",
+    help="Dry run: print the shards with estimated tokens, cost and latency without calling an LLM",
+)
+parser.add_argument(
+    "--daily-token-budget",
+    type=int,
+    default=DAILY_TOKEN_BUDGET,
+    help="Tokens all reviews may use per UTC day, across runs (default: $CODE_REVIEWER_DAILY_TOKEN_BUDGET, "
+         "0 = unlimited)",
+)
+parser.add_argument(
+    "--repo-token-budget",
+    type=int,
+    default=REPO_DAILY_TOKEN_BUDGET,
+    help="Tokens reviews of this repository may use per UTC day (default: "
+         "$CODE_REVIEWER_REPO_DAILY_TOKEN_BUDGET, 0 = unlimited)",
+)
+parser.add_argument(
+    "--include",
+    action="append",
+    default=[],
+    metavar="GLOB",
+    help="Always review files matching the glob, even if they look generated or vendored (repeatable)",
+)
+parser.add_argument(
+    "--exclude",
+    action="append",
+    default=[],
+    metavar="GLOB",
+    help="Never review files matching the glob (repeatable); lock, generated, vendored and minified files "
+         "are skipped by default",
+)
+parser.add_argument(
+    "--no-local-analyzers",
+    action="store_true",
+    help="Do not check changed files locally (Python/JSON/YAML/TOML syntax, merge conflict markers) before the LLM",
+)
+parser.add_argument(
+    "--skip-llm-on-local-errors",
+    action="store_true",
+    help="Do not send files to the LLM that the local analyzers already found broken",
+)
+parser.add_argument(
+    "--repo-path",
+    metavar="PATH",
+    help="Local clone of the repository at the PR head: definitions of functions and classes the diff references "
+         "in other files are added to the prompt (the symbol index is kept under the cache directory and "
+         "updated incrementally)",
+)
+parser.add_argument(
+    "--describe",
+    action="store_true",
+    help="Also write the high-level PR summary (as describe-pr.py does) in the same LLM calls; in comments mode "
+         "it is posted together with the inline comments",
+)
 parser.add_argument(
     "--debug",
     action="store_true",
@@ -61,7 +171,7 @@ parser.add_argument(
 )
 parser.add_argument(
     "--vcsp",
-    choices=["github", "gitlab", "bitbucket"],
+    choices=available_vcsps(),
     default="github",
     help="Version control system provider to use: 'github' (default: github)",
 )
@@ -74,6 +184,10 @@ parser.add_argument(
 
 args = parser.parse_args()
 
+# The LLM stops early enough to leave time for posting; the VCS may use the whole budget
+deadline = Deadline(args.deadline) if args.deadline else None
+llm_deadline = deadline.reserve(min(DEADLINE_POST_RESERVE, args.deadline / 2)) if deadline else None
+
 # Set logging level based on --debug
 if args.debug:
     logging.getLogger().setLevel(logging.DEBUG)
@@ -83,32 +197,68 @@ else:
     logging.getLogger("openai").setLevel(logging.WARNING)
     logging.getLogger("httpx").setLevel(logging.WARNING)
 
-# LLM setup
-llm_map = {
-    "chatgpt": ChatGPTLLM,
-    "gemini": GeminiLLM,
-    "grok": GrokLLM
-    
-}
+router = None
+if args.routing_config:
+    try:
+        router = ModelRouter.from_config(args.routing_config)
+    except (ValueError, ImportError, OSError, KeyError, TypeError) as e:
+        logging.error(f"Failed to load routing config: {str(e)}")
+        exit(1)
+
+
+def create_llm_backends():
+    """Initialize the --llm backends, each behind a circuit breaker; those that fail to start are skipped."""
+    backends = []
+    for name in args.llm:
+        try:
+            backends.append(BreakerLLM(get_llm_class(name)()))
+        except (ValueError, ImportError) as e:
+            logging.error(f"Failed to initialize LLM {name}: {str(e)}")
+    if not backends:
+        raise ValueError("No LLM backend could be initialized")
+    return backends
+
+
+def create_hedged_llm():
+    backends = create_llm_backends()
+    if len(backends) == 1:
+        logging.warning("Only one LLM available; reviewing without hedging.")
+        return backends[0]
+    return HedgedLLM(backends, percentile=args.hedge_percentile,
+                     validator=lambda result: is_valid_review(result, combined=args.describe))
 
-for i in range(len(args.llm)):
+
+def create_failover_llm():
+    # each call goes to the first --llm whose circuit breaker is closed and fails over to the next one
+    backends = create_llm_backends()
+    return backends[0] if len(backends) == 1 else FailoverLLM(backends)
+
+
+# (label, factory) pairs tried in order until one produces a review.
+# LLM and VCS backends are imported lazily, only once selected
+if router:
+    llm_choices = [(router.model_name, lambda: router.cheap)]
+elif args.hedge:
+    llm_choices = [("+".join(args.llm), create_hedged_llm)]
+else:
+    llm_choices = [("+".join(args.llm), create_failover_llm)]
+
+for model_label, create_llm in llm_choices:
     try:
-        llm = llm_map[args.llm[i]]()
-    except ValueError as e:
+        llm = create_llm()
+    except (ValueError, ImportError) as e:
         logging.error(f"Failed to initialize LLM: {str(e)}")
         continue
+    if deadline:
+        (router or llm).set_deadline(llm_deadline)
 
     # VCS setup
-    version_control_system_map = {
-        "github": GithubVCSP,
-        "gitlab": GitlabVCSP,
-        "bitbucket": BitbucketVCSP,
-    }
     try:
-        vcsp = version_control_system_map[args.vcsp]()
-    except ValueError as e:
+        vcsp = BreakerVCSP(get_vcsp_class(args.vcsp)())
+    except (ValueError, ImportError) as e:
         logging.error(f"Failed to initialize VCS: {str(e)}")
         exit(1)
+    vcsp.set_deadline(deadline)
 
     # Fetch repository and pull request
     try:
@@ -117,93 +267,132 @@ for i in range(len(args.llm)):
         logging.error(f"Failed to fetch pull request: {str(e)}")
         exit(1)
 
+    symbol_index = None
+    if args.repo_path:
+        try:
+            symbol_index = SymbolIndex(args.repo_path)
+            symbol_index.update()
+        except (OSError, sqlite3.Error) as e:
+            logging.error(f"Failed to index {args.repo_path}; reviewing without cross-file context: {str(e)}")
+            symbol_index = None
+
     # Create LLMCodeReviewer
     reviewer = LLMCodeReviewer(
         llm=llm,
         vcsp=vcsp,
         full_context=args.full_context,
         deep=args.deep,
+        finding_cache=not args.no_finding_cache,
+        router=router,
+        deadline=llm_deadline,
+        file_filter=FileFilter(args.include, args.exclude),
+        describe=args.describe,
+        local_analyzers=not args.no_local_analyzers,
+        skip_broken_files=args.skip_llm_on_local_errors,
+        symbol_index=symbol_index,
     )
 
+    try:
+        pr_files, plan = reviewer.plan_pr(pr, args.repository, args.pr_number)
+    except Exception as e:
+        logging.error(f"Failed to prepare review: {str(e)}")
+        continue
+    estimate = reviewer.estimate(plan)
+    if args.plan:
+        print(estimate.format())
+        break
+
+    ledger_path = default_ledger_path()
+    ledger = BudgetLedger(ledger_path, args.daily_token_budget, args.repo_token_budget) if ledger_path else None
+    over_budget = ledger.over_budget(args.repository, estimate.total_tokens) \
+        if ledger and estimate.total_tokens else None
+    if over_budget and (plan.full_context or router):
+        # downgrade: diffs only, and no escalation to the strong model
+        logging.warning(f"Review would exceed the {over_budget}; downgrading it.")
+        if router:
+            router.downgrade()
+        if plan.full_context:
+            plan = reviewer.build_plan(pr, args.repository, pr_files, False)
+        estimate = reviewer.estimate(plan)
+        over_budget = ledger.over_budget(args.repository, estimate.total_tokens)
+    if over_budget:
+        logging.warning(f"Deferring review: it would exceed the {over_budget}.")
+        exit(EXIT_DEFERRED)
+
     # Get the review
     try:
-        review_result: LLMReviewResult = reviewer.review_pr(pr, args.repository, args.pr_number)
+        review_result: LLMReviewResult = reviewer.review_plan(pr, args.repository, pr_files, plan)
     except Exception as e:
         logging.error(f"Failed to generate review: {str(e)}")
         continue
+    if isinstance(llm, HedgedLLM) and review_result:
+        # hedged calls that lost but finished during the review were paid for too
+        review_result = LLMReviewResult.merge([review_result] + [
+            LLMReviewResult(reviews=[], total_tokens=late.total_tokens, prompt_tokens=late.prompt_tokens,
+                            completion_tokens=late.completion_tokens, cached_tokens=late.cached_tokens)
+            for late in llm.take_late_results()])
+    if ledger and review_result:
+        ledger.record(args.repository, args.pr_number, model_label, review_result.totals["prompt_tokens"],
+                      review_result.totals["completion_tokens"], review_result.totals["total_tokens"])
+    history_path = None if args.no_history else default_history_path()
+    if history_path and review_result:
+        try:
+            history = ReviewHistory(history_path)
+            history.record(args.vcsp, args.repository, args.pr_number, pr.head_sha, model_label, review_result)
+            history.close()
+        except sqlite3.Error as e:
+            logging.warning(f"Failed to record the review in the history: {str(e)}")
+    if isinstance(llm, HedgedLLM) and review_result:
+        def account_late_call(late: ModelResult):
+            """Add a hedged loser finishing from now on to the recorded spend."""
+            if ledger:
+                ledger.record(args.repository, args.pr_number, model_label, late.prompt_tokens,
+                              late.completion_tokens, late.total_tokens)
+            if history_path:
+                late_history = ReviewHistory(history_path)
+                late_history.add_tokens(args.vcsp, args.repository, args.pr_number, pr.head_sha, model_label,
+                                        late.prompt_tokens, late.completion_tokens, late.total_tokens,
+                                        late.cached_tokens)
+                late_history.close()
+        llm.set_late_result_handler(account_late_call)
+
+    if router:
+        logging.info(f"Model router escalated {router.escalations} shard(s) to {router.strong.model_name}")
 
+    if args.describe:
+        print(f"General PR Review:\n{review_result.summary if review_result and review_result.summary else 'None'}")
     print("Code Issues:")
     if not review_result or not review_result.reviews:
-        print("  No issues found.")    
+        print("  No issues found.")
     else:
-        review_summary = ""
-        for review in review_result.reviews:            
-            if review.comments and (review.bug_count != 0 or review.smell_count != 0 or                
-                review.optimization_count != 0 or review.logical_errors != 0 or
-                review.performance_issues != 0):
-                review_summary += f"\n  File: {review.file}, Line: {review.line}"
-                review_summary += "    Comments: " + '\n'.join(str(comment) for comment in review.comments)
-                if review.bug_count != 0:
-                    review_summary += f"    bugCount={review.bug_count},"
-                if review.smell_count != 0:
-                    review_summary += f"    smellCount={review.smell_count},"
-                if review.optimization_count != 0:
-                    review_summary += f"    optimizationCount={review.optimization_count},"
-                if review.logical_errors != 0:
-                    review_summary += f"    logicalErrors={review.logical_errors}\n"
-                if review.performance_issues != 0:
-                    review_summary += f"    performanceIssues={review.performance_issues},"
         if args.add_statistic_info:
-            print(review_result.get_overall_review(args.deep, args.full_context, args.llm[i]))
-        print(review_summary)
-                
+            print(review_result.get_overall_review(args.deep, args.full_context, model_label))
+        print(format_review_summary(review_result))
+    if reviewer.skipped_files:
+        print(format_skipped_files(reviewer.skipped_files))
 
-    if args.mode == "comments" and pr.state.lower() == "open" and review_result and review_result.reviews:
-        try:
-            head_commit = vcsp.get_commit(args.repository, pr.head_sha)
-        except Exception as e:
-            logging.error(f"Failed to fetch head commit: {str(e)}")
-            exit(1)
-        if args.add_statistic_info:
-            vcsp.create_review_comment(
-                            repo_name=args.repository,
-                            comment=review_result.get_overall_review(args.deep, args.full_context, args.llm[i]),                        
-                            file_path="",
-                            line=0,
-                            commit=head_commit.sha,
-                            side="RIGHT"
-                        )
-        for review in review_result.reviews:
-            if review.comments and (review.bug_count != 0 or review.smell_count != 0 or
-                review.optimization_count != 0 or review.logical_errors != 0 or
-                review.performance_issues != 0):
-                lines = ["AI Comment:"] + review.comments
-
-                # add any non-zero counts
-                if review.bug_count:
-                    lines.append(f"    bugCount={review.bug_count}")
-                if review.smell_count:
-                    lines.append(f"    smellCount={review.smell_count}")
-                if review.optimization_count:
-                    lines.append(f"    optimizationCount={review.optimization_count}")
-                if review.logical_errors:
-                    lines.append(f"    logicalErrors={review.logical_errors}")
-                if review.performance_issues:
-                    lines.append(f"    performanceIssues={review.performance_issues}")
-
-                comment = "\n".join(lines)
-                try:
-                    vcsp.create_review_comment(
-                        repo_name=args.repository,
-                        comment=comment,
-                        commit=head_commit.sha,
-                        file_path=review.file,
-                        line=review.line,
-                        side="RIGHT",
-                    )
-                    logging.info(f"Posted comment on {review.file} at line {review.line}")
-                except Exception as e:
-                    logging.error(f"Error posting comment on {review.file}: {str(e)}")
+    if args.mode == "comments" and pr.state.lower() == "open" and review_result:
+        # AI comments from earlier runs: findings already posted are skipped, vanished ones resolved
+        existing = CommentSync.fetch(vcsp, args.repository, args.pr_number, pr_files, reviewer.reviewed_files)
+        if review_result.reviews or review_result.summary:
+            try:
+                head_commit = vcsp.get_commit(args.repository, pr.head_sha)
+            except Exception as e:
+                logging.error(f"Failed to fetch head commit: {str(e)}")
+                exit(1)
+            overall_parts = [review_result.summary] if review_result.summary else []
+            if args.add_statistic_info:
+                overall_parts.append(review_result.get_overall_review(args.deep, args.full_context, model_label))
+            post_review_comments(vcsp, args.repository, head_commit.sha, review_result,
+                                 "\n\n".join(overall_parts) or None, existing)
+        if existing and not args.keep_outdated_comments:
+            resolve_outdated(vcsp, args.repository, args.pr_number, existing, review_result.reviews)
     elif args.mode == "comments":
         logging.info("Comments mode: PR is closed, no comments posted.")
+    if isinstance(llm, HedgedLLM):
+        llm.close()
+        logging.info(llm.usage_summary())
+    # latency samples also size the shards reviewed under --deadline; token counts calibrate --plan
+    default_latency_stats().save()
+    default_token_estimator().save()
     break
@@ -0,0 +1,195 @@
+# review_history.py
+"""
+History of past reviews, for reports over many runs.
+
+Every run's findings and token totals are stored in a SQLite file under
+CACHE_DIR, one run per (VCS, repository, PR, head SHA, model): reviewing the
+same commit with the same model again replaces the earlier run. Token reports
+are answered from a covering index on the runs; per-file totals are kept up to
+date in a rollup table as runs are recorded, so ranking files never scans the
+(possibly millions of) individual findings.
+"""
+import datetime
+import os
+import sqlite3
+import threading
+from typing import List, Optional, Tuple
+
+from config import CACHE_DIR
+from models import LLMReviewResult
+from review_output import has_findings
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    day TEXT NOT NULL,
+    week TEXT NOT NULL,
+    vcsp TEXT NOT NULL,
+    repository TEXT NOT NULL,
+    pr_number INTEGER NOT NULL,
+    head_sha TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    total_tokens INTEGER NOT NULL,
+    cached_tokens INTEGER NOT NULL,
+    findings INTEGER NOT NULL,
+    UNIQUE (vcsp, repository, pr_number, head_sha, model)
+);
+CREATE TABLE IF NOT EXISTS findings (
+    run_id INTEGER NOT NULL,
+    repository TEXT NOT NULL,
+    file TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    bug_count INTEGER NOT NULL,
+    smell_count INTEGER NOT NULL,
+    optimization_count INTEGER NOT NULL,
+    logical_errors INTEGER NOT NULL,
+    performance_issues INTEGER NOT NULL,
+    comments TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS findings_run ON findings (run_id);
+CREATE INDEX IF NOT EXISTS runs_week ON runs (week, repository, total_tokens, prompt_tokens,
+                                              completion_tokens, cached_tokens);
+CREATE INDEX IF NOT EXISTS runs_day ON runs (day, repository, total_tokens, prompt_tokens,
+                                             completion_tokens, cached_tokens);
+CREATE TABLE IF NOT EXISTS file_totals (
+    repository TEXT NOT NULL,
+    file TEXT NOT NULL,
+    findings INTEGER NOT NULL,
+    bug_count INTEGER NOT NULL,
+    smell_count INTEGER NOT NULL,
+    optimization_count INTEGER NOT NULL,
+    logical_errors INTEGER NOT NULL,
+    performance_issues INTEGER NOT NULL,
+    PRIMARY KEY (repository, file)
+);
+"""
+
+# Columns of the file_totals table that can rank files
+METRICS = ("bug_count", "smell_count", "optimization_count", "logical_errors", "performance_issues", "findings")
+FILE_TOTALS = """
+SELECT file, COUNT(*), SUM(bug_count), SUM(smell_count), SUM(optimization_count), SUM(logical_errors),
+       SUM(performance_issues)
+FROM findings WHERE run_id = ? GROUP BY file
+"""
+ADD_FILE_TOTALS = """
+INSERT INTO file_totals VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (repository, file) DO UPDATE SET
+    findings = findings + excluded.findings,
+    bug_count = bug_count + excluded.bug_count,
+    smell_count = smell_count + excluded.smell_count,
+    optimization_count = optimization_count + excluded.optimization_count,
+    logical_errors = logical_errors + excluded.logical_errors,
+    performance_issues = performance_issues + excluded.performance_issues
+"""
+PERIODS = {"day": "day", "week": "week", "month": "substr(day, 1, 7)"}
+
+
+class ReviewHistory:
+    """Stores review runs and answers aggregate queries over them."""
+
+    def __init__(self, path: str = ":memory:"):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        # several CI jobs may share the file; wait for each other's writes instead of failing
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        if path != ":memory:":
+            # readers (the query CLI) do not block a review that is writing its run
+            self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.executescript(SCHEMA)
+
+    def record(self, vcsp: str, repository: str, pr_number: int, head_sha: str, model: str,
+               result: LLMReviewResult, created_at: Optional[datetime.datetime] = None) -> int:
+        """Store a run and its findings, replacing an earlier run of the same commit and model."""
+        created_at = created_at or datetime.datetime.now(datetime.timezone.utc)
+        day = created_at.date()
+        week = day - datetime.timedelta(days=day.weekday())
+        totals = result.totals
+        # per-file entries without findings (a clean file) are not findings
+        findings = [r for r in result.reviews if has_findings(r)]
+        key = (vcsp, repository, pr_number, head_sha, model)
+        with self._lock, self._db:
+            previous = self._db.execute("SELECT id FROM runs WHERE vcsp = ? AND repository = ? AND pr_number = ? "
+                                        "AND head_sha = ? AND model = ?", key).fetchone()
+            if previous:
+                self._add_file_totals(repository, previous[0], -1)
+                self._db.execute("DELETE FROM findings WHERE run_id = ?", previous)
+                self._db.execute("DELETE FROM runs WHERE id = ?", previous)
+            run_id = self._db.execute(
+                "INSERT INTO runs (created_at, day, week, vcsp, repository, pr_number, head_sha, model, "
+                "prompt_tokens, completion_tokens, total_tokens, cached_tokens, findings) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (created_at.isoformat(), day.isoformat(), week.isoformat(), *key, totals["prompt_tokens"],
+                 totals["completion_tokens"], totals["total_tokens"], totals.get("cached_tokens", 0),
+                 len(findings))).lastrowid
+            self._db.executemany(
+                "INSERT INTO findings VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, repository, r.file, r.line, r.bug_count, r.smell_count, r.optimization_count,
+                  r.logical_errors, r.performance_issues, "\n".join(r.comments)) for r in findings])
+            self._add_file_totals(repository, run_id, 1)
+        return run_id
+
+    def add_tokens(self, vcsp: str, repository: str, pr_number: int, head_sha: str, model: str,
+                   prompt_tokens: int, completion_tokens: int, total_tokens: int, cached_tokens: int = 0):
+        """Add tokens spent after a run was recorded (e.g. a hedged call that lost but still finished)."""
+        with self._lock, self._db:
+            self._db.execute("UPDATE runs SET prompt_tokens = prompt_tokens + ?, "
+                             "completion_tokens = completion_tokens + ?, total_tokens = total_tokens + ?, "
+                             "cached_tokens = cached_tokens + ? WHERE vcsp = ? AND repository = ? AND pr_number = ? "
+                             "AND head_sha = ? AND model = ?",
+                             (prompt_tokens, completion_tokens, total_tokens, cached_tokens,
+                              vcsp, repository, pr_number, head_sha, model))
+
+    def _add_file_totals(self, repository: str, run_id: int, sign: int):
+        """Add (sign 1) or subtract (sign -1) a run's findings to the per-file totals."""
+        rows = self._db.execute(FILE_TOTALS, (run_id,)).fetchall()
+        self._db.executemany(ADD_FILE_TOTALS, [(repository, file, *(sign * value for value in values))
+                                               for file, *values in rows])
+        if sign < 0:
+            self._db.execute("DELETE FROM file_totals WHERE repository = ? AND findings <= 0", (repository,))
+
+    def tokens_by_period(self, period: str = "week", repository: Optional[str] = None,
+                         since: Optional[str] = None) -> List[Tuple]:
+        """(period, repository, runs, prompt, completion, cached, total tokens), newest period first."""
+        column = PERIODS[period]
+        query = (f"SELECT {column} AS period, repository, COUNT(*), SUM(prompt_tokens), SUM(completion_tokens), "
+                 f"SUM(cached_tokens), SUM(total_tokens) FROM runs")
+        conditions, params = [], []
+        if since:
+            conditions.append("day >= ?")
+            params.append(since)
+        if repository:
+            conditions.append("repository = ?")
+            params.append(repository)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " GROUP BY period, repository ORDER BY period DESC, SUM(total_tokens) DESC"
+        with self._lock:
+            return self._db.execute(query, params).fetchall()
+
+    def top_files(self, metric: str = "bug_count", repository: Optional[str] = None,
+                  limit: int = 20) -> List[Tuple]:
+        """(repository, file, findings, total of metric) of the files ranked highest by the metric."""
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric '{metric}', expected one of {', '.join(METRICS)}")
+        query = f"SELECT repository, file, findings, {metric} FROM file_totals"
+        params = []
+        if repository:
+            query += " WHERE repository = ?"
+            params.append(repository)
+        query += f" ORDER BY {metric} DESC, file LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return self._db.execute(query, params).fetchall()
+
+    def close(self):
+        self._db.close()
+
+
+def default_history_path() -> Optional[str]:
+    """History file under CACHE_DIR, or None if local caching is disabled."""
+    return os.path.join(CACHE_DIR, "history.sqlite") if CACHE_DIR else None
@@ -0,0 +1,111 @@
+# review_output.py
+"""
+Formatting and posting of review results, shared by review.py and review-batch.py.
+"""
+import logging
+from typing import List, Optional, Tuple
+
+from comment_sync import CommentSync
+from models import CodeReview, LLMReviewResult
+from vcsp_interface import VCSPInterface
+
+
+def has_findings(review: CodeReview) -> bool:
+    """Return True if the review carries comments and at least one non-zero count."""
+    return bool(review.comments) and (review.bug_count != 0 or review.smell_count != 0 or
+                                      review.optimization_count != 0 or review.logical_errors != 0 or
+                                      review.performance_issues != 0)
+
+
+def format_review_summary(review_result: LLMReviewResult) -> str:
+    """Return the human-readable list of findings printed to the console."""
+    review_summary = ""
+    for review in review_result.reviews:
+        if has_findings(review):
+            review_summary += f"\n  File: {review.file}, Line: {review.line}"
+            review_summary += "    Comments: " + '\n'.join(str(comment) for comment in review.comments)
+            if review.bug_count != 0:
+                review_summary += f"    bugCount={review.bug_count},"
+            if review.smell_count != 0:
+                review_summary += f"    smellCount={review.smell_count},"
+            if review.optimization_count != 0:
+                review_summary += f"    optimizationCount={review.optimization_count},"
+            if review.logical_errors != 0:
+                review_summary += f"    logicalErrors={review.logical_errors}\n"
+            if review.performance_issues != 0:
+                review_summary += f"    performanceIssues={review.performance_issues},"
+    return review_summary
+
+
+def format_skipped_files(skipped_files: List[Tuple[str, str]]) -> str:
+    """Return the list of files left out of the review, with the reason for each."""
+    if not skipped_files:
+        return ""
+    return "Skipped files:\n" + "\n".join(f"  {filename} ({reason})" for filename, reason in skipped_files)
+
+
+def format_review_comment(review: CodeReview) -> str:
+    """Return the body of the inline PR comment posted for a review."""
+    lines = ["AI Comment:"] + review.comments
+
+    # add any non-zero counts
+    if review.bug_count:
+        lines.append(f"    bugCount={review.bug_count}")
+    if review.smell_count:
+        lines.append(f"    smellCount={review.smell_count}")
+    if review.optimization_count:
+        lines.append(f"    optimizationCount={review.optimization_count}")
+    if review.logical_errors:
+        lines.append(f"    logicalErrors={review.logical_errors}")
+    if review.performance_issues:
+        lines.append(f"    performanceIssues={review.performance_issues}")
+
+    return "\n".join(lines)
+
+
+def post_review_comments(
+        vcsp: VCSPInterface,
+        repository: str,
+        commit_sha: str,
+        review_result: LLMReviewResult,
+        overall_review: Optional[str] = None,
+        existing: Optional[CommentSync] = None
+) -> int:
+    """
+    Post the overall review (if given) and one inline comment per finding,
+    except for findings already posted as one of the existing AI comments.
+
+    Returns:
+        The number of inline comments posted successfully.
+    """
+    if overall_review:
+        vcsp.create_review_comment(
+            repo_name=repository,
+            comment=overall_review,
+            file_path="",
+            line=0,
+            commit=commit_sha,
+            side="RIGHT"
+        )
+    posted = 0
+    duplicates = 0
+    for review in review_result.reviews:
+        if has_findings(review) and existing and existing.is_posted(review):
+            duplicates += 1
+        elif has_findings(review):
+            try:
+                vcsp.create_review_comment(
+                    repo_name=repository,
+                    comment=format_review_comment(review),
+                    commit=commit_sha,
+                    file_path=review.file,
+                    line=review.line,
+                    side="RIGHT",
+                )
+                posted += 1
+                logging.info(f"Posted comment on {review.file} at line {review.line}")
+            except Exception as e:
+                logging.error(f"Error posting comment on {review.file}: {str(e)}")
+    if duplicates:
+        logging.info(f"Skipped {duplicates} finding(s) already posted as AI comments")
+    return posted
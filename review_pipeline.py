@@ -0,0 +1,291 @@
+# review_pipeline.py
+"""
+Pipelined batch review of many pull requests.
+
+Each PR flows through four stages (VCS fetch, prompt build, LLM call and
+comment posting). Every stage runs in its own worker threads and stages are
+connected by bounded queues, so fetching PR N+1 overlaps the LLM call for
+PR N while memory stays bounded by the queue sizes.
+
+With a budget ledger, each PR's estimate is checked after its prompt is built,
+counting the estimates of PRs still in flight, and the PR is downgraded
+(diffs only, no escalation) or deferred like a single review; its actual
+spend is recorded once reviewed.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from budget_ledger import BudgetLedger
+from file_filter import FileFilter
+from llm_code_reviewer import LLMCodeReviewer
+from llm_interface import LLMInterface
+from model_router import ModelRouter
+from comment_sync import CommentSync, resolve_outdated
+from review_output import has_findings, post_review_comments
+
+# Marks the end of the stream on a stage's input queue
+_DONE = object()
+
+# (name, function, worker count); the function processes one item in place
+Stage = Tuple[str, Callable[[Any], None], int]
+
+
+class PRJob:
+    """State of one pull request as it moves through the pipeline."""
+    def __init__(self, repository: str, pr_number: int):
+        self.repository = repository
+        self.pr_number = pr_number
+        self.vcsp = None
+        self.pr = None
+        self.files = None
+        self.plan = None
+        self.skipped = []  # (filename, reason) of files left out of the review
+        self.reviewed_files = set()
+        self.review_result = None
+        self.downgraded = False
+        self.reserved = 0  # estimated tokens held against the budgets until the review is recorded
+        self.posted = 0
+        self.resolved = 0
+        self.status = "pending"
+        self.error = None
+        self.failed_stage = None
+        self.timings = {}
+
+    def to_dict(self) -> dict:
+        """Outcome record, written as one JSONL line per PR."""
+        record = {
+            "repository": self.repository,
+            "pr_number": self.pr_number,
+            "status": self.status,
+            "findings": sum(1 for r in self.review_result.reviews if has_findings(r)) if self.review_result else 0,
+            "posted": self.posted,
+            "resolved": self.resolved,
+            "timings": {stage: round(seconds, 3) for stage, seconds in self.timings.items()},
+        }
+        if self.review_result:
+            record["totals"] = self.review_result.totals
+            record["reviews"] = [r.to_dict() for r in self.review_result.reviews if has_findings(r)]
+        if self.downgraded:
+            record["downgraded"] = True
+        if self.skipped:
+            record["skipped"] = [{"file": filename, "reason": reason} for filename, reason in self.skipped]
+        if self.error:
+            record["error"] = self.error
+            record["failed_stage"] = self.failed_stage
+        return record
+
+    def __repr__(self):
+        return f"<PRJob {self.repository}#{self.pr_number} {self.status}>"
+
+
+def run_pipeline(items: Iterable[Any], stages: List[Stage], queue_size: int = 2) -> Iterator[Any]:
+    """
+    Run items through the stages concurrently, yielding them as they complete.
+
+    Items whose ``error`` attribute is set by a stage are passed through the
+    remaining stages untouched, so every input item is yielded exactly once.
+    If iterating the items raises, the items fed so far are finished and the
+    error is then raised to the caller.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    feed_errors = []
+
+    def feed():
+        try:
+            for item in items:
+                queues[0].put(item)
+        except Exception as e:
+            feed_errors.append(e)
+        finally:
+            for _ in range(stages[0][2]):
+                queues[0].put(_DONE)
+
+    def work(index: int, remaining: list, lock: threading.Lock):
+        name, func, _ = stages[index]
+        inbox, outbox = queues[index], queues[index + 1]
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            if getattr(item, "error", None) is None:
+                started = time.monotonic()
+                try:
+                    func(item)
+                except Exception as e:
+                    logging.error(f"Pipeline stage '{name}' failed for {item}: {str(e)}")
+                    item.error = str(e)
+                    item.failed_stage = name
+                if hasattr(item, "timings"):
+                    item.timings[name] = time.monotonic() - started
+            outbox.put(item)
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            # the last worker of this stage closes the next stage's input
+            next_workers = stages[index + 1][2] if index + 1 < len(stages) else 1
+            for _ in range(next_workers):
+                outbox.put(_DONE)
+
+    threading.Thread(target=feed, name="pipeline-feed", daemon=True).start()
+    for index, (name, _, workers) in enumerate(stages):
+        remaining, lock = [workers], threading.Lock()
+        for n in range(workers):
+            threading.Thread(target=work, args=(index, remaining, lock),
+                             name=f"pipeline-{name}-{n}", daemon=True).start()
+
+    while True:
+        item = queues[-1].get()
+        if item is _DONE:
+            if feed_errors:
+                raise feed_errors[0]
+            return
+        yield item
+
+
+class BatchReviewer:
+    """Builds the fetch/build/LLM/post stages for reviewing many PRs with one LLM."""
+
+    def __init__(
+            self,
+            llm: LLMInterface,
+            vcsp_factory: Callable[[], Any],
+            full_context: bool = False,
+            deep: bool = False,
+            post_comments: bool = False,
+            overall_review: Optional[Callable[[Any], str]] = None,
+            finding_cache: bool = True,
+            router: Optional[ModelRouter] = None,
+            file_filter: Optional[FileFilter] = None,
+            resolve_outdated: bool = True,
+            ledger: Optional[BudgetLedger] = None,
+            model_label: Optional[str] = None
+    ):
+        self.llm = llm
+        # A fresh VCS client per PR: some backends keep per-PR state between calls
+        self.vcsp_factory = vcsp_factory
+        self.full_context = full_context
+        self.deep = deep
+        self.post_comments = post_comments
+        self.overall_review = overall_review
+        self.finding_cache = finding_cache
+        self.router = router
+        self.file_filter = file_filter
+        self.resolve_outdated = resolve_outdated
+        self.ledger = ledger
+        self.model_label = model_label or (router.model_name if router else llm.model_name)
+        # repository -> estimated tokens of reviews in flight, not yet in the ledger
+        self._reserved = defaultdict(int)
+        self._budget_lock = threading.Lock()
+
+    def _reviewer(self, job: PRJob) -> LLMCodeReviewer:
+        # a downgraded PR skips the shared router: cheap model only, no escalation
+        router = None if job.downgraded else self.router
+        llm = self.router.cheap if self.router and job.downgraded else self.llm
+        return LLMCodeReviewer(llm=llm, vcsp=job.vcsp, full_context=self.full_context, deep=self.deep,
+                               finding_cache=self.finding_cache, router=router, file_filter=self.file_filter)
+
+    def _reserve(self, job: PRJob, tokens: int) -> Optional[str]:
+        """Hold tokens for the job if they fit the budgets; otherwise return why not."""
+        with self._budget_lock:
+            over_budget = self.ledger.over_budget(job.repository, tokens, self._reserved)
+            if not over_budget:
+                self._reserved[job.repository] += tokens
+                job.reserved = tokens
+            return over_budget
+
+    def _release(self, job: PRJob):
+        with self._budget_lock:
+            self._reserved[job.repository] -= job.reserved
+            job.reserved = 0
+
+    def _check_budget(self, job: PRJob, reviewer: LLMCodeReviewer):
+        """Downgrade or defer the job if its estimate does not fit the budgets (as review.py does)."""
+        estimate = reviewer.estimate(job.plan)
+        if not estimate.total_tokens:
+            return
+        over_budget = self._reserve(job, estimate.total_tokens)
+        if over_budget and (job.plan.full_context or self.router):
+            logging.warning(f"{job.repository}#{job.pr_number} would exceed the {over_budget}; downgrading it.")
+            job.downgraded = True
+            reviewer = self._reviewer(job)
+            if job.plan.full_context:
+                job.plan = reviewer.build_plan(job.pr, job.repository, job.files, False)
+                if job.plan is None:
+                    job.status = "no_changes"
+                    return
+            over_budget = self._reserve(job, reviewer.estimate(job.plan).total_tokens)
+        if over_budget:
+            logging.warning(f"Deferring {job.repository}#{job.pr_number}: it would exceed the {over_budget}.")
+            job.plan = None
+            job.status = "deferred"
+
+    def fetch(self, job: PRJob):
+        job.vcsp = self.vcsp_factory()
+        job.pr = job.vcsp.get_pull_request(job.repository, job.pr_number)
+        job.files = list(job.vcsp.get_files_in_pr(job.repository, job.pr_number))
+
+    def build(self, job: PRJob):
+        reviewer = self._reviewer(job)
+        job.plan = reviewer.build_plan(job.pr, job.repository, job.files, self.full_context)
+        job.skipped = reviewer.skipped_files
+        if job.plan is None:
+            job.status = "no_changes"
+        elif self.ledger:
+            self._check_budget(job, reviewer)
+
+    def review(self, job: PRJob):
+        if job.plan is None:
+            return
+        reviewer = self._reviewer(job)
+        try:
+            job.review_result = reviewer.review_plan(job.pr, job.repository, job.files, job.plan)
+        finally:
+            if self.ledger:
+                if job.review_result:
+                    totals = job.review_result.totals
+                    self.ledger.record(job.repository, job.pr_number, self.model_label, totals["prompt_tokens"],
+                                       totals["completion_tokens"], totals["total_tokens"])
+                self._release(job)
+        job.reviewed_files = reviewer.reviewed_files
+        job.plan = None  # release the prompt as soon as it has been sent
+        if job.review_result is None:
+            raise Exception("LLM returned no parsable review")
+        job.status = "reviewed"
+
+    def post(self, job: PRJob):
+        if not self.post_comments or not job.review_result:
+            return
+        if job.pr.state.lower() != "open":
+            logging.info(f"{job.repository}#{job.pr_number} is closed, no comments posted.")
+            return
+        existing = CommentSync.fetch(job.vcsp, job.repository, job.pr_number, job.files, job.reviewed_files)
+        if job.review_result.reviews:
+            head_commit = job.vcsp.get_commit(job.repository, job.pr.head_sha)
+            overall = self.overall_review(job.review_result) if self.overall_review else None
+            job.posted = post_review_comments(job.vcsp, job.repository, head_commit.sha, job.review_result, overall,
+                                              existing)
+        if existing and self.resolve_outdated:
+            job.resolved = resolve_outdated(job.vcsp, job.repository, job.pr_number, existing,
+                                            job.review_result.reviews)
+
+    def stages(self, fetch_workers: int = 2, llm_workers: int = 4, post_workers: int = 1) -> List[Stage]:
+        return [
+            ("fetch", self.fetch, fetch_workers),
+            ("build", self.build, fetch_workers),
+            ("llm", self.review, llm_workers),
+            ("post", self.post, post_workers),
+        ]
+
+    def run(self, jobs: Iterable[PRJob], queue_size: int = 2, **workers) -> Iterator[PRJob]:
+        """Review the jobs, yielding each one as soon as it has been posted (or failed)."""
+        for job in run_pipeline(jobs, self.stages(**workers), queue_size=queue_size):
+            if job.error:
+                job.status = "error"
+            job.vcsp = None
+            job.files = None
+            yield job
@@ -0,0 +1,277 @@
+# symbol_index.py
+"""
+Persistent index of symbol definitions in a local clone, for cross-file review context.
+
+Python files are parsed with ``ast``; other languages are scanned ctags-style
+with per-language definition patterns and brace matching. Each definition is
+stored with its signature and a bounded excerpt of its body in SQLite, and the
+index is updated incrementally: only files whose size or modification time
+changed since the last run are parsed again.
+
+For a hunk, the identifiers it calls or instantiates are looked up by name
+(an indexed query) and the definitions found in other files are added to the
+prompt up to a character budget.
+"""
+import ast
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from config import CACHE_DIR, MAX_SYMBOL_LINES, SYMBOL_CONTEXT_CHARS
+from diff_hunks import Hunk
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS symbols (
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    line INTEGER NOT NULL,
+    source TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS symbols_name ON symbols (name);
+CREATE INDEX IF NOT EXISTS symbols_path ON symbols (path);
+"""
+
+SKIP_DIRECTORIES = {".git", ".hg", ".svn", "node_modules", "vendor", "third_party", "venv", ".venv", "env",
+                    "__pycache__", "dist", "build", "target", ".tox", ".mypy_cache", ".idea", ".vscode"}
+MAX_FILE_BYTES = 1024 * 1024
+
+# Definition patterns per file suffix for the ctags-style scanner; group 1 is the name
+_BRACE_PATTERNS = {
+    (".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs"): [
+        (r'^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*([A-Za-z_$][\w$]*)', "function"),
+        (r'^\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+([A-Za-z_$][\w$]*)', "class"),
+        (r'^\s*(?:export\s+)?(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:async\s+)?(?:\([^)]*\)|[\w$]+)\s*=>',
+         "function"),
+        (r'^\s*(?:export\s+)?(?:interface|type|enum)\s+([A-Za-z_$][\w$]*)', "type"),
+    ],
+    (".go",): [
+        (r'^func\s+(?:\([^)]*\)\s*)?([A-Za-z_]\w*)', "function"),
+        (r'^type\s+([A-Za-z_]\w*)', "type"),
+    ],
+    (".java", ".kt", ".cs", ".scala"): [
+        (r'^\s*(?:[\w@]+\s+)*(?:class|interface|enum|record|object)\s+([A-Za-z_]\w*)', "class"),
+        (r'^\s*(?:(?:public|private|protected|internal|static|final|abstract|override|suspend|async|virtual)\s+)+'
+         r'(?:fun\s+)?[\w<>\[\],.? ]*?\b([A-Za-z_]\w*)\s*\([^;]*$', "function"),
+    ],
+    (".rs",): [
+        (r'^\s*(?:pub(?:\([^)]*\))?\s+)?(?:async\s+)?(?:unsafe\s+)?fn\s+([A-Za-z_]\w*)', "function"),
+        (r'^\s*(?:pub(?:\([^)]*\))?\s+)?(?:struct|enum|trait|type)\s+([A-Za-z_]\w*)', "type"),
+    ],
+    (".c", ".h", ".cc", ".cpp", ".hpp", ".cxx"): [
+        (r'^(?:[A-Za-z_][\w\s\*&:<>,]*?[\s\*&])([A-Za-z_]\w*)\s*\([^;]*$', "function"),
+        (r'^\s*(?:typedef\s+)?(?:struct|class|enum|union)\s+([A-Za-z_]\w*)\s*[{:]?\s*$', "type"),
+    ],
+}
+_INDENT_PATTERNS = {
+    (".rb",): [
+        (r'^\s*def\s+(?:self\.)?([A-Za-z_]\w*[?!]?)', "function"),
+        (r'^\s*(?:class|module)\s+([A-Z]\w*)', "class"),
+    ],
+}
+_COMPILED = {suffixes: [(re.compile(pattern), kind) for pattern, kind in patterns]
+             for suffixes, patterns in {**_BRACE_PATTERNS, **_INDENT_PATTERNS}.items()}
+INDEXED_SUFFIXES = (".py",) + tuple(suffix for suffixes in _COMPILED for suffix in suffixes)
+
+IDENTIFIER = re.compile(r'\b([A-Za-z_]\w*)\s*\(|\b([A-Z]\w*[a-z]\w*)\b')
+# A name defined in more places than this is too ambiguous to pick a definition
+MAX_DEFINITIONS = 3
+MIN_NAME_LENGTH = 3
+KEYWORDS = {"if", "for", "while", "switch", "return", "print", "len", "str", "int", "dict", "list", "set",
+            "tuple", "super", "isinstance", "range", "sizeof", "catch", "function", "typeof", "new", "await"}
+
+
+def _excerpt(lines: List[str], start: int, end: int) -> str:
+    """Lines start..end (1-based, inclusive), at most MAX_SYMBOL_LINES of them."""
+    end = min(end, start + MAX_SYMBOL_LINES - 1)
+    excerpt = "\n".join(lines[start - 1:end])
+    if end < len(lines) and end == start + MAX_SYMBOL_LINES - 1:
+        excerpt += "\n    ..."
+    return excerpt
+
+
+def python_symbols(text: str) -> List[Tuple[str, str, int, str]]:
+    """(name, kind, line, source excerpt) of the functions, classes and methods in Python source."""
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return []
+    lines = text.splitlines()
+    symbols = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            start = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+            kind = "class" if isinstance(node, ast.ClassDef) else "function"
+            symbols.append((node.name, kind, node.lineno, _excerpt(lines, start, node.end_lineno or node.lineno)))
+    return symbols
+
+
+def _brace_end(lines: List[str], start: int) -> int:
+    """Last line (1-based) of the block opened at or after line start, by brace matching."""
+    depth = 0
+    opened = False
+    for index in range(start - 1, min(len(lines), start - 1 + MAX_SYMBOL_LINES * 4)):
+        for char in lines[index]:
+            if char == "{":
+                depth += 1
+                opened = True
+            elif char == "}":
+                depth -= 1
+        if opened and depth <= 0:
+            return index + 1
+        if not opened and lines[index].rstrip().endswith(";"):
+            return index + 1  # a declaration without a body
+    return start
+
+
+def _indent_end(lines: List[str], start: int) -> int:
+    """Last line of the block starting at line start, ended by an "end" at the same indentation."""
+    indent = len(lines[start - 1]) - len(lines[start - 1].lstrip())
+    for index in range(start, len(lines)):
+        line = lines[index]
+        if line.strip() and len(line) - len(line.lstrip()) <= indent:
+            return index + 1 if line.strip() == "end" else index
+    return len(lines)
+
+
+def scanned_symbols(path: str, text: str) -> List[Tuple[str, str, int, str]]:
+    """ctags-style definitions found by the patterns of the file's language."""
+    suffixes = next((suffixes for suffixes in _COMPILED if path.lower().endswith(suffixes)), None)
+    if suffixes is None:
+        return []
+    find_end = _indent_end if suffixes in _INDENT_PATTERNS else _brace_end
+    lines = text.splitlines()
+    symbols = []
+    for number, line in enumerate(lines, 1):
+        for pattern, kind in _COMPILED[suffixes]:
+            match = pattern.match(line)
+            if match and match.group(1) not in KEYWORDS:
+                symbols.append((match.group(1), kind, number, _excerpt(lines, number, find_end(lines, number))))
+                break
+    return symbols
+
+
+def referenced_names(hunk: Hunk) -> List[str]:
+    """Names the hunk calls or uses as types, from its added lines first, in order of appearance."""
+    added = [line[1:] for line in hunk.lines if line.startswith('+')]
+    context = [line[1:] for line in hunk.lines if line.startswith(' ')]
+    names = []
+    for text in added + context:
+        for match in IDENTIFIER.finditer(text):
+            name = match.group(1) or match.group(2)
+            if len(name) >= MIN_NAME_LENGTH and name not in KEYWORDS and not name.startswith("__") \
+                    and name not in names:
+                names.append(name)
+    return names
+
+
+class SymbolIndex:
+    """Symbol definitions of a local clone, kept in SQLite and refreshed incrementally."""
+
+    def __init__(self, root: str, path: Optional[str] = None):
+        self.root = os.path.abspath(root)
+        if path is None:
+            path = default_index_path(self.root)
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._db:
+            self._db.executescript(SCHEMA)
+
+    def _walk(self) -> Iterable[Tuple[str, os.stat_result]]:
+        for directory, subdirectories, filenames in os.walk(self.root):
+            subdirectories[:] = [name for name in subdirectories if name not in SKIP_DIRECTORIES]
+            for filename in filenames:
+                if filename.lower().endswith(INDEXED_SUFFIXES):
+                    full_path = os.path.join(directory, filename)
+                    try:
+                        stat = os.stat(full_path)
+                    except OSError:
+                        continue
+                    if stat.st_size <= MAX_FILE_BYTES:
+                        yield os.path.relpath(full_path, self.root).replace(os.sep, "/"), stat
+
+    def update(self) -> int:
+        """Re-index files added or changed since the last update and drop deleted ones; returns files parsed."""
+        started = time.monotonic()
+        with self._lock:
+            known = {path: (mtime_ns, size) for path, mtime_ns, size in
+                     self._db.execute("SELECT path, mtime_ns, size FROM files")}
+        seen = set()
+        parsed = 0
+        with self._lock, self._db:
+            for path, stat in self._walk():
+                seen.add(path)
+                if known.get(path) == (stat.st_mtime_ns, stat.st_size):
+                    continue
+                try:
+                    with open(os.path.join(self.root, path), encoding="utf-8", errors="replace") as f:
+                        text = f.read()
+                except OSError:
+                    continue
+                symbols = python_symbols(text) if path.endswith(".py") else scanned_symbols(path, text)
+                self._db.execute("DELETE FROM symbols WHERE path = ?", (path,))
+                self._db.executemany("INSERT INTO symbols VALUES (?, ?, ?, ?, ?)",
+                                     [(name, path, kind, line, source) for name, kind, line, source in symbols])
+                self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)",
+                                 (path, stat.st_mtime_ns, stat.st_size))
+                parsed += 1
+            for path in set(known) - seen:
+                self._db.execute("DELETE FROM symbols WHERE path = ?", (path,))
+                self._db.execute("DELETE FROM files WHERE path = ?", (path,))
+        logging.info(f"Symbol index of {self.root}: {parsed} file(s) parsed, {len(set(known) - seen)} removed "
+                     f"in {time.monotonic() - started:.2f}s")
+        return parsed
+
+    def definitions(self, name: str) -> List[Tuple[str, str, int, str]]:
+        """(path, kind, line, source) of every definition of the name."""
+        with self._lock:
+            return self._db.execute("SELECT path, kind, line, source FROM symbols WHERE name = ? "
+                                    "ORDER BY path, line", (name,)).fetchall()
+
+    def context_for(self, filename: str, hunks: List[Hunk], max_chars: int = SYMBOL_CONTEXT_CHARS) -> str:
+        """
+        Definitions from other files of the names the hunks reference, as prompt
+        text of at most max_chars; an empty string if there are none.
+        """
+        names = []
+        for hunk in hunks:
+            names.extend(name for name in referenced_names(hunk) if name not in names)
+        parts = []
+        size = 0
+        for name in names:
+            definitions = self.definitions(name)
+            if not definitions or len(definitions) > MAX_DEFINITIONS or \
+                    any(path == filename for path, _, _, _ in definitions):
+                continue  # unknown, ambiguous, or already visible in the changed file
+            for path, kind, line, source in definitions:
+                part = f"{path}:{line} ({kind} {name})\n{source}"
+                if size + len(part) > max_chars:
+                    continue
+                parts.append(part)
+                size += len(part)
+        if not parts:
+            return ""
+        return "Definitions referenced by the change (from other files):\n" + "\n\n".join(parts)
+
+    def close(self):
+        self._db.close()
+
+
+def default_index_path(root: str) -> str:
+    """Index file of a clone under CACHE_DIR, or in memory if local caching is disabled."""
+    if not CACHE_DIR:
+        return ":memory:"
+    digest = hashlib.sha256(os.path.abspath(root).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(CACHE_DIR, "symbols", f"{digest}.sqlite")
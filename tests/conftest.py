@@ -0,0 +1,23 @@
+import pytest
+
+import blob_cache
+import circuit_breaker
+import cost_planner
+import http_cache
+import latency
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path, monkeypatch):
+    """Keep every test's local caches (and circuit breakers) to itself."""
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr(blob_cache, "CACHE_DIR", str(cache_dir))
+    monkeypatch.setattr(blob_cache, "_default_caches", {})
+    monkeypatch.setattr(latency, "CACHE_DIR", str(cache_dir))
+    monkeypatch.setattr(latency, "_default_stats", None)
+    monkeypatch.setattr(http_cache, "CACHE_DIR", str(cache_dir))
+    monkeypatch.setattr(http_cache, "_default_cache", None)
+    monkeypatch.setattr(circuit_breaker, "_breakers", {})
+    monkeypatch.setattr(cost_planner, "CACHE_DIR", str(cache_dir))
+    monkeypatch.setattr(cost_planner, "_default_estimator", None)
+    return cache_dir
@@ -0,0 +1,77 @@
+from unittest.mock import MagicMock, Mock
+
+import pytest
+
+from bitbucket_vcsp import AI_COMMENT_QUERY, BitbucketVCSP
+
+API = "https://api.bitbucket.org/2.0/repositories/team/repo"
+
+RANGE_DIFF = """diff --git a/app.py b/app.py
+--- a/app.py
++++ b/app.py
+@@ -1,2 +1,3 @@
+ a = 1
++b = 2
+ c = 3"""
+
+
+@pytest.fixture
+def vcsp(monkeypatch, mocker):
+    monkeypatch.setenv("BITBUCKET_USERNAME", "user")
+    monkeypatch.setenv("BITBUCKET_APP_PASSWORD", "secret")
+    monkeypatch.setenv("BITBUCKET_WORKSPACE", "team")
+    mocker.patch("bitbucket_vcsp.Bitbucket")
+    return BitbucketVCSP()
+
+
+def respond(routes):
+    """A Session.get replacement answering by URL (and page number), recording every call."""
+    def get(url, params=None, **kwargs):
+        body = routes[(url, (params or {}).get("page"))]
+        response = MagicMock()
+        response.__enter__.return_value = response
+        if isinstance(body, str):
+            # diffs are streamed in chunks that do not end at line boundaries
+            data = body.encode("utf-8")
+            response.iter_content.return_value = [data[i:i + 7] for i in range(0, len(data), 7)]
+        else:
+            response.json.return_value = body
+        return response
+    return Mock(side_effect=get)
+
+
+def test_incremental_review_fetches_one_range_diff(vcsp, mocker):
+    commits = [{"hash": "c3" * 20, "date": "2025-03-03T00:00:00+00:00"},
+               {"hash": "c2" * 20, "date": "2025-03-02T00:00:00+00:00"},
+               {"hash": "c1" * 20, "date": "2025-02-27T00:00:00+00:00"}]
+    get = mocker.patch.object(vcsp.session, "get", side_effect=respond({
+        (f"{API}/pullrequests/5/comments", None): {"values": [
+            {"id": 9, "content": {"raw": "AI Comment:\nBug"}, "inline": {"path": "app.py", "to": 2},
+             "created_on": "2025-03-01T00:00:00+00:00"}]},
+        # the second page of commits is never needed
+        (f"{API}/pullrequests/5/commits", None): {"values": commits, "next": f"{API}/pullrequests/5/commits?p=2"},
+        (f"{API}/diff/{'c3' * 20}..{'c1' * 20}", None): RANGE_DIFF,
+    }).side_effect)
+
+    files = vcsp.get_files_in_pr("repo", 5)
+
+    assert [(file.filename, file.lines) for file in files] == [("app.py", {2})]
+    assert get.call_count == 3
+    assert get.call_args_list[0].kwargs["params"] == {"q": AI_COMMENT_QUERY, "sort": "-created_on", "pagelen": 100}
+    # the comment listing is cached for the dedupe of posted findings
+    assert [comment.id for comment in vcsp.get_ai_comments("repo", 5)] == [9]
+    assert get.call_count == 3
+
+
+def test_numbered_pages_are_fetched_concurrently(vcsp, mocker):
+    url = f"{API}/pullrequests"
+    get = mocker.patch.object(vcsp.session, "get", side_effect=respond({
+        (url, None): {"values": [{"id": n} for n in range(1, 51)], "size": 120, "page": 1, "pagelen": 50,
+                      "next": f"{url}?page=2"},
+        (url, 2): {"values": [{"id": n} for n in range(51, 101)], "page": 2},
+        (url, 3): {"values": [{"id": n} for n in range(101, 121)], "page": 3},
+    }).side_effect)
+
+    assert vcsp.get_open_pull_requests("repo") == list(range(1, 121))
+    assert sorted(call.kwargs["params"].get("page", 1) for call in get.call_args_list) == [1, 2, 3]
+    assert all(call.kwargs["params"]["state"] == "OPEN" for call in get.call_args_list)
@@ -0,0 +1,84 @@
+import os
+from unittest.mock import Mock
+
+import pytest
+
+from blob_cache import BlobCache, content_keys, default_blob_cache
+from github_vcsp import GithubVCSP
+
+HEAD_SHA = "0123456789abcdef0123456789abcdef01234567"
+
+
+def test_content_keys_only_cache_immutable_refs():
+    assert content_keys("github", "user/repo", "a.py", "main") == []
+    assert content_keys("github", "user/repo", "a.py", HEAD_SHA, "b10b") == [
+        f"github:user/repo:ref:{HEAD_SHA}:a.py",
+        "github:user/repo:blob:b10b",
+    ]
+
+
+def test_get_put_and_persistence(tmp_path):
+    cache = BlobCache(str(tmp_path), max_bytes=1024)
+    assert cache.get("k") is None
+    cache.put("k", "print('hi')\n")
+    assert cache.get("k") == "print('hi')\n"
+    # a new instance (new process) sees the same entries
+    assert BlobCache(str(tmp_path), max_bytes=1024).get("k") == "print('hi')\n"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_line_endings_survive_the_round_trip(tmp_path):
+    cache = BlobCache(str(tmp_path))
+    cache.put("k", "a\r\nb\rc\n")
+    assert cache.get("k") == "a\r\nb\rc\n"
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = BlobCache(str(tmp_path), max_bytes=25)
+    cache.put("a", "a" * 10)
+    cache.put("b", "b" * 10)
+    assert cache.get("a") is not None  # "b" is now least recently used
+    cache.put("c", "c" * 10)
+    assert cache.get("b") is None
+    assert cache.get("a") == "a" * 10
+    assert cache.get("c") == "c" * 10
+    stored = sum(len(files) for _, _, files in os.walk(tmp_path))
+    assert stored == 2
+
+
+def test_default_cache_disabled_without_cache_dir(monkeypatch):
+    import blob_cache
+    monkeypatch.setattr(blob_cache, "CACHE_DIR", "")
+    assert default_blob_cache() is None
+
+
+@pytest.fixture
+def mock_github(mocker, monkeypatch):
+    monkeypatch.setenv("GITHUB_TOKEN", "fake_token")
+    mock_client = Mock()
+    mocker.patch("github_vcsp.Github", return_value=mock_client)
+    return mock_client
+
+
+def test_github_file_content_served_from_cache_by_blob_sha(mock_github):
+    mock_repo = Mock()
+    mock_pr = Mock()
+    mock_pr.head.sha = HEAD_SHA
+    mock_file = Mock(filename="util.py", patch="@@ -1 +1 @@\n-a\n+b", status="modified", sha="b10b5ha")
+    mock_pr.get_files.return_value = [mock_file]
+    mock_repo.get_pull.return_value = mock_pr
+    mock_repo.get_contents.return_value = Mock(decoded_content=b"b\n")
+    mock_github.get_repo.return_value = mock_repo
+
+    vcsp = GithubVCSP()
+    vcsp.get_files_in_pr("user/repo", 1)
+    assert vcsp.get_file_content("user/repo", "util.py", HEAD_SHA) == "b\n"
+    assert vcsp.get_file_content("user/repo", "util.py", HEAD_SHA) == "b\n"
+    assert mock_repo.get_contents.call_count == 1
+
+    # another PR whose head contains the same blob needs no download either
+    other = GithubVCSP()
+    mock_pr.head.sha = "f" * 40
+    other.get_files_in_pr("user/repo", 2)
+    assert other.get_file_content("user/repo", "util.py", "f" * 40) == "b\n"
+    assert mock_repo.get_contents.call_count == 1
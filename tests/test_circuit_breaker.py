@@ -0,0 +1,124 @@
+import time
+from unittest.mock import Mock
+
+import pytest
+import requests
+from github import GithubException
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, BreakerLLM, BreakerVCSP, CircuitBreaker, CircuitOpenError, \
+    FailoverLLM
+from llm_interface import LLMInterface, ModelResult
+from vcsp_interface import VCSPInterface
+
+RESULT = ModelResult(response="[]", total_tokens=1, prompt_tokens=1, completion_tokens=0)
+
+
+def make_llm(name, result=RESULT):
+    llm = Mock(spec=LLMInterface)
+    llm.model_name = name
+    llm.answer.return_value = result
+    return llm
+
+
+def test_opens_after_error_rate_and_recovers_through_probe():
+    breaker = CircuitBreaker("b", window=4, min_calls=4, error_rate=0.5, reset_seconds=0.05)
+    for success in (True, False, True):
+        breaker.record(success)
+    assert breaker.state == CLOSED
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # a single probe at a time
+    breaker.record(True)
+    assert breaker.state == CLOSED
+
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker("b", min_calls=2, error_rate=1.0, slow_call_seconds=1.0)
+    breaker.record(True, 5.0)
+    breaker.record(True, 5.0)
+    assert breaker.state == OPEN
+
+
+def test_failover_skips_backend_with_open_breaker():
+    down = make_llm("down", result=None)
+    up = make_llm("up")
+    llm = FailoverLLM([BreakerLLM(down, CircuitBreaker("down", min_calls=2, reset_seconds=60)), up])
+
+    for _ in range(3):
+        assert llm.answer("s", "", "c") is RESULT
+    # the breaker opened after two failures; the third prompt went straight to the healthy backend
+    assert down.answer.call_count == 2
+    assert up.answer.call_count == 3
+
+
+def test_vcsp_breaker_fails_fast_but_ignores_bad_input():
+    backend = Mock(spec=VCSPInterface)
+    backend.get_file_content.side_effect = ValueError("binary")
+    backend.get_pull_request.side_effect = requests.ConnectionError("503")
+    vcsp = BreakerVCSP(backend, CircuitBreaker("vcsp", min_calls=2, reset_seconds=60))
+
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            vcsp.get_file_content("r", "f", ref="sha")
+    assert vcsp.breaker.state == CLOSED
+    for _ in range(2):
+        with pytest.raises(Exception, match="503"):
+            vcsp.get_pull_request("r", 1)
+    with pytest.raises(CircuitOpenError):
+        vcsp.get_pull_request("r", 1)
+    assert backend.get_pull_request.call_count == 2
+
+
+def test_vcsp_without_pr_listing_still_instantiates():
+    class SinglePRVCSP(VCSPInterface):
+        get_pull_request = get_files_in_pr = get_file_content = create_review_comment = get_commit = Mock()
+
+    vcsp = BreakerVCSP(SinglePRVCSP(), CircuitBreaker("vcsp", min_calls=1, reset_seconds=60))
+    for _ in range(2):
+        with pytest.raises(NotImplementedError):
+            vcsp.get_open_pull_requests("r")
+    assert vcsp.breaker.state == CLOSED
+
+
+def wrapped(error: Exception) -> Exception:
+    """error wrapped like the providers do."""
+    try:
+        raise error
+    except Exception as e:
+        try:
+            raise Exception(f"Failed to get GitHub PR: {str(e)}")
+        except Exception as outer:
+            return outer
+
+
+def test_vcsp_breaker_counts_only_outages():
+    backend = Mock(spec=VCSPInterface)
+    vcsp = BreakerVCSP(backend, CircuitBreaker("vcsp", min_calls=2, reset_seconds=60))
+
+    errors = [FileNotFoundError(".gitattributes"), wrapped(GithubException(404, {"message": "Not Found"})),
+              wrapped(GithubException(403, {"message": "Forbidden"})), Exception("No pull request found")]
+    for error in errors:
+        backend.get_pull_request.side_effect = error
+        with pytest.raises(type(error)):
+            vcsp.get_pull_request("r", 1)
+    assert vcsp.breaker.state == CLOSED
+
+    for error in (wrapped(GithubException(502, {"message": "Bad Gateway"})), wrapped(requests.Timeout("slow"))):
+        backend.get_pull_request.side_effect = error
+        with pytest.raises(Exception):
+            vcsp.get_pull_request("r", 1)
+    assert vcsp.breaker.state == OPEN
+
+
+def test_rate_limited_answers_count_as_outages():
+    from circuit_breaker import is_outage
+    response = requests.Response()
+    response.status_code = 429
+    assert is_outage(requests.HTTPError(response=response))
+    response.status_code = 404
+    assert not is_outage(requests.HTTPError(response=response))
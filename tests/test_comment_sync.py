@@ -0,0 +1,62 @@
+from unittest.mock import Mock
+
+from comment_sync import CommentSync, normalize_text, resolve_outdated
+from models import CodeReview, LLMReviewResult
+from review_output import format_review_comment, post_review_comments
+from vcsp_interface import PRFile, ReviewComment
+
+PATCH = """--- a/app.py
++++ b/app.py
+@@ -10,3 +10,4 @@ def load():
+ data = read()
++total = sum(data) / len(data)
+ return data
+@@ -40,2 +41,3 @@ def save():
+ path = target()
++open(path, "w").write(data)"""
+
+# the same change after an unrelated edit above it moved it down 5 lines
+MOVED_PATCH = PATCH.replace("@@ -10,3 +10,4 @@", "@@ -15,3 +15,4 @@").replace("@@ -40,2 +41,3 @@",
+                                                                               "@@ -45,2 +46,3 @@")
+
+
+def review(line, text, bugs=1):
+    return CodeReview(file="app.py", line=line, comments=[text], bug_count=bugs, smell_count=0,
+                      optimization_count=0, logical_errors=0, performance_issues=0)
+
+
+def test_normalize_text_ignores_marker_counts_case_and_punctuation():
+    posted = format_review_comment(review(11, "Division by zero when `data` is empty!", bugs=2))
+    assert normalize_text(posted) == normalize_text("division by zero when data is empty")
+
+
+def test_findings_already_commented_are_not_posted_again():
+    # the provider tracked the comments as the change moved down 5 lines
+    existing = [ReviewComment("c1", "app.py", 16, format_review_comment(review(11, "Division by zero if empty."))),
+                ReviewComment("c2", "app.py", 47, format_review_comment(review(42, "File is never closed")),
+                              resolved=True)]
+    sync = CommentSync(existing, [PRFile("app.py", MOVED_PATCH)], {"app.py"})
+    vcsp = Mock()
+    result = LLMReviewResult(reviews=[review(16, "division by zero if empty", bugs=2),
+                                      review(47, "File is never closed."),
+                                      review(46, "Data is written without encoding")],
+                             total_tokens=0, prompt_tokens=0, completion_tokens=0)
+
+    # the resolved c2 is not reposted either
+    assert post_review_comments(vcsp, "org/app", "sha", result, existing=sync) == 1
+    assert vcsp.create_review_comment.call_args.kwargs["comment"].startswith(
+        "AI Comment:\nData is written without encoding")
+
+
+def test_comments_whose_finding_disappeared_are_resolved():
+    comments = [ReviewComment("c1", "app.py", 11, format_review_comment(review(11, "Division by zero"))),
+                ReviewComment("c2", "app.py", 42, format_review_comment(review(42, "File is never closed"))),
+                ReviewComment("c3", "app.py", None, format_review_comment(review(3, "Outdated finding"))),
+                ReviewComment("c4", "app.py", 25, format_review_comment(review(25, "Outside the new diff"))),
+                ReviewComment("c5", "lib.py", 11, format_review_comment(review(11, "File not reviewed"))),
+                ReviewComment("c6", "app.py", 11, format_review_comment(review(11, "Fixed")), resolved=True)]
+    sync = CommentSync(comments, [PRFile("app.py", PATCH), PRFile("lib.py", PATCH)], {"app.py"})
+    vcsp = Mock()
+
+    assert resolve_outdated(vcsp, "org/app", 7, sync, [review(11, "Division by zero.")]) == 2
+    assert [call.args[2].id for call in vcsp.resolve_comment.call_args_list] == ["c2", "c3"]
@@ -0,0 +1,67 @@
+from unittest.mock import Mock
+
+from budget_ledger import BudgetLedger
+from cost_planner import TokenEstimator, model_price
+from llm_code_reviewer import LLMCodeReviewer
+from llm_interface import LLMInterface, ModelResult
+from vcsp_interface import PR, PRFile
+
+
+def test_estimator_calibrates_per_model(tmp_path):
+    path = str(tmp_path / "tokens.json")
+    estimator = TokenEstimator(path)
+    assert estimator.prompt_tokens("m", 400) == 100  # default of 4 characters per token
+    estimator.observe("m", prompt_chars=1000, prompt_tokens=500, completion_tokens=40)
+    estimator.save()
+
+    reloaded = TokenEstimator(path)
+    assert reloaded.prompt_tokens("m", 400) == 200
+    assert reloaded.completion_tokens("m") == 40
+    assert reloaded.prompt_tokens("other", 400) == 100
+
+
+def test_model_price_ignores_provider_prefix():
+    assert model_price("models/gemini-2.0-flash") == model_price("gemini-2.0-flash")
+    assert model_price("unknown-model") is None
+
+
+def test_estimate_does_not_call_the_llm():
+    llm = Mock(spec=LLMInterface)
+    llm.model_name = "gpt-4o-mini"
+    vcsp = Mock()
+    vcsp.get_files_in_pr.return_value = [PRFile("a.py", "--- a/a.py\n+++ b/a.py\n@@ -1,1 +1,2 @@\n x\n+y")]
+    reviewer = LLMCodeReviewer(llm=llm, vcsp=vcsp, finding_cache=False)
+    pr_files, plan = reviewer.plan_pr(PR("t", "b", "sha", "open"), "user/repo", 1)
+    estimate = reviewer.estimate(plan)
+
+    llm.answer.assert_not_called()
+    assert len(estimate.shards) == 1
+    assert estimate.shards[0].files == ["a.py"]
+    assert estimate.total_tokens > 0
+    assert estimate.cost > 0
+    assert "Shard 1 (gpt-4o-mini)" in estimate.format()
+
+
+def test_estimator_learns_from_reviews():
+    llm = Mock(spec=LLMInterface)
+    llm.model_name = "m"
+    llm.answer.return_value = ModelResult(response="[]", total_tokens=1100, prompt_tokens=1000,
+                                          completion_tokens=100)
+    vcsp = Mock()
+    vcsp.get_files_in_pr.return_value = [PRFile("a.py", "--- a/a.py\n+++ b/a.py\n@@ -1,1 +1,2 @@\n x\n+y")]
+    reviewer = LLMCodeReviewer(llm=llm, vcsp=vcsp, finding_cache=False)
+    pr_files, plan = reviewer.plan_pr(PR("t", "b", "sha", "open"), "user/repo", 1)
+    reviewer.review_plan(PR("t", "b", "sha", "open"), "user/repo", pr_files, plan)
+    assert reviewer.estimate(plan).shards[0].prompt_tokens == 1000
+
+
+def test_ledger_enforces_daily_and_repo_budgets(tmp_path):
+    ledger = BudgetLedger(str(tmp_path / "ledger.sqlite"), daily_tokens=1000, repo_daily_tokens=500)
+    ledger.record("a/repo", 1, "m", 300, 100, 400)
+    assert ledger.over_budget("a/repo", 50) is None
+    assert "a/repo" in ledger.over_budget("a/repo", 200)
+    assert ledger.over_budget("b/repo", 500) is None
+    ledger.record("b/repo", 2, "m", 400, 100, 500)
+    assert "daily budget" in ledger.over_budget("c/repo", 200)
+    assert ledger.spent_today() == 900
+    ledger.close()
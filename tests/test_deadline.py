@@ -0,0 +1,83 @@
+from unittest.mock import Mock
+
+import pytest
+
+from deadline import Deadline, DeadlineExceeded
+from latency import default_latency_stats
+from llm_code_reviewer import LLMCodeReviewer
+from llm_interface import LLMInterface, ModelResult
+from vcsp_interface import PR, PRFile
+
+
+def make_llm(name="mini"):
+    llm = Mock(spec=LLMInterface)
+    llm.model_name = name
+    llm.answer.side_effect = lambda system_prompt, user_prompt, content: ModelResult(
+        response='[{"file": "a.py", "line": 1, "comments": []}]', total_tokens=10, prompt_tokens=9,
+        completion_tokens=1)
+    return llm
+
+
+def patch_with(filename, added):
+    body = "\n".join(f"+line {i}" for i in range(added))
+    return f"--- a/{filename}\n+++ b/{filename}\n@@ -1,1 +1,{added + 1} @@\n x\n{body}"
+
+
+def test_timeout_is_capped_by_remaining_time():
+    deadline = Deadline(10)
+    assert deadline.timeout(60) <= 10
+    assert deadline.timeout(1) == 1
+    assert deadline.reserve(5).remaining() <= 5
+    with pytest.raises(DeadlineExceeded):
+        deadline.reserve(20).timeout(60)
+
+
+def test_only_highest_priority_shard_is_reviewed_when_time_is_short():
+    llm = make_llm()
+    # the model usually takes far longer than the time that is left
+    for _ in range(5):
+        default_latency_stats().tracker("mini").record(100.0)
+    vcsp = Mock()
+    vcsp.get_files_in_pr.return_value = [
+        PRFile("README.md", patch_with("README.md", 50)),
+        PRFile("small.py", patch_with("small.py", 1)),
+        PRFile("big.py", patch_with("big.py", 20)),
+    ]
+    reviewer = LLMCodeReviewer(llm=llm, vcsp=vcsp, full_context=True, finding_cache=False,
+                               deadline=Deadline(30))
+    # one shard per file
+    reviewer._max_shard_chars = lambda: 10
+    result = reviewer.review_pr(PR("t", "b", "sha", "open"), "user/repo", 1)
+
+    assert llm.answer.call_count == 1
+    assert "File: big.py" in llm.answer.call_args.kwargs["content"]
+    # no full file content is fetched, only the repository's .gitattributes
+    assert [c.args[1] for c in vcsp.get_file_content.call_args_list] == [".gitattributes"]
+    assert result.totals["total_tokens"] == 10
+
+
+def test_no_deadline_reviews_everything_in_one_call():
+    llm = make_llm()
+    vcsp = Mock()
+    vcsp.get_files_in_pr.return_value = [PRFile("a.py", patch_with("a.py", 1)), PRFile("b.py", patch_with("b.py", 1))]
+    reviewer = LLMCodeReviewer(llm=llm, vcsp=vcsp, finding_cache=False)
+    reviewer.review_pr(PR("t", "b", "sha", "open"), "user/repo", 1)
+    assert llm.answer.call_count == 1
+
+
+def test_grok_request_uses_deadline_timeout(monkeypatch, mocker):
+    monkeypatch.setenv("XAI_API_KEY", "key")
+    from grok_llm import GrokLLM
+    post = mocker.patch("grok_llm.requests.post")
+    post.return_value.json.return_value = {
+        "choices": [{"message": {"content": "[]"}}],
+        "usage": {"total_tokens": 2, "prompt_tokens": 1, "completion_tokens": 1},
+    }
+    llm = GrokLLM()
+    llm.set_deadline(Deadline(5))
+    llm.answer("s", "", "c")
+    assert post.call_args.kwargs["timeout"] <= 5
+
+    llm.set_deadline(Deadline(0))
+    with pytest.raises(DeadlineExceeded):
+        llm.answer("s", "", "c")
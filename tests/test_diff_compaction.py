@@ -0,0 +1,93 @@
+from unittest.mock import Mock
+
+from diff_compaction import MOVED, WHITESPACE, compact_patches, is_whitespace_only, trim_context
+from diff_hunks import split_patch
+from llm_code_reviewer import LLMCodeReviewer
+from vcsp_interface import PR, PRFile
+
+
+def hunks_of(patch):
+    return split_patch(patch)[1]
+
+
+def test_whitespace_only_respects_indentation_sensitive_files():
+    hunk = hunks_of("@@ -1 +1 @@\n-if (a) {\n-  b();\n+if (a)  {\n+    b();")[0]
+    assert is_whitespace_only("main.js", hunk)
+    assert not is_whitespace_only("main.py", hunk)
+    assert not is_whitespace_only("main.js", hunks_of("@@ -1 +1 @@\n-a = 1\n+a = 2")[0])
+
+
+def test_trim_context_regenerates_headers():
+    context = [f" line {i}" for i in range(2, 12)]
+    hunk = hunks_of("\n".join(["@@ -1 +1 @@ def f():", "-old 1", "+new 1"] + context + ["+added 12"]))[0]
+    first, second = trim_context(hunk, 2)
+    assert first.lines == ["-old 1", "+new 1", " line 2", " line 3"]
+    assert (first.old_start, first.new_start) == (1, 1)
+    assert first.header == "@@ -1 +1 @@ def f():"
+    # the second piece starts two context lines before the added line 12
+    assert (second.new_start, second.lines[-1]) == (10, "+added 12")
+    assert second.header == "@@ -10 +10 @@"
+
+
+def test_moved_block_and_rename_are_compacted():
+    block = ["def helper():", "    x = compute()", "    return x * 2"]
+    removal = (["@@ -10 +10 @@", " keep"] + [f"-{line}" for line in block])
+    addition = (["@@ -1 +1 @@"] + [f"+{line}" for line in block] + [" tail"])
+    result = compact_patches([
+        ("a.py", ["--- a/a.py", "+++ b/a.py"], hunks_of("\n".join(removal))),
+        ("b.py", ["--- a/b.py", "+++ b/b.py"], hunks_of("\n".join(addition))),
+        ("new.py", ["diff --git a/old.py b/new.py", "similarity index 100%", "rename from old.py",
+                    "rename to new.py"], []),
+        ("c.js", ["--- a/c.js", "+++ b/c.js"], hunks_of("@@ -1 +1 @@\n-a=1;\n+a = 1;")),
+    ])
+    assert result[0].dropped == {MOVED: 1} and not result[0].hunks
+    assert result[1].dropped == {MOVED: 1}
+    assert result[2].note == "old.py -> new.py"
+    assert result[3].dropped == {WHITESPACE: 1}
+
+
+def test_reviewer_sends_compacted_diff_with_real_line_numbers():
+    llm = Mock()
+    llm.model_name = "m"
+    llm.answer.return_value = None
+    context = "\n".join(f" line {i}" for i in range(1, 20))
+    vcsp = Mock()
+    vcsp.get_files_in_pr.return_value = [
+        PRFile("a.py", f"--- a/a.py\n+++ b/a.py\n@@ -1,20 +1,20 @@\n{context}\n-x = 1\n+x = 2"),
+        PRFile("fmt.js", "--- a/fmt.js\n+++ b/fmt.js\n@@ -1,1 +1,1 @@\n-a=1;\n+a = 1;"),
+    ]
+    reviewer = LLMCodeReviewer(llm=llm, vcsp=vcsp, finding_cache=False)
+    _, plan = reviewer.plan_pr(PR("t", "b", "sha", "open"), "user/repo", 1)
+
+    assert [chunk.filename for chunk in plan.chunks] == ["a.py"]
+    assert "@@ -17 +17 @@\n line 17\n line 18\n line 19\n-x = 1\n+x = 2" in plan.content
+    assert " line 16" not in plan.content
+
+
+def test_whitespace_inside_string_literals_is_a_change():
+    hunk = hunks_of('@@ -1 +1 @@\n-msg = "a  b";\n+msg  =  "a b";')[0]
+    assert not is_whitespace_only("main.js", hunk)
+    assert not is_whitespace_only("main.js", hunks_of("@@ -1 +1 @@\n-int x;\n+intx;")[0])
+    assert is_whitespace_only("main.js", hunks_of('@@ -1 +1 @@\n-f( "a  b" );\n+f("a  b");')[0])
+
+
+def test_only_contiguous_blocks_at_the_same_indentation_count_as_moved():
+    def compacted(removed, added):
+        return compact_patches([
+            ("a.py", [], hunks_of("\n".join(["@@ -10 +10 @@", " keep"] + [f"-{line}" for line in removed]))),
+            ("b.py", [], hunks_of("\n".join(["@@ -1 +1 @@"] + [f"+{line}" for line in added] + [" tail"]))),
+        ])
+
+    block = ["x = compute()", "y = x * 2", "save(y)"]
+    assert compacted(block, block)[1].dropped == {MOVED: 1}
+    # trivial lines do not make a block, however many there are
+    trivial = ["else:", "    return None", "}", "pass"]
+    assert not compacted(trivial, trivial)[1].dropped
+    # the same lines, but scattered over separate runs
+    scattered = hunks_of("\n".join(["@@ -1 +1 @@", "-x = compute()", " a", "-y = x * 2", " b", "-save(y)"]))
+    result = compact_patches([("a.py", [], scattered),
+                              ("b.py", [], hunks_of("\n".join(["@@ -1 +1 @@"] + [f"+{line}" for line in block])))])
+    assert not result[1].dropped
+    # moved into a new block: reviewed in its new context
+    indented = ["if ready:"] + [f"    {line}" for line in block]
+    assert not compacted(block, indented)[1].dropped
@@ -0,0 +1,50 @@
+from diff_stream import iter_byte_lines, iter_diff_files
+
+DIFF = """diff --git a/app.py b/app.py
+--- a/app.py
++++ b/app.py
+@@ -1,2 +1,3 @@
+ a = 1
++b = 2
+ c = 3
+diff --git a/data.json b/data.json
+--- a/data.json
++++ b/data.json
+@@ -0,0 +1,3 @@
++[
++  "x"
++]
+diff --git a/lib.py b/lib.py
+--- a/lib.py
++++ b/lib.py
+@@ -10,2 +10,2 @@ def f():
+-    return 1
++    return 2
+"""
+
+
+def test_files_are_parsed_with_their_changed_lines():
+    files = list(iter_diff_files(DIFF.splitlines()))
+
+    assert [(file.filename, file.lines) for file in files] == [
+        ("app.py", {2}), ("data.json", {1, 2, 3}), ("lib.py", {10})]
+    assert files[0].patch == "\n".join(DIFF.splitlines()[:7])
+
+
+def test_files_over_the_limits_are_yielded_without_patch():
+    files = list(iter_diff_files(DIFF.splitlines(), max_file_chars=100))
+    assert [(file.filename, file.patch is not None) for file in files] == [
+        ("app.py", True), ("data.json", True), ("lib.py", False)]
+
+    # the PR-wide limit stops keeping patches once it is used up
+    files = list(iter_diff_files(DIFF.splitlines(), max_total_chars=150))
+    assert [(file.filename, file.patch is not None, file.lines) for file in files] == [
+        ("app.py", True, {2}), ("data.json", False, set()), ("lib.py", False, set())]
+
+
+def test_lines_are_streamed_from_chunks():
+    data = b"diff --git a/x b/x\r\n+" + b"y" * 50 + b"\n+z\n+last"
+    chunks = [data[i:i + 8] for i in range(0, len(data), 8)]
+
+    # CRLF endings are dropped and the long line is cut without splitting it
+    assert list(iter_byte_lines(chunks, max_line=20)) == ["diff --git a/x b/x", "+" + "y" * 19, "+z", "+last"]
@@ -0,0 +1,71 @@
+import base64
+import random
+
+from file_filter import FileFilter
+from llm_code_reviewer import LLMCodeReviewer
+from unittest.mock import Mock
+from vcsp_interface import PR, PRFile
+
+
+def patch_adding(*lines):
+    return "--- a/f\n+++ b/f\n@@ -0,0 +1 @@\n" + "\n".join(f"+{line}" for line in lines)
+
+
+CODE = patch_adding("def add(a, b):", "    return a + b")
+
+
+def test_defaults_skip_lock_generated_and_vendored_files():
+    file_filter = FileFilter()
+    assert file_filter.skip_reason("package-lock.json", CODE) == "lock file"
+    assert file_filter.skip_reason("api/service_pb2.py", CODE) == "generated"
+    assert file_filter.skip_reason("vendor/github.com/x/y.go", CODE) == "vendored"
+    assert file_filter.skip_reason("src/app.py", CODE) is None
+
+
+def test_content_heuristics():
+    file_filter = FileFilter()
+    assert file_filter.skip_reason("a.go", patch_adding("// Code generated by protoc. DO NOT EDIT.", "package a")) \
+        == "generated file header"
+    assert file_filter.skip_reason("bundle.js", patch_adding(*["var a=1;" * 200] * 3)) == "minified"
+    assert file_filter.skip_reason("bundle.js", patch_adding("var a=1;" * 3000)) == "minified"
+    blob = base64.b64encode(random.Random(1).randbytes(3000)).decode()
+    lines = [blob[i:i + 76] for i in range(0, len(blob), 76)]
+    assert file_filter.skip_reason("data.txt", patch_adding(*lines)) == "high-entropy content"
+
+
+def test_ordinary_edits_are_not_taken_for_generated_or_minified_files():
+    file_filter = FileFilter()
+    mid_file = ("--- a/gen.py\n+++ b/gen.py\n@@ -40,2 +40,3 @@ def render():\n"
+                "     header = []\n+    header.append('# Auto-generated by render(); DO NOT EDIT')\n     return header")
+    assert file_filter.skip_reason("gen.py", mid_file) is None
+    top_of_file = "--- a/gen.py\n+++ b/gen.py\n@@ -1,2 +1,3 @@\n+# DO NOT EDIT\n import os\n import sys"
+    assert file_filter.skip_reason("gen.py", top_of_file) == "generated file header"
+    long_constant = 'LOGO = "data:image/png;base64,' + "iVBORw0KGgo" * 150 + '"'
+    assert file_filter.skip_reason("logo.py", patch_adding("import os", long_constant, "SIZE = 16")) is None
+
+
+def test_globs_and_gitattributes():
+    attributes = "# generated code\ngen/** linguist-generated\nyarn.lock -linguist-generated\ndocs/api.md linguist-vendored=true\n"
+    file_filter = FileFilter(include=["*.lock"], exclude=["tests/fixtures/*"]).with_gitattributes(attributes)
+    assert file_filter.skip_reason("gen/client/api.py", CODE) == "linguist-generated"
+    assert file_filter.skip_reason("docs/api.md", CODE) == "linguist-vendored"
+    assert file_filter.skip_reason("tests/fixtures/big.py", CODE) == "excluded"
+    # an include glob overrides the built-in lock file pattern
+    assert file_filter.skip_reason("poetry.lock", CODE) is None
+
+
+def test_skipped_files_are_reported_and_not_sent():
+    llm = Mock()
+    llm.model_name = "m"
+    llm.answer.return_value = None
+    vcsp = Mock()
+    vcsp.get_file_content.return_value = "generated/* linguist-generated=true\n"
+    vcsp.get_files_in_pr.return_value = [PRFile("app.py", CODE), PRFile("generated/models.py", CODE),
+                                         PRFile("package-lock.json", CODE)]
+    reviewer = LLMCodeReviewer(llm=llm, vcsp=vcsp, finding_cache=False, local_analyzers=False)
+    _, plan = reviewer.plan_pr(PR("t", "b", "sha", "open"), "user/repo", 1)
+
+    assert [chunk.filename for chunk in plan.chunks] == ["app.py"]
+    assert reviewer.skipped_files == [("generated/models.py", "linguist-generated"),
+                                      ("package-lock.json", "lock file")]
+    vcsp.get_file_content.assert_called_once_with("user/repo", ".gitattributes", ref="sha")
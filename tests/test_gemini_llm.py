@@ -0,0 +1,65 @@
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+pytest.importorskip("google.generativeai")
+
+import gemini_llm
+from gemini_llm import GeminiLLM
+
+LONG_PROMPT = "x" * (gemini_llm.GEMINI_CACHE_MIN_TOKENS * gemini_llm.CHARS_PER_TOKEN)
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    monkeypatch.setenv("GOOGLE_API_KEY", "fake_key")
+    monkeypatch.setattr(gemini_llm.genai.GenerativeModel, "from_cached_content",
+                        staticmethod(lambda cached_content: ("model", cached_content)))
+    return GeminiLLM("gemini-2.0-flash")
+
+
+def test_context_is_created_with_the_request_timeout(llm, monkeypatch):
+    client = Mock()
+    monkeypatch.setattr(gemini_llm.caching, "get_default_cache_client", lambda: client)
+    monkeypatch.setattr(gemini_llm.caching.CachedContent, "_from_obj", classmethod(lambda cls, obj: "cache"))
+
+    assert llm._cached_model_for("system", LONG_PROMPT, 12) is None  # first use only marks the prefix
+    assert llm._cached_model_for("system", LONG_PROMPT, 12) == ("model", "cache")
+    assert llm._cached_model_for("system", LONG_PROMPT, 12) == ("model", "cache")
+
+    assert client.create_cached_content.call_count == 1
+    assert client.create_cached_content.call_args.kwargs["timeout"] == 12
+
+
+def test_failed_context_creation_is_not_retried(llm, monkeypatch):
+    create = Mock(side_effect=RuntimeError("caching unsupported"))
+    monkeypatch.setattr(llm, "_create_context", create)
+
+    for _ in range(4):
+        assert llm._cached_model_for("system", LONG_PROMPT, 10) is None
+
+    assert create.call_count == 1
+
+
+def test_context_is_created_by_one_thread(llm, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_create(system_prompt, user_prompt, timeout):
+        started.set()
+        release.wait(5)
+        return "cache"
+
+    create = Mock(side_effect=slow_create)
+    monkeypatch.setattr(llm, "_create_context", create)
+    llm._cached_model_for("system", LONG_PROMPT, 10)
+    creator = threading.Thread(target=llm._cached_model_for, args=("system", LONG_PROMPT, 10))
+    creator.start()
+    started.wait(5)
+
+    # while the context is created, other calls neither wait nor create it again
+    assert llm._cached_model_for("system", LONG_PROMPT, 10) is None
+    release.set()
+    creator.join(5)
+    assert llm._cached_model_for("system", LONG_PROMPT, 10) == ("model", "cache")
+    assert create.call_count == 1
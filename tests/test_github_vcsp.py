@@ -118,6 +118,15 @@ def test_get_file_content_binary_failure(mock_github):
         vcsp.get_file_content("user/repo", "image.png", "abc123")
 
 
+def test_get_file_content_of_missing_file(mock_github):
+    mock_repo = Mock()
+    mock_repo.get_contents.side_effect = GithubException(status=404, data={"message": "Not Found"})
+    mock_github.get_repo.return_value = mock_repo
+    vcsp = GithubVCSP()
+    with pytest.raises(FileNotFoundError):
+        vcsp.get_file_content("user/repo", ".gitattributes", "abc123")
+
+
 def test_create_review_comment_success(mock_github):
     mock_repo = Mock()
     mock_commit = Mock()
@@ -206,4 +215,61 @@ def test_get_files_in_pr_new_file(mock_github, tmp_path):
     assert len(files) == 1
     assert files[0].filename == "new.py"
     assert "+def new_function():" in files[0].patch
-    assert "-def" not in files[0].patch
\ No newline at end of file
+    assert "-def" not in files[0].patch
+
+def test_get_ai_comments_pages_through_review_threads(mock_github, mocker):
+    def thread(thread_id, body, line, outdated=False, resolved=False):
+        return {"id": thread_id, "isResolved": resolved, "isOutdated": outdated, "path": "app.py", "line": line,
+                "comments": {"nodes": [{"body": body, "createdAt": "2025-01-01T00:00:00Z"}]}}
+
+    def page(nodes, cursor=None):
+        response = Mock()
+        response.json.return_value = {"data": {"repository": {"pullRequest": {"reviewThreads": {
+            "pageInfo": {"hasNextPage": cursor is not None, "endCursor": cursor}, "nodes": nodes}}}}}
+        return response
+
+    post = mocker.patch("github_vcsp.requests.post", side_effect=[
+        page([thread("T1", "AI Comment:\nDivision by zero", 12), thread("T2", "Looks good to me", 3)], "c1"),
+        page([thread("T3", "AI Comment:\nUnused import", 1, outdated=True, resolved=True)]),
+    ])
+    vcsp = GithubVCSP()
+
+    comments = vcsp.get_ai_comments("user/repo", 5)
+    assert [(c.id, c.line, c.resolved) for c in comments] == [("T1", 12, False), ("T3", None, True)]
+    assert post.call_args_list[1].kwargs["json"]["variables"]["cursor"] == "c1"
+
+    post.side_effect = None
+    post.return_value.json.return_value = {"data": {"resolveReviewThread": {"thread": {"isResolved": True}}}}
+    vcsp.resolve_comment("user/repo", 5, comments[0])
+    assert post.call_args.kwargs["json"]["variables"] == {"threadId": "T1"}
+
+def test_prefetch_file_contents_fetches_files_in_one_query(mock_github, mocker):
+    mock_repo = Mock()
+    mock_github.get_repo.return_value = mock_repo
+    post = mocker.patch("github_vcsp.requests.post")
+    post.return_value.json.return_value = {"data": {"repository": {
+        "f0": {"isBinary": False, "isTruncated": False, "text": "print('a')\n"},
+        "f1": {"isBinary": True, "isTruncated": False, "text": None},
+    }}}
+    vcsp = GithubVCSP()
+
+    assert vcsp.prefetch_file_contents("user/repo", ["a.py", "logo.png", "a.py"], "abc123") == 1
+    variables = post.call_args.kwargs["json"]["variables"]
+    assert (variables["e0"], variables["e1"]) == ("abc123:a.py", "abc123:logo.png")
+    assert vcsp.get_file_content("user/repo", "a.py", ref="abc123") == "print('a')\n"
+    mock_repo.get_contents.assert_not_called()
+
+
+def test_pull_request_is_fetched_once_for_metadata_and_files(mock_github):
+    mock_pr = Mock(title="Title", body="Body", state="open")
+    mock_pr.head.sha = "abc123"
+    mock_pr.get_files.return_value = []
+    mock_repo = Mock()
+    mock_repo.get_pull.return_value = mock_pr
+    mock_github.get_repo.return_value = mock_repo
+    vcsp = GithubVCSP()
+
+    vcsp.get_pull_request("user/repo", 1)
+    vcsp.get_files_in_pr("user/repo", 1)
+    assert mock_repo.get_pull.call_count == 1
+    mock_github.get_repo.assert_called_once_with("user/repo", lazy=True)
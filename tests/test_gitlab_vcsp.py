@@ -0,0 +1,81 @@
+from unittest.mock import Mock
+
+import pytest
+
+from gitlab_vcsp import DIFFS_PER_PAGE, GitlabVCSP
+
+
+@pytest.fixture
+def client(monkeypatch, mocker):
+    monkeypatch.setenv("GITLAB_TOKEN", "fake_token")
+    client = Mock()
+    mocker.patch("gitlab_vcsp.gitlab.Gitlab", return_value=client)
+    return client
+
+
+def diffs(first, count, **extra):
+    return [{"new_path": f"src/f{n}.py", "diff": f"@@ -1 +1 @@\n-a\n+b{n}", **extra} for n in range(first, first + count)]
+
+
+def pages(contents, total_pages=True):
+    def http_request(verb, path, query_data=None, **kwargs):
+        assert path == "/projects/org%2Fapp/merge_requests/7/diffs"
+        assert query_data["per_page"] == DIFFS_PER_PAGE
+        response = Mock()
+        response.json.return_value = contents[query_data["page"] - 1]
+        response.headers = {"X-Total-Pages": str(len(contents))} if total_pages else {}
+        return response
+    return http_request
+
+
+def test_all_diff_pages_are_fetched_and_collapsed_diffs_read_raw(client):
+    collapsed = {"new_path": "schema.sql", "diff": "", "too_large": True}
+    client.http_request.side_effect = pages([diffs(0, 100), diffs(100, 100), diffs(200, 5) + [collapsed]])
+    mr = client.projects.get.return_value.mergerequests.get.return_value
+    mr.changes.return_value = {"changes": [{"new_path": "schema.sql", "diff": "@@ -1 +1,2 @@\n+CREATE TABLE t;"}]}
+    vcsp = GitlabVCSP()
+
+    files = vcsp.get_files_in_pr("org/app", 7)
+
+    assert [file.filename for file in files] == [f"src/f{n}.py" for n in range(205)] + ["schema.sql"]
+    assert files[-1].patch == "@@ -1 +1,2 @@\n+CREATE TABLE t;"
+    assert client.http_request.call_count == 3
+    mr.changes.assert_called_once()
+    assert mr.changes.call_args.kwargs["access_raw_diffs"] is True
+
+
+def test_pages_are_requested_until_a_short_one_without_page_count(client):
+    client.http_request.side_effect = pages([diffs(0, 100), diffs(100, 3)], total_pages=False)
+    vcsp = GitlabVCSP()
+
+    assert len(vcsp.get_files_in_pr("org/app", 7)) == 103
+    assert client.http_request.call_count == 2
+    # the merge request is fetched once per run, without fetching the project
+    vcsp.get_pull_request("org/app", 7)
+    vcsp.get_pull_request("org/app", 7)
+    client.projects.get.assert_called_with("org/app", lazy=True)
+    assert client.projects.get.return_value.mergerequests.get.call_count == 1
+
+
+def test_open_merge_request_listing_errors_are_wrapped(client):
+    from gitlab.exceptions import GitlabListError
+    client.projects.get.return_value.mergerequests.list.side_effect = GitlabListError("403 Forbidden")
+
+    with pytest.raises(Exception, match="Failed to list open GitLab MRs in org/app"):
+        GitlabVCSP().get_open_pull_requests("org/app")
+
+
+def test_deadline_is_passed_with_each_request(client):
+    from deadline import Deadline
+    client.http_request.side_effect = pages([diffs(0, 100), diffs(100, 100), diffs(200, 5)])
+    client.timeout = 60
+    vcsp = GitlabVCSP()
+    vcsp.set_deadline(Deadline(10))
+
+    vcsp.get_files_in_pr("org/app", 7)
+    vcsp.get_commit("org/app", "sha")
+
+    assert all(call.kwargs["timeout"] <= 10 for call in client.http_request.call_args_list)
+    assert client.projects.get.return_value.commits.get.call_args.kwargs["timeout"] <= 10
+    # the client's own timeout, shared by concurrent requests, is left alone
+    assert client.timeout == 60
@@ -0,0 +1,100 @@
+import threading
+import time
+from unittest.mock import Mock
+
+from hedged_llm import HedgedLLM
+from latency import LatencyStats, LatencyTracker
+from llm_interface import LLMInterface, ModelResult
+
+VALID = '[{"file": "a.py", "line": 1, "comments": []}]'
+
+
+def make_llm(name, response=VALID, delay=0.0, tokens=10, release=None):
+    llm = Mock(spec=LLMInterface)
+    llm.model_name = name
+
+    def answer(system_prompt, user_prompt, content):
+        if release is not None:
+            release.wait(5)
+        time.sleep(delay)
+        return ModelResult(response=response, total_tokens=tokens, prompt_tokens=tokens, completion_tokens=0)
+    llm.answer.side_effect = answer
+    return llm
+
+
+def test_percentile_needs_enough_samples():
+    tracker = LatencyTracker(samples=[1.0, 2.0, 3.0, 4.0])
+    assert tracker.percentile(95) is None
+    tracker.record(10.0)
+    assert tracker.percentile(95) == 10.0
+    assert tracker.percentile(50) == 3.0
+
+
+def test_fast_primary_is_not_hedged():
+    primary, secondary = make_llm("a"), make_llm("b")
+    hedged = HedgedLLM([primary, secondary], initial_delay=1.0, stats=LatencyStats(None))
+    assert hedged.answer("s", "", "c").response == VALID
+    hedged.close()
+    secondary.answer.assert_not_called()
+    assert hedged.hedges == 0
+
+
+def test_slow_primary_is_hedged_and_both_calls_accounted():
+    release = threading.Event()
+    primary = make_llm("a", tokens=100, release=release)
+    secondary = make_llm("b", tokens=7)
+    hedged = HedgedLLM([primary, secondary], initial_delay=0.05, stats=LatencyStats(None))
+
+    result = hedged.answer("s", "", "c")
+    assert result.total_tokens == 7  # the loser had not finished yet
+    assert hedged.hedges == 1
+    late = []
+    finished = threading.Event()
+    hedged.set_late_result_handler(lambda late_result: (late.append(late_result), finished.set()))
+    release.set()
+    assert finished.wait(5)
+    hedged.close()
+    assert hedged.usage["b"]["wins"] == 1
+    assert hedged.usage["a"]["calls"] == 1
+    assert hedged.usage["a"]["total_tokens"] == 100
+    assert [r.total_tokens for r in late] == [100]  # the late loser is handed over for accounting
+
+
+def test_close_does_not_wait_for_a_running_loser():
+    release = threading.Event()
+    hedged = HedgedLLM([make_llm("a", release=release), make_llm("b")], initial_delay=0.05,
+                       stats=LatencyStats(None))
+    hedged.answer("s", "", "c")
+    started = time.monotonic()
+    hedged.close()
+    assert time.monotonic() - started < 1
+    assert hedged.running == 1
+    release.set()
+    # a loser finishing before anyone handles late results is kept for take_late_results
+    for _ in range(50):
+        if hedged.running == 0:
+            break
+        time.sleep(0.02)
+    assert [r.total_tokens for r in hedged.take_late_results()] == [10]
+
+
+def test_invalid_primary_answer_fails_over_immediately():
+    primary = make_llm("a", response="I cannot review this")
+    secondary = make_llm("b")
+    hedged = HedgedLLM([primary, secondary], initial_delay=10.0, stats=LatencyStats(None))
+    started = time.monotonic()
+    result = hedged.answer("s", "", "c")
+    assert time.monotonic() - started < 5
+    assert result.response == VALID
+    assert result.total_tokens == 20  # both finished calls
+    hedged.close()
+
+
+def test_hedge_delay_uses_observed_percentile():
+    stats = LatencyStats(None)
+    for seconds in [0.01] * 10:
+        stats.tracker("a").record(seconds)
+    hedged = HedgedLLM([make_llm("a"), make_llm("b")], initial_delay=30.0, stats=stats)
+    assert hedged._hedge_delay(hedged.backends[0]) == 0.01
+    assert hedged._hedge_delay(hedged.backends[1]) == 30.0
+    hedged.close()
@@ -0,0 +1,93 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from http_cache import HTTPCache, mount_http_cache
+
+
+@pytest.fixture
+def server():
+    """Local server answering /pr with an ETag and honouring If-None-Match; records the validators it got."""
+    seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            seen.append(self.headers.get("If-None-Match"))
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.send_header("X-RateLimit-Remaining", "4999")
+                self.end_headers()
+                return
+            body = b'{"title": "Fix bug"}'
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", '"v1"')
+            self.send_header("X-RateLimit-Remaining", "5000")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/pr", seen
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_not_modified_is_served_from_the_cache(server):
+    url, seen = server
+    cache = HTTPCache()
+    session = mount_http_cache(requests.Session(), cache)
+
+    first = session.get(url, headers={"Authorization": "token a"})
+    second = session.get(url, headers={"Authorization": "token a"})
+
+    assert seen == [None, '"v1"']
+    assert second.status_code == 200
+    assert second.json() == first.json() == {"title": "Fix bug"}
+    assert second.headers["X-RateLimit-Remaining"] == "4999"
+    assert cache.revalidated == 1
+
+
+def test_responses_are_not_shared_between_credentials(server):
+    url, seen = server
+    session = mount_http_cache(requests.Session(), HTTPCache())
+
+    session.get(url, headers={"Authorization": "token a"})
+    session.get(url, headers={"Authorization": "token b"})
+    session.get(url, headers={"Authorization": "token a"}, stream=True).close()
+
+    # a streamed request is passed through without validators
+    assert seen == [None, None, None]
+
+
+def test_least_recently_used_responses_are_evicted():
+    cache = HTTPCache(max_bytes=10)
+    cache.put("a", '"1"', None, {}, b"aaaa")
+    cache.put("b", '"2"', None, {}, b"bbbb")
+    cache.touch("a")
+    cache.put("c", '"3"', None, {}, b"cccc")
+
+    assert cache.get("b") is None
+    assert cache.get("a").body == b"aaaa"
+    assert cache.get("c").etag == '"3"'
+
+
+def test_github_client_uses_the_cache_without_patching_pygithub(monkeypatch):
+    from github.Requester import Requester
+    from github_vcsp import CachingHTTPSConnection, GithubVCSP
+    monkeypatch.setenv("GITHUB_TOKEN", "fake_token")
+
+    requester = GithubVCSP().client._Github__requester
+    connection = requester._Requester__createConnection()
+
+    assert isinstance(connection, CachingHTTPSConnection) and connection.adapter.cache is not None
+    # connections are still reused, and other clients are left alone
+    assert requester._Requester__createConnection() is connection
+    assert Requester._Requester__httpsConnectionClass is not CachingHTTPSConnection
@@ -0,0 +1,86 @@
+from unittest.mock import Mock
+
+import pytest
+
+from diff_hunks import split_patch
+from llm_code_reviewer import LLMCodeReviewer
+from llm_interface import LLMInterface, ModelResult
+from vcsp_interface import PR, PRFile
+
+PATCH = """--- a/calc.py
++++ b/calc.py
+@@ -10,3 +10,4 @@ def ratio(a, b):
+     total = a + b
++    share = a / b
+     return total
+@@ -40,2 +41,3 @@ def mean(values):
+     count = len(values)
++    return sum(values) / count"""
+
+REBASED_PATCH = """--- a/calc.py
++++ b/calc.py
+@@ -25,3 +25,4 @@ def ratio(a, b):
+     total = a + b
++    share = a / b
+     return total
+@@ -55,2 +56,3 @@ def mean(values):
+     count = len(values)
++    return sum(values) / count"""
+
+
+@pytest.fixture
+def mock_llm():
+    llm = Mock(spec=LLMInterface)
+    llm.model_name = "test-model"
+    llm.answer.return_value = ModelResult(response='''[
+        {"file": "calc.py", "line": 11, "comments": ["Division by zero when b == 0"], "bugCount": 1},
+        {"file": "calc.py", "line": 42, "comments": ["Empty list raises ZeroDivisionError"], "bugCount": 1}
+    ]''', total_tokens=100, prompt_tokens=80, completion_tokens=20)
+    return llm
+
+
+def review(llm, patch):
+    vcsp = Mock()
+    vcsp.get_files_in_pr.return_value = [PRFile("calc.py", patch)]
+    reviewer = LLMCodeReviewer(llm=llm, vcsp=vcsp)
+    return reviewer.review_pr(PR("Fix stats", "", "abc", "open"), "user/repo", 1)
+
+
+def test_split_patch_counts_lines_from_body():
+    header, hunks = split_patch(PATCH)
+    assert header == ["--- a/calc.py", "+++ b/calc.py"]
+    assert [(h.old_start, h.old_count, h.new_start, h.new_count) for h in hunks] == [(10, 2, 10, 3), (40, 1, 41, 2)]
+
+
+def test_rebased_findings_are_reanchored_without_llm_call(mock_llm):
+    first = review(mock_llm, PATCH)
+    assert sorted(r.line for r in first.reviews) == [11, 42]
+
+    rebased = review(mock_llm, REBASED_PATCH)
+    assert mock_llm.answer.call_count == 1
+    assert sorted((r.line, r.comments[0]) for r in rebased.reviews) == [
+        (26, "Division by zero when b == 0"),
+        (57, "Empty list raises ZeroDivisionError"),
+    ]
+    assert rebased.totals["total_tokens"] == 0
+    assert rebased.totals["bug_count"] == 2
+
+
+def test_only_changed_hunks_are_sent(mock_llm):
+    review(mock_llm, PATCH)
+    changed = REBASED_PATCH.replace("return sum(values) / count", "return sum(values) / max(count, 1)")
+    mock_llm.answer.return_value = ModelResult(response='[{"file": "calc.py", "line": 57, "comments": []}]',
+                                               total_tokens=10, prompt_tokens=8, completion_tokens=2)
+
+    result = review(mock_llm, changed)
+    sent = mock_llm.answer.call_args.kwargs["content"]
+    assert "max(count, 1)" in sent
+    assert "share = a / b" not in sent
+    assert [(r.line, r.bug_count) for r in result.reviews if r.bug_count] == [(26, 1)]
+
+
+def test_cache_is_keyed_by_model(mock_llm):
+    review(mock_llm, PATCH)
+    mock_llm.model_name = "other-model"
+    review(mock_llm, REBASED_PATCH)
+    assert mock_llm.answer.call_count == 2
@@ -0,0 +1,50 @@
+from unittest.mock import Mock
+
+from diff_hunks import split_patch
+from hunk_clustering import cluster_hunks
+from llm_code_reviewer import LLMCodeReviewer
+from llm_interface import ModelResult
+from vcsp_interface import PR, PRFile
+
+
+def migration_patch(n, start):
+    # the same codemod edit in different contexts; mod2.py has a different call, too different to share findings
+    extra = ", verify=False" if n == 2 else ""
+    return (f"--- a/mod{n}.py\n+++ b/mod{n}.py\n@@ -{start},3 +{start},3 @@\n"
+            f" import client{n}\n-result = client.fetch(url, timeout=None, retries=3{extra})\n"
+            f"+result = client.fetch(url, timeout=30, retries=3{extra}, backoff=True)\n return result")
+
+
+def test_near_duplicates_cluster_and_different_edits_do_not():
+    hunks = [(f"mod{n}.py", split_patch(migration_patch(n, n * 10))[1][0]) for n in range(5)]
+    other = split_patch("--- a/x.py\n+++ b/x.py\n@@ -1 +1 @@\n-def parse(text):\n+def parse(text, strict=False):")[1][0]
+    clusters = cluster_hunks(hunks + [("x.py", other)])
+    assert len(clusters) == 1
+    assert clusters[0].filename == "mod0.py"
+    assert [name for name, _ in clusters[0].members] == ["mod1.py", "mod3.py", "mod4.py"]
+
+
+def test_repeated_edit_is_reviewed_once_and_findings_fan_out():
+    llm = Mock()
+    llm.model_name = "m"
+    # a finding on the added line of mod0.py (line 2 of its hunk)
+    llm.answer.return_value = ModelResult(
+        response='[{"file": "mod0.py", "line": 2, "comments": ["backoff is unbounded"], "bugCount": 1}]',
+        total_tokens=10, prompt_tokens=9, completion_tokens=1)
+    vcsp = Mock()
+    vcsp.get_files_in_pr.return_value = [PRFile(f"mod{n}.py", migration_patch(n, 1 + n * 10)) for n in range(4)]
+    reviewer = LLMCodeReviewer(llm=llm, vcsp=vcsp)
+    pr = PR("Migrate fetch", "b", "sha", "open")
+    result = reviewer.review_pr(pr, "user/repo", 1)
+
+    assert llm.answer.call_count == 1
+    content = llm.answer.call_args.kwargs["content"]
+    assert "File: mod0.py" in content and "File: mod2.py" in content and "File: mod1.py" not in content
+    assert "The same change is also made in: mod1.py, mod3.py" in content
+    assert sorted((r.file, r.line) for r in result.reviews) == [("mod0.py", 2), ("mod1.py", 12), ("mod3.py", 32)]
+
+    # the members' findings are cached as well
+    vcsp.get_files_in_pr.return_value = [PRFile(f"mod{n}.py", migration_patch(n, 1 + n * 10)) for n in range(4)]
+    again = LLMCodeReviewer(llm=llm, vcsp=vcsp).review_pr(pr, "user/repo", 1)
+    assert llm.answer.call_count == 1
+    assert len(again.reviews) == 3
@@ -1,5 +1,7 @@
+import hashlib
 import pytest
 from unittest.mock import Mock
+from diff_hunks import group_hunks, join_patch, split_patch
 from llm_code_reviewer import LLMCodeReviewer, remove_hunk_counts
 from models import LLMReviewResult, CodeReview
 from llm_interface import LLMInterface, ModelResult
@@ -167,3 +169,135 @@ def test_review_pr_new_file():
 @@ -132 +132 @@ export async function main() {
 """
     
+
+
+def test_group_hunks_splits_long_hunk_with_real_line_numbers():
+    lines = [f"+value_{i} = {i}" for i in range(100)]
+    patch = "--- a/big.py\n+++ b/big.py\n@@ -10 +10 @@\n" + "\n".join(lines)
+    _, hunks = split_patch(patch)
+    parts = group_hunks(hunks, 500)
+    assert len(parts) > 1
+    assert all(len(join_patch([], part)) <= 500 for part in parts)
+    assert parts[0][0].new_start == 10
+    assert parts[1][0].new_start == 10 + len(parts[0][0].lines)
+    assert [line for part in parts for hunk in part for line in hunk.lines] == lines
+
+
+def test_review_pr_splits_oversized_patch(mock_vcsp, mock_llm, sample_pr, mocker):
+    hunks = []
+    for start in range(1, 2000, 100):
+        added = "\n".join(f"+    {hashlib.sha1(f'{start}-{i}'.encode()).hexdigest()} = "
+                          f"{hashlib.md5(f'{start}-{i}'.encode()).hexdigest()}" for i in range(20))
+        hunks.append(f"@@ -{start},3 +{start},23 @@\n context_{start}\n{added}\n"
+                     f" context_{start + 1}\n context_{start + 2}")
+    patch = "--- a/big.py\n+++ b/big.py\n" + "\n".join(hunks)
+    mock_vcsp.get_files_in_pr.return_value = [PRFile(filename="big.py", patch=patch)]
+    mock_vcsp.get_file_content.return_value = None
+
+    def answer(system_prompt, user_prompt, content):
+        start = int(content.split("@@ -")[1].split(" ")[0])
+        return ModelResult(f'[{{"file": "big.py", "line": {start + 1}, "comments": ["Check"]}}]',
+                           total_tokens=10, prompt_tokens=8, completion_tokens=2, cached_tokens=4)
+    mock_llm.answer.side_effect = answer
+    mock_llm.model_name = "mock"
+    reviewer = LLMCodeReviewer(llm=mock_llm, vcsp=mock_vcsp, finding_cache=False)
+
+    result = reviewer.review_pr(sample_pr, "user/repo", 1)
+    assert reviewer.skipped_files == []
+    assert mock_llm.answer.call_count == 2  # 20 hunks of ~1.8 KB in parts of at most MAX_LENGTH_DIFF
+    for call in mock_llm.answer.call_args_list:
+        content = call.kwargs["content"]
+        assert "File: big.py (part " in content and "+++ b/big.py" in content
+    # each part reports the first hunk it was given, at the hunk's real line
+    first, second = sorted(review.line for review in result.reviews)
+    assert first == 2 and second > 2 and (second - 2) % 100 == 0
+    assert result.totals["total_tokens"] == 20
+    assert result.totals["cached_tokens"] == 8
+
+
+def test_split_file_stops_at_the_total_length(mock_vcsp, mock_llm, sample_pr, mocker):
+    hunks = []
+    for start in range(1, 6000, 100):
+        added = "\n".join(f"+    {hashlib.sha1(f'{start}-{i}'.encode()).hexdigest()} = 1" for i in range(40))
+        hunks.append(f"@@ -{start},1 +{start},41 @@\n context_{start}\n{added}")
+    patch = "--- a/big.py\n+++ b/big.py\n" + "\n".join(hunks)
+    mock_vcsp.get_files_in_pr.return_value = [PRFile(filename="big.py", patch=patch),
+                                              PRFile(filename="after.py", patch="--- a/after.py\n+++ b/after.py\n"
+                                                                                "@@ -1 +1 @@\n-x = 1\n+x = 2")]
+    mock_llm.model_name = "mock"
+    mocker.patch("llm_code_reviewer.MAX_TOTAL_LENGTH", 40000)
+    reviewer = LLMCodeReviewer(llm=mock_llm, vcsp=mock_vcsp, finding_cache=False)
+
+    _, plan = reviewer.plan_pr(sample_pr, "user/repo", 1)
+
+    # the part that crosses the limit is the last one sent
+    assert [chunk.part[0] for chunk in plan.chunks] == [1, 2]
+    assert plan.chunks[0].part[1] > 2
+    skipped = dict(reviewer.skipped_files)
+    assert skipped["big.py"].startswith("lines ") and skipped["big.py"].endswith("over the prompt size limit")
+    assert skipped["after.py"] == "over the prompt size limit"
+    # a partly reviewed file keeps its earlier comments
+    assert plan.files == set()
+
+
+def test_shards_share_a_stable_prompt_prefix(mock_vcsp, mock_llm, sample_pr):
+    mock_vcsp.get_files_in_pr.return_value = [
+        PRFile(filename=name, patch=f"--- a/{name}\n+++ b/{name}\n@@ -1 +1 @@\n-old_{name[0]}()\n+new_{name[0]}()")
+        for name in ("a.py", "b.py")]
+    mock_vcsp.get_file_content.return_value = None
+    mock_llm.answer.return_value = ModelResult("[]", total_tokens=1, prompt_tokens=1, completion_tokens=0)
+    mock_llm.model_name = "mock"
+    router = Mock(max_shard_chars=10, escalations=0)
+    router.route.return_value = Mock(tier="strong", escalate=False)
+    router.llm.return_value = mock_llm
+    reviewer = LLMCodeReviewer(llm=mock_llm, vcsp=mock_vcsp, finding_cache=False, router=router)
+
+    reviewer.review_pr(sample_pr, "user/repo", 1)
+    calls = mock_llm.answer.call_args_list
+    assert len(calls) == 2
+    assert calls[0].kwargs["system_prompt"] == calls[1].kwargs["system_prompt"]
+    assert calls[0].kwargs["user_prompt"] == calls[1].kwargs["user_prompt"]
+    assert calls[0].kwargs["user_prompt"].startswith("PR Title: Test PR")
+    assert "a.py" in calls[0].kwargs["content"] and "PR Title" not in calls[0].kwargs["content"]
+    # the JSON schema is one string, not a tuple rendered into the prompt
+    assert "('" not in calls[0].kwargs["system_prompt"]
+
+
+def test_describe_mode_returns_summary_and_findings_from_the_same_calls(mock_vcsp, mock_llm, sample_pr):
+    mock_vcsp.get_files_in_pr.return_value = [
+        PRFile(filename=name, patch=f"--- a/{name}\n+++ b/{name}\n@@ -1 +1 @@\n-old_{name[0]}()\n+new_{name[0]}()")
+        for name in ("a.py", "b.py")]
+    mock_vcsp.get_file_content.return_value = None
+    mock_llm.model_name = "mock"
+
+    def answer(system_prompt, user_prompt, content):
+        if content.startswith("PR Title"):  # combining the shard summaries
+            return ModelResult("Renames old_* to new_*.", total_tokens=3, prompt_tokens=2, completion_tokens=1)
+        name = "a.py" if "a.py" in content else "b.py"
+        return ModelResult(f'{{"summary": "Changes {name}.", "reviews": '
+                           f'[{{"file": "{name}", "line": 1, "comments": ["Check"], "bugCount": 1}}]}}',
+                           total_tokens=10, prompt_tokens=8, completion_tokens=2)
+    mock_llm.answer.side_effect = answer
+    router = Mock(max_shard_chars=10, escalations=0)
+    router.route.return_value = Mock(tier="strong", escalate=False)
+    router.llm.return_value = mock_llm
+    reviewer = LLMCodeReviewer(llm=mock_llm, vcsp=mock_vcsp, router=router, describe=True)
+
+    result = reviewer.review_pr(sample_pr, "user/repo", 1)
+    assert "'summary'" in mock_llm.answer.call_args_list[0].kwargs["system_prompt"]
+    assert sorted(review.file for review in result.reviews) == ["a.py", "b.py"]
+    assert result.summary == "Renames old_* to new_*."
+    assert result.totals["total_tokens"] == 23
+
+
+def test_answers_without_a_reviews_array_are_rejected(mock_vcsp, mock_llm):
+    def parse(response, describe):
+        reviewer = LLMCodeReviewer(llm=mock_llm, vcsp=mock_vcsp, describe=describe)
+        return reviewer.parse_answer(ModelResult(response, total_tokens=1, prompt_tokens=1, completion_tokens=0))
+
+    # an unexpected object must not read as "no findings" (and be cached as such)
+    assert parse('{"summary": "Looks fine."}', describe=True) is None
+    assert parse('{"summary": "Adds a.", "reviews": []}', describe=False) is None
+    assert parse('{"error": "rate limited"}', describe=False) is None
+    assert parse('{"summary": "Adds a.", "reviews": []}', describe=True).summary == "Adds a."
+    assert parse('[]', describe=False).reviews == []
@@ -0,0 +1,68 @@
+from unittest.mock import Mock
+
+from diff_hunks import split_patch
+from llm_code_reviewer import LLMCodeReviewer
+from local_analyzers import run_analyzers
+from vcsp_interface import PR, PRFile
+
+
+def new_file(filename, lines):
+    return f"--- /dev/null\n+++ b/{filename}\n@@ -0,0 +1,{len(lines)} @@\n" + "\n".join("+" + line for line in lines)
+
+
+def test_parsers_and_conflict_markers_find_defects():
+    files = {
+        "ok.py": new_file("ok.py", ["def f():", "    return 1"]),
+        "bad.py": new_file("bad.py", ["def f(:", "    return 1"]),
+        "bad.json": new_file("bad.json", ["{", '  "a": 1,', "}"]),
+        "tsconfig.json": new_file("tsconfig.json", ["{", "  // comment", "}"]),
+        "bad.toml": new_file("bad.toml", ["[tool]", "name = "]),
+        "notes.md": new_file("notes.md", ["text", "<<<<<<< HEAD", "ours", "=======", "theirs", ">>>>>>> main"]),
+    }
+    findings = run_analyzers([(name, split_patch(patch)[1], True) for name, patch in files.items()],
+                             load_content=lambda filename: None)
+
+    assert sorted(findings) == ["bad.json", "bad.py", "bad.toml", "notes.md"]
+    assert findings["bad.py"][0].line == 1
+    assert findings["bad.py"][0].comments[0].startswith("[local] Python syntax error")
+    assert findings["bad.json"][0].line == 3
+    assert [review.line for review in findings["notes.md"]] == [2, 6]
+
+
+def test_error_outside_the_diff_is_reported_in_the_nearest_hunk():
+    patch = "--- a/m.json\n+++ b/m.json\n@@ -1 +1 @@\n-{\n+{ "
+    content = '{ \n  "a": 1,\n  "b": 2,\n\n  x\n}\n'
+    findings = run_analyzers([("m.json", split_patch(patch)[1], False)], load_content=lambda filename: content)
+    review = findings["m.json"][0]
+    assert review.line == 1
+    assert "at line" in review.comments[0]
+
+
+def test_python_errors_are_reported_only_on_added_lines():
+    patch = "--- a/m.py\n+++ b/m.py\n@@ -1 +1 @@\n-x = 1\n+x = 2"
+    content = "x = 2\n\n\n\ndef f(:\n    pass\n"
+    findings = run_analyzers([("m.py", split_patch(patch)[1], False)], load_content=lambda filename: content)
+    assert findings == {}
+
+
+def test_python_syntax_newer_than_the_interpreter_is_not_an_error():
+    files = {
+        "alias.py": new_file("alias.py", ["type Point = tuple[float, float]"]),
+        "generic.py": new_file("generic.py", ["def first[T](items: list[T]) -> T:", "    return items[0]"]),
+        "quotes.py": new_file("quotes.py", ["names = {'a': 1}", 'x = f"{names["a"]}"']),
+    }
+    findings = run_analyzers([(name, split_patch(patch)[1], True) for name, patch in files.items()],
+                             load_content=lambda filename: None)
+    assert findings == {}
+
+
+def test_broken_files_can_skip_the_llm():
+    vcsp = Mock()
+    vcsp.get_files_in_pr.return_value = [PRFile("bad.py", new_file("bad.py", ["def f(:"])),
+                                         PRFile("ok.py", new_file("ok.py", ["x = 1"]))]
+    vcsp.get_file_content.side_effect = ValueError("not found")
+    reviewer = LLMCodeReviewer(llm=Mock(model_name="m"), vcsp=vcsp, finding_cache=False, skip_broken_files=True)
+    _, plan = reviewer.plan_pr(PR("t", "b", "sha", "open"), "user/repo", 1)
+
+    assert [chunk.filename for chunk in plan.chunks] == ["ok.py"]
+    assert [review.file for review in plan.known_reviews] == ["bad.py"]
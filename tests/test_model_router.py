@@ -0,0 +1,76 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+
+from llm_code_reviewer import LLMCodeReviewer
+from llm_interface import LLMInterface, ModelResult
+from model_router import CHEAP, STRONG, ModelRouter, RoutingRule
+from models import CodeReview, LLMReviewResult
+from vcsp_interface import PR, PRFile
+
+
+def make_llm(name, response):
+    llm = Mock(spec=LLMInterface)
+    llm.model_name = name
+    llm.answer.side_effect = lambda system_prompt, user_prompt, content: ModelResult(
+        response=response(content), total_tokens=100, prompt_tokens=90, completion_tokens=10)
+    return llm
+
+
+def patch_for(n):
+    return f"--- a/f{n}.py\n+++ b/f{n}.py\n@@ -1,1 +1,2 @@\n x = {n}\n+y = x / {n}"
+
+
+def result_with(**counts):
+    return LLMReviewResult([CodeReview.from_dict(dict({"file": "a.py", "line": 1, "comments": ["c"]}, **counts))],
+                           0, 0, 0)
+
+
+def test_rules_first_match_wins():
+    router = ModelRouter(cheap=Mock(), strong=Mock(), rules=[
+        RoutingRule(STRONG, paths=["migrations/*"]),
+        RoutingRule(STRONG, min_pr_lines=1000),
+        RoutingRule(CHEAP, paths=["*.md"], escalate=False),
+    ])
+    assert router.route(["app.py", "migrations/0001.sql"], 10).tier == STRONG
+    assert router.route(["app.py"], 5000).tier == STRONG
+    docs = router.route(["README.md"], 10)
+    assert (docs.tier, docs.escalate) == (CHEAP, False)
+    assert (router.route(["app.py"], 10).tier, router.route(["app.py"], 10).escalate) == (CHEAP, True)
+
+
+def test_should_escalate_on_findings_and_low_confidence():
+    router = ModelRouter(cheap=Mock(), strong=Mock(), min_confidence=0.5)
+    assert router.should_escalate(None)
+    assert router.should_escalate(result_with(bugCount=1))
+    assert router.should_escalate(result_with(logicalErrors=2))
+    assert router.should_escalate(result_with(confidence=0.2))
+    assert not router.should_escalate(result_with(smellCount=3, confidence=0.9))
+
+
+def test_only_flagged_shards_are_escalated():
+    # the cheap model finds a bug in f1.py only
+    cheap = make_llm("mini", lambda content: '[{"file": "f1.py", "line": 2, "comments": ["x / 1"], "bugCount": 1}]'
+                     if "f1.py" in content else '[{"file": "f2.py", "line": 2, "comments": [], "confidence": 0.9}]')
+    strong = make_llm("large", lambda content: '[{"file": "f1.py", "line": 2, "comments": ["confirmed"], "bugCount": 1}]')
+    router = ModelRouter(cheap=cheap, strong=strong, max_shard_chars=10)
+
+    vcsp = Mock()
+    vcsp.get_files_in_pr.return_value = [PRFile("f1.py", patch_for(1)), PRFile("f2.py", patch_for(2))]
+    reviewer = LLMCodeReviewer(llm=cheap, vcsp=vcsp, router=router)
+    result = reviewer.review_pr(PR("t", "b", "sha", "open"), "user/repo", 1)
+
+    assert cheap.answer.call_count == 2
+    assert strong.answer.call_count == 1
+    assert "f1.py" in strong.answer.call_args.kwargs["content"]
+    assert router.escalations == 1
+    assert [r.comments for r in result.reviews if r.bug_count] == [["confirmed"]]
+    # both cheap calls and the strong call are accounted for
+    assert result.totals["total_tokens"] == 300
+    assert "'confidence'" in cheap.answer.call_args.kwargs["system_prompt"]
+
+
+def test_escalations_are_counted_across_threads():
+    router = ModelRouter(cheap=make_llm("mini", lambda content: "[]"), strong=make_llm("large", lambda content: "[]"))
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: router.record_escalation(), range(2000)))
+    assert router.escalations == 2000
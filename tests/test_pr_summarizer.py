@@ -0,0 +1,51 @@
+from unittest.mock import Mock
+
+from llm_interface import ModelResult
+from pr_summarizer import PRSummarizer, group_by_directory
+from vcsp_interface import PR, PRFile
+
+
+def pr_files(count, size):
+    return [PRFile(filename=f"pkg{n % 3}/mod{n}.py",
+                   patch=f"--- a/mod{n}.py\n+++ b/mod{n}.py\n@@ -1 +1 @@\n-old\n+" + "x" * size)
+            for n in range(count)]
+
+
+def summarizing_llm():
+    llm = Mock()
+    llm.model_name = "m"
+    llm.answer.side_effect = lambda system_prompt, user_prompt, content: ModelResult(
+        f"summary of {len(content)} chars", total_tokens=10, prompt_tokens=8, completion_tokens=2)
+    return llm
+
+
+def test_small_pr_is_summarized_in_one_call():
+    llm = summarizing_llm()
+    result = PRSummarizer(llm).summarize(PR("Title", "Body", "abc", "open"), pr_files(2, 100))
+    assert llm.answer.call_count == 1
+    assert "PR Title: Title" in llm.answer.call_args.args[2]
+    assert result.response.startswith("summary of")
+
+
+def test_group_by_directory_keeps_directories_together_and_parts_bounded():
+    parts = group_by_directory(pr_files(9, 900), 2000)
+    assert all(len(part) <= 2000 for part in parts)
+    order = [line.split("/")[0] for part in parts for line in part.splitlines() if line.startswith("File: ")]
+    assert order == ["File: pkg0"] * 3 + ["File: pkg1"] * 3 + ["File: pkg2"] * 3
+
+
+def test_large_pr_is_mapped_reduced_and_cached():
+    llm = summarizing_llm()
+    files = pr_files(9, 900)
+    result = PRSummarizer(llm, max_chars=2000).summarize(PR("Title", "Body", "abc", "open"), files)
+    parts = len(group_by_directory(files, 2000))
+    assert llm.answer.call_count == parts + 1
+    final = llm.answer.call_args_list[-1].args
+    assert "PR Description:\nBody" in final[2] and "Summaries of parts of the PR" in final[2]
+    assert result.total_tokens == 10 * (parts + 1)
+
+    # an edited description only needs a new final summary
+    llm.answer.reset_mock()
+    result = PRSummarizer(llm, max_chars=2000).summarize(PR("Title", "New body", "abc", "open"), files)
+    assert llm.answer.call_count == 1
+    assert result.total_tokens == 10
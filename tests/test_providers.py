@@ -0,0 +1,45 @@
+import pytest
+from types import SimpleNamespace
+
+import providers
+from vcsp_interface import VCSPInterface
+
+
+@pytest.fixture(autouse=True)
+def clear_registry_cache():
+    providers._registry.cache_clear()
+    yield
+    providers._registry.cache_clear()
+
+
+def test_builtin_providers_listed():
+    assert providers.available_llms() == ["chatgpt", "gemini", "grok"]
+    assert providers.available_vcsps() == ["github", "gitlab", "bitbucket"]
+
+
+def test_unknown_provider_raises_value_error():
+    with pytest.raises(ValueError, match="Unknown LLM 'llama'"):
+        providers.get_llm_class("llama")
+    with pytest.raises(ValueError, match="Unknown VCS provider 'svn'"):
+        providers.get_vcsp_class("svn")
+
+
+def test_get_vcsp_class_imports_backend():
+    cls = providers.get_vcsp_class("github")
+    assert cls.__name__ == "GithubVCSP"
+    assert issubclass(cls, VCSPInterface)
+
+
+def test_entry_point_plugins_are_registered(mocker):
+    plugins = {
+        providers.LLM_ENTRY_POINT_GROUP: [
+            SimpleNamespace(name="echo", value="json_cleaner:JsonResponseCleaner"),
+            SimpleNamespace(name="grok", value="json_cleaner:JsonResponseCleaner"),
+        ],
+    }
+    mocker.patch("providers.entry_points", side_effect=lambda group: plugins.get(group, []))
+
+    assert "echo" in providers.available_llms()
+    assert providers.get_llm_class("echo").__name__ == "JsonResponseCleaner"
+    # built-in names cannot be hijacked by plugins
+    assert providers.get_llm_class("grok").__name__ == "GrokLLM"
@@ -0,0 +1,64 @@
+import datetime
+
+from models import CodeReview, LLMReviewResult
+from review_history import ReviewHistory
+
+
+def review(file, line, bugs, smells=0):
+    return CodeReview(file=file, line=line, comments=[f"issue in {file}"], bug_count=bugs, smell_count=smells,
+                      optimization_count=0, logical_errors=0, performance_issues=0)
+
+
+def result(reviews, total_tokens):
+    return LLMReviewResult(reviews=reviews, total_tokens=total_tokens, prompt_tokens=total_tokens - 10,
+                           completion_tokens=10)
+
+
+def test_tokens_are_totalled_per_repository_and_week():
+    history = ReviewHistory()
+    monday = datetime.datetime(2026, 3, 2, 12, tzinfo=datetime.timezone.utc)
+    history.record("github", "org/app", 1, "a1", "gpt", result([], 100), monday)
+    history.record("github", "org/app", 2, "b1", "gpt", result([], 50), monday + datetime.timedelta(days=3))
+    history.record("github", "org/lib", 3, "c1", "gpt", result([], 30), monday + datetime.timedelta(days=7))
+
+    assert history.tokens_by_period("week") == [
+        ("2026-03-09", "org/lib", 1, 20, 10, 0, 30),
+        ("2026-03-02", "org/app", 2, 130, 20, 0, 150),
+    ]
+    assert history.tokens_by_period("month", repository="org/app") == [("2026-03", "org/app", 2, 130, 20, 0, 150)]
+    assert history.tokens_by_period("day", since="2026-03-05") == [
+        ("2026-03-09", "org/lib", 1, 20, 10, 0, 30),
+        ("2026-03-05", "org/app", 1, 40, 10, 0, 50),
+    ]
+
+
+def test_top_files_rank_by_metric_across_runs():
+    history = ReviewHistory()
+    history.record("github", "org/app", 1, "a1", "gpt", result([review("db.py", 3, 2), review("api.py", 9, 1)], 100))
+    history.record("github", "org/app", 2, "b1", "gpt", result([review("api.py", 4, 2, smells=3)], 100))
+    history.record("gitlab", "org/lib", 7, "c1", "gpt", result([review("db.py", 1, 1)], 100))
+
+    assert history.top_files() == [("org/app", "api.py", 2, 3), ("org/app", "db.py", 1, 2),
+                                   ("org/lib", "db.py", 1, 1)]
+    assert history.top_files("smell_count", repository="org/app", limit=1) == [("org/app", "api.py", 2, 3)]
+
+
+def test_clean_file_entries_are_not_counted_as_findings():
+    history = ReviewHistory()
+    clean = CodeReview(file="ok.py", line=1, comments=[], bug_count=0, smell_count=0, optimization_count=0,
+                       logical_errors=0, performance_issues=0)
+    history.record("github", "org/app", 1, "a1", "gpt", result([review("db.py", 3, 1), clean], 100))
+
+    assert history.top_files("findings") == [("org/app", "db.py", 1, 1)]
+    assert history._db.execute("SELECT findings FROM runs").fetchone() == (1,)
+
+
+def test_reviewing_the_same_commit_again_replaces_the_run(tmp_path):
+    history = ReviewHistory(str(tmp_path / "history.sqlite"))
+    history.record("github", "org/app", 1, "a1", "gpt", result([review("db.py", 3, 2), review("old.py", 1, 1)], 100))
+    history.record("github", "org/app", 1, "a1", "gpt", result([review("db.py", 3, 1)], 80))
+    # another model's review of the same commit is a run of its own
+    history.record("github", "org/app", 1, "a1", "gemini", result([review("db.py", 3, 1)], 60))
+
+    assert history.top_files() == [("org/app", "db.py", 2, 2)]
+    assert history.tokens_by_period("week")[0][2:] == (2, 120, 20, 0, 140)
@@ -0,0 +1,149 @@
+import threading
+import time
+from unittest.mock import Mock
+
+from llm_interface import LLMInterface, ModelResult
+from review_pipeline import BatchReviewer, PRJob, run_pipeline
+from vcsp_interface import PR, PRFile, Commit
+
+DIFF = """--- a/main.py
++++ b/main.py
+@@ -1,2 +1,3 @@
+ a = 1
++b = a / 0
+ c = 2"""
+
+
+class Item:
+    def __init__(self, n):
+        self.n = n
+        self.error = None
+        self.trace = []
+
+
+def test_run_pipeline_yields_every_item_once():
+    def double(item):
+        item.trace.append("double")
+
+    def fail_odd(item):
+        if item.n % 2:
+            raise RuntimeError("odd")
+
+    def last(item):
+        item.trace.append("last")
+
+    stages = [("double", double, 2), ("fail", fail_odd, 3), ("last", last, 1)]
+    results = list(run_pipeline((Item(n) for n in range(10)), stages, queue_size=1))
+
+    assert sorted(item.n for item in results) == list(range(10))
+    for item in results:
+        if item.n % 2:
+            assert item.error == "odd"
+            assert item.trace == ["double"]  # later stages are skipped
+        else:
+            assert item.error is None
+            assert item.trace == ["double", "last"]
+
+
+def test_run_pipeline_raises_item_iterator_errors_after_finishing_fed_items():
+    def items():
+        yield Item(1)
+        yield Item(2)
+        raise ValueError("bad target")
+
+    done = []
+    stages = [("first", lambda item: None, 2), ("last", lambda item: None, 1)]
+    try:
+        for item in run_pipeline(items(), stages, queue_size=1):
+            done.append(item.n)
+    except ValueError as e:
+        assert str(e) == "bad target"
+    else:
+        raise AssertionError("the iterator's error was not raised")
+    assert sorted(done) == [1, 2]
+
+
+def test_run_pipeline_overlaps_stages():
+    events = []
+    lock = threading.Lock()
+
+    def fetch(item):
+        with lock:
+            events.append(("fetch", item.n, time.monotonic()))
+
+    def slow_llm(item):
+        time.sleep(0.05)
+        with lock:
+            events.append(("llm", item.n, time.monotonic()))
+
+    list(run_pipeline((Item(n) for n in range(3)), [("fetch", fetch, 1), ("llm", slow_llm, 1)]))
+    fetched = {n: t for stage, n, t in events if stage == "fetch"}
+    reviewed = {n: t for stage, n, t in events if stage == "llm"}
+    # PR 1 is fetched while PR 0 is still waiting on the LLM
+    assert fetched[1] < reviewed[0]
+
+
+def test_batch_reviewer_reviews_and_posts():
+    vcsp = Mock()
+    vcsp.get_pull_request.side_effect = lambda repo, n: PR("Title", "Body", f"sha{n}", "open")
+    vcsp.get_files_in_pr.side_effect = lambda repo, n: [PRFile("main.py", DIFF.replace("a / 0", f"a / {n - 1}"))]
+    vcsp.get_commit.side_effect = lambda repo, sha: Commit(sha, "msg", "author", "2025-01-01")
+    llm = Mock(spec=LLMInterface)
+    llm.answer.return_value = ModelResult(
+        response='[{"file": "main.py", "line": 2, "comments": ["Division by zero"], "bugCount": 1}]',
+        total_tokens=10, prompt_tokens=8, completion_tokens=2)
+
+    batch = BatchReviewer(llm=llm, vcsp_factory=lambda: vcsp, post_comments=True)
+    jobs = list(batch.run([PRJob("user/repo", 1), PRJob("user/repo", 2)], llm_workers=2))
+
+    assert sorted(job.pr_number for job in jobs) == [1, 2]
+    for job in jobs:
+        record = job.to_dict()
+        assert record["status"] == "reviewed"
+        assert record["findings"] == 1
+        assert record["posted"] == 1
+        assert record["totals"]["bug_count"] == 1
+    assert llm.answer.call_count == 2
+    assert vcsp.create_review_comment.call_count == 2
+
+
+def test_batch_reviewer_reports_fetch_errors():
+    vcsp = Mock()
+    vcsp.get_pull_request.side_effect = Exception("Not Found")
+    llm = Mock(spec=LLMInterface)
+
+    jobs = list(BatchReviewer(llm=llm, vcsp_factory=lambda: vcsp).run([PRJob("user/repo", 7)]))
+
+    record = jobs[0].to_dict()
+    assert record["status"] == "error"
+    assert record["failed_stage"] == "fetch"
+    assert record["error"] == "Not Found"
+    llm.answer.assert_not_called()
+
+
+def test_batch_reviewer_records_spend_and_defers_prs_over_budget():
+    from budget_ledger import BudgetLedger
+    vcsp = Mock()
+    vcsp.get_pull_request.side_effect = lambda repo, n: PR("Title", "Body", f"sha{n}", "open")
+    vcsp.get_files_in_pr.side_effect = lambda repo, n: [PRFile("main.py", DIFF)]
+    vcsp.get_commit.side_effect = lambda repo, sha: Commit(sha, "msg", "author", "2025-01-01")
+    llm = Mock(spec=LLMInterface)
+    llm.model_name = "model"
+    probe = BatchReviewer(llm=llm, vcsp_factory=lambda: vcsp, finding_cache=False)
+    job = PRJob("user/repo", 1)
+    probe.fetch(job)
+    probe.build(job)
+    estimate = probe._reviewer(job).estimate(job.plan).total_tokens
+    spent = estimate + 2
+    llm.answer.return_value = ModelResult(response="[]", total_tokens=spent, prompt_tokens=spent - 2,
+                                          completion_tokens=2)
+
+    # room for one PR: the second one is deferred whether or not the first has finished
+    ledger = BudgetLedger(":memory:", daily_tokens=estimate + 1)
+    batch = BatchReviewer(llm=llm, vcsp_factory=lambda: vcsp, ledger=ledger, finding_cache=False)
+    jobs = list(batch.run([PRJob("user/repo", 1), PRJob("user/repo", 2)], fetch_workers=2))
+
+    assert sorted(job.status for job in jobs) == ["deferred", "reviewed"]
+    assert llm.answer.call_count == 1
+    assert ledger.spent_today("user/repo") == spent
+    assert batch._reserved["user/repo"] == 0
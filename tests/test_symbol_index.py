@@ -0,0 +1,71 @@
+import os
+
+from diff_hunks import split_patch
+from symbol_index import SymbolIndex, referenced_names
+
+
+def write(root, path, text):
+    full_path = root / path
+    full_path.parent.mkdir(parents=True, exist_ok=True)
+    full_path.write_text(text, encoding="utf-8")
+    return full_path
+
+
+def test_index_finds_python_and_scanned_definitions_incrementally(tmp_path):
+    repo = tmp_path / "repo"
+    write(repo, "pkg/util.py", "import os\n\n\ndef parse_config(path):\n    return open(path).read()\n\n\n"
+                               "class Loader:\n    def load(self):\n        return 1\n")
+    write(repo, "web/app.js", "export function renderPage(data) {\n  return data;\n}\n")
+    write(repo, "svc/main.go", "package main\n\nfunc Serve(addr string) error {\n\treturn nil\n}\n")
+    write(repo, "node_modules/lib/index.js", "function ignored() {}\n")
+    index = SymbolIndex(str(repo), ":memory:")
+
+    assert index.update() == 3
+    assert index.definitions("parse_config") == [
+        ("pkg/util.py", "function", 4, "def parse_config(path):\n    return open(path).read()")]
+    assert index.definitions("Loader")[0][:3] == ("pkg/util.py", "class", 8)
+    assert index.definitions("renderPage")[0][3] == "export function renderPage(data) {\n  return data;\n}"
+    assert index.definitions("Serve")[0][:3] == ("svc/main.go", "function", 3)
+    assert index.definitions("ignored") == []
+
+    # only changed files are parsed again; deleted files are dropped
+    changed = write(repo, "pkg/util.py", "def parse_settings(path):\n    return path\n")
+    os.utime(changed, ns=(1, 1))
+    os.remove(repo / "web" / "app.js")
+    assert index.update() == 1
+    assert index.definitions("parse_config") == [] and index.definitions("renderPage") == []
+    assert index.update() == 0
+
+
+def test_context_for_hunk_lists_definitions_from_other_files(tmp_path):
+    repo = tmp_path / "repo"
+    write(repo, "pkg/util.py", "def parse_config(path):\n    return path\n")
+    write(repo, "pkg/other.py", "def helper():\n    pass\n")
+    index = SymbolIndex(str(repo), ":memory:")
+    index.update()
+    _, hunks = split_patch("--- a/app.py\n+++ b/app.py\n@@ -1 +1 @@\n-x = None\n+x = parse_config(PATH)")
+
+    assert referenced_names(hunks[0]) == ["parse_config"]
+    context = index.context_for("app.py", hunks)
+    assert "pkg/util.py:1 (function parse_config)" in context and "helper" not in context
+    # a definition in the changed file itself is already in front of the model
+    assert index.context_for("pkg/util.py", hunks) == ""
+
+
+def test_reviewer_adds_referenced_definitions_to_the_prompt(tmp_path):
+    from unittest.mock import Mock
+    from llm_code_reviewer import LLMCodeReviewer
+    from vcsp_interface import PR, PRFile
+
+    repo = tmp_path / "repo"
+    write(repo, "pkg/util.py", "def parse_config(path):\n    return path\n")
+    index = SymbolIndex(str(repo), ":memory:")
+    index.update()
+    vcsp = Mock()
+    vcsp.get_files_in_pr.return_value = [
+        PRFile("app.py", "--- a/app.py\n+++ b/app.py\n@@ -1 +1 @@\n-x = None\n+x = parse_config(PATH)")]
+    vcsp.get_file_content.return_value = None
+    reviewer = LLMCodeReviewer(llm=Mock(model_name="m"), vcsp=vcsp, finding_cache=False, symbol_index=index)
+    _, plan = reviewer.plan_pr(PR("t", "b", "sha", "open"), "user/repo", 1)
+
+    assert "def parse_config(path):" in plan.chunks[0].text
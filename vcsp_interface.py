@@ -1,14 +1,41 @@
 # vcsp_interface.py
 from abc import ABC, abstractmethod
+from typing import Iterable, List, Optional
+
+from config import HTTP_TIMEOUT
+from deadline import Deadline
 
 class VCSPInterface(ABC):
     """Abstract base class for version control systems."""
 
+    # Shared review deadline; set with set_deadline()
+    deadline: Optional[Deadline] = None
+
+    def set_deadline(self, deadline: Optional[Deadline]):
+        """Bound every following request by the given deadline."""
+        self.deadline = deadline
+
+    def request_timeout(self, default: float = HTTP_TIMEOUT) -> float:
+        """
+        Timeout for the next request.
+
+        Raises:
+            DeadlineExceeded: If the deadline has already passed.
+        """
+        return self.deadline.timeout(default, "calling the VCS") if self.deadline else default
+
     @abstractmethod
     def get_pull_request(self, repo_name: str, pr_number: int):
         """Fetch a pull request by number."""
         pass
 
+    def get_open_pull_requests(self, repo_name: str) -> list:
+        """
+        Return the numbers of all open pull requests in a repository. Only
+        batch reviews of whole repositories need it, so providers may leave it out.
+        """
+        raise NotImplementedError(f"{type(self).__name__} cannot list open pull requests")
+
     @abstractmethod
     def get_files_in_pr(self, repo_name: str, pr_number: int):
         """Fetch files in a pull request."""
@@ -29,10 +56,19 @@ class VCSPInterface(ABC):
 
         Raises:
             ValueError: If the file content cannot be decoded (e.g., binary file).
+            FileNotFoundError: If the file does not exist at ref.
             Exception: If the file cannot be retrieved from the VCS.
         """
         pass
 
+    def prefetch_file_contents(self, repo_name: str, file_paths: Iterable[str], ref: str) -> int:
+        """
+        Fetch the content of many files at once, ahead of get_file_content calls
+        for them. Providers without a bulk API fetch nothing; returns how many
+        files were fetched.
+        """
+        return 0
+
     @abstractmethod
     def create_review_comment(self, repo_name: str, commit: str, file_path: str, line: int, comment: str, side: str):
         """Create a review comment on a pull request."""
@@ -43,6 +79,18 @@ class VCSPInterface(ABC):
         """Retrieve a commit by its SHA."""
         pass
 
+    def get_ai_comments(self, repo_name: str, pr_number: int) -> List['ReviewComment']:
+        """
+        Return the comments posted by earlier reviews ("AI Comment:") on a pull
+        request, resolved ones included. Providers that cannot list comments
+        return an empty list, so every finding is posted.
+        """
+        return []
+
+    def resolve_comment(self, repo_name: str, pr_number: int, comment: 'ReviewComment'):
+        """Mark the thread of an earlier review comment as resolved."""
+        raise NotImplementedError(f"{type(self).__name__} cannot resolve comments")
+
 class PRFile:
     def __init__(self, filename, patch, lines=None):
         self.filename = filename
@@ -59,6 +107,19 @@ class PR:
         self.head_sha = head_sha
         self.state = state
 
+class ReviewComment:
+    """An inline comment (thread) already on a pull request; line is None once the provider marks it outdated."""
+    def __init__(self, id, file_path, line, body, resolved=False, created_at=None):
+        self.id = id
+        self.file_path = file_path
+        self.line = line
+        self.body = body
+        self.resolved = resolved
+        self.created_at = created_at
+
+    def __repr__(self):
+        return f"<ReviewComment {self.id} {self.file_path}:{self.line}{' resolved' if self.resolved else ''}>"
+
 class Commit:
     def __init__(self, sha, message, author, date):
         self.sha = sha